@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Cliente, Mascota, Veterinario, BloqueAtencion
+from .models import Cliente, Mascota, Veterinario, BloqueAtencion, BloqueArchivado
 
 # Register your models here.
 admin.site.register(Cliente)
 admin.site.register(Mascota)
 admin.site.register(Veterinario)
 admin.site.register(BloqueAtencion)
+admin.site.register(BloqueArchivado)
@@ -0,0 +1,88 @@
+# gestionCitas/archivo.py
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import BloqueArchivado, BloqueAtencion
+from .transiciones import estado_efectivo
+from .versiones import invalidar_calendario
+
+# Días hacia atrás que se quedan en la tabla activa (ARCHIVO_DIAS_ACTIVOS)
+DIAS_ACTIVOS = 365
+TAMANO_LOTE = 2000
+
+CAMPOS = (
+    'codigo_atencion', 'codigo_cita', 'veterinario_id', 'fecha', 'hora_inicio', 'hora_fin',
+    'estado', 'mascota_id', 'motivo_consulta', 'actualizado', 'cancelado_en',
+)
+_INDICE_ESTADO = CAMPOS.index('estado')
+_INDICE_FECHA = CAMPOS.index('fecha')
+
+
+def fecha_corte(hoy=None):
+    """Primer día que sigue en BloqueAtencion; lo anterior puede estar archivado."""
+    dias = getattr(settings, 'ARCHIVO_DIAS_ACTIVOS', DIAS_ACTIVOS)
+    return (hoy or date.today()) - timedelta(days=dias)
+
+
+def archivar(corte=None, tamano_lote=TAMANO_LOTE):
+    """
+    Mueve a BloqueArchivado los bloques con fecha anterior a `corte`, un lote
+    por transacción: nunca queda un bloque en las dos tablas ni en ninguna, y
+    los lotes cortos no bloquean la base mientras atiende. Se guarda el
+    estado efectivo (una reserva vieja queda COMPLETADA). Retorna la cantidad
+    de bloques movidos.
+    """
+    corte = corte or fecha_corte()
+    pendientes = BloqueAtencion.objects.filter(fecha__lt=corte).order_by('fecha', 'codigo_atencion')
+    conexion = connections[router.db_for_write(BloqueAtencion)]
+    borrar = f'DELETE FROM {conexion.ops.quote_name(BloqueAtencion._meta.db_table)} WHERE codigo_atencion IN '
+    por_sentencia = conexion.features.max_query_params or tamano_lote
+    movidos = 0
+    while True:
+        with transaction.atomic(using=conexion.alias):
+            filas = list(pendientes.values_list(*CAMPOS)[:tamano_lote])
+            if not filas:
+                break
+            archivados = []
+            for fila in filas:
+                datos = dict(zip(CAMPOS, fila))
+                datos['estado'] = estado_efectivo(fila[_INDICE_ESTADO], fila[_INDICE_FECHA], corte)
+                archivados.append(BloqueArchivado(**datos))
+            BloqueArchivado.objects.bulk_create(archivados)
+            # DELETE en SQL, sin las señales de delete(): Django cargaría cada
+            # bloque para enviar post_delete, que recalcula la ocupación (los
+            # días archivados se conservan a propósito) e invalida el
+            # calendario bloque por bloque (acá se hace una vez al final).
+            # Ninguna FK apunta a BloqueAtencion: no hay cascadas que perder
+            codigos = [fila[0] for fila in filas]
+            with conexion.cursor() as cursor:
+                for i in range(0, len(codigos), por_sentencia):
+                    trozo = codigos[i:i + por_sentencia]
+                    cursor.execute(borrar + f"({', '.join(['%s'] * len(trozo))})", trozo)
+        movidos += len(filas)
+    if movidos:
+        invalidar_calendario()
+    return movidos
+
+
+def bloques_historicos(campos, orden, desde=None, hasta=None, condicion=None, **filtros):
+    """
+    values_list(*campos) de los bloques entre `desde` y `hasta` (inclusive,
+    None = sin límite) que cumplen `filtros` y, si se da, la condición Q
+    `condicion`. Si el rango empieza antes del
+    corte se une (UNION ALL) con la tabla de archivo, así que quien lee
+    historial no necesita saber dónde está cada bloque (ni si el archivado
+    ya corrió). `orden` solo puede usar nombres incluidos en `campos`.
+    """
+    if desde is not None:
+        filtros['fecha__gte'] = desde
+    if hasta is not None:
+        filtros['fecha__lte'] = hasta
+    condiciones = [condicion] if condicion is not None else []
+    activos = BloqueAtencion.objects.filter(*condiciones, **filtros).values_list(*campos)
+    if desde is None or desde < fecha_corte():
+        archivados = BloqueArchivado.objects.filter(*condiciones, **filtros).values_list(*campos)
+        return activos.union(archivados, all=True).order_by(*orden)
+    return activos.order_by(*orden)
@@ -0,0 +1,128 @@
+# gestionCitas/ausencias.py
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BloqueAtencion
+
+DIAS_BUSQUEDA = 30
+
+
+class _BloquesLibres:
+    """
+    Bloques libres ordenados por fecha y hora, globalmente y por veterinario,
+    para encontrar el más cercano a un momento dado con búsqueda binaria.
+    Los bloques asignados se marcan como tomados y se saltan al buscar.
+    """
+
+    def __init__(self, filas):
+        self.filas = {f['codigo_atencion']: f for f in filas}
+        self.tomados = set()
+        self.todos = sorted((f['momento'], f['codigo_atencion']) for f in filas)
+        self.por_vet = defaultdict(list)
+        for momento, codigo in self.todos:
+            self.por_vet[self.filas[codigo]['veterinario_id']].append((momento, codigo))
+
+    def candidatos(self, momento, veterinario_id=None):
+        """Códigos libres ordenados por cercanía a `momento` (hacia ambos lados)."""
+        lista = self.por_vet.get(veterinario_id, []) if veterinario_id else self.todos
+        despues = bisect_left(lista, (momento,))
+        antes = despues - 1
+        while antes >= 0 or despues < len(lista):
+            if despues < len(lista) and (
+                antes < 0 or lista[despues][0] - momento <= momento - lista[antes][0]
+            ):
+                codigo = lista[despues][1]
+                despues += 1
+            else:
+                codigo = lista[antes][1]
+                antes -= 1
+            if codigo not in self.tomados:
+                yield codigo
+
+
+def _fila_reporte(bloque):
+    return {
+        'codigo_atencion': bloque.codigo_atencion,
+        'fecha': bloque.fecha,
+        'hora_inicio': bloque.hora_inicio,
+        'hora_fin': bloque.hora_fin,
+        'mascota': bloque.mascota.nombre,
+        'dueno': bloque.mascota.dueño.nombre,
+        'telefono': bloque.mascota.dueño.telefono,
+        'motivo_consulta': bloque.motivo_consulta,
+    }
+
+
+def cancelar_ausencia(veterinario_id, fecha_inicio, fecha_fin, dias_busqueda=DIAS_BUSQUEDA):
+    """
+    Cancela (CANCELADO_VET) todos los bloques del veterinario en el rango con
+    un solo UPDATE y reubica a cada paciente afectado en el bloque libre más
+    cercano a su hora original: primero con el mismo veterinario y, si no
+    hay, con cualquiera. Se asigna en orden cronológico (los primeros
+    afectados eligen primero), todo en una transacción. Los días anteriores a
+    hoy no se tocan: sus reservas son citas que ya ocurrieron (se muestran
+    como COMPLETADA) y no deben quedar como canceladas por el veterinario.
+
+    Retorna un dict con 'cancelados' (cantidad), 'reubicados' (lista de
+    {'original', 'nuevo'}) y 'sin_cupo' (pacientes que no se pudieron ubicar).
+    """
+    ahora = datetime.now()
+    hoy = date.today()
+    limite = max(fecha_fin, hoy) + timedelta(days=dias_busqueda)
+
+    with transaction.atomic():
+        afectados = list(
+            BloqueAtencion.objects.filter(
+                veterinario_id=veterinario_id,
+                fecha__range=(fecha_inicio, fecha_fin),
+                estado='RESERVADO',
+                fecha__gte=hoy,
+            ).select_related('mascota__dueño').order_by('fecha', 'hora_inicio')
+        )
+        cancelados = BloqueAtencion.objects.filter(
+            veterinario_id=veterinario_id,
+            fecha__range=(fecha_inicio, fecha_fin),
+            estado__in=('DISPONIBLE', 'RESERVADO'),
+            fecha__gte=hoy,
+        ).update(estado='CANCELADO_VET', actualizado=timezone.now())
+
+        filas = list(
+            BloqueAtencion.objects.filter(
+                estado='DISPONIBLE', fecha__gte=hoy, fecha__lte=limite,
+            ).values('codigo_atencion', 'veterinario_id', 'veterinario__nombre',
+                     'fecha', 'hora_inicio', 'hora_fin')
+        )
+        for f in filas:
+            f['momento'] = datetime.combine(f['fecha'], f['hora_inicio'])
+        libres = _BloquesLibres([f for f in filas if f['momento'] >= ahora])
+
+        reubicados, sin_cupo = [], []
+        for bloque in afectados:
+            momento = datetime.combine(bloque.fecha, bloque.hora_inicio)
+            nuevo = None
+            for vet in (veterinario_id, None):
+                for codigo in libres.candidatos(momento, vet):
+                    libres.tomados.add(codigo)
+                    # Compare-and-set por si otra recepcionista lo tomó recién
+                    if BloqueAtencion.objects.filter(pk=codigo, estado='DISPONIBLE').update(
+                        mascota_id=bloque.mascota_id,
+                        motivo_consulta=bloque.motivo_consulta,
+                        codigo_cita=bloque.codigo_cita,
+                        estado='RESERVADO',
+                        actualizado=timezone.now(),
+                    ):
+                        nuevo = libres.filas[codigo]
+                        break
+                if nuevo:
+                    break
+
+            if nuevo:
+                reubicados.append({'original': _fila_reporte(bloque), 'nuevo': nuevo})
+            else:
+                sin_cupo.append(_fila_reporte(bloque))
+
+    return {'cancelados': cancelados, 'reubicados': reubicados, 'sin_cupo': sin_cupo}
@@ -0,0 +1,70 @@
+# gestionCitas/bloques_libres.py
+from datetime import date, datetime
+
+from django.db.models import Q
+
+from .models import BloqueAtencion
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+
+def codificar_cursor(fila):
+    """Cursor opaco 'fecha|hora|codigo' a partir de la última fila de una página."""
+    return f"{fila['fecha'].isoformat()}|{fila['hora_inicio'].strftime('%H:%M:%S')}|{fila['codigo_atencion']}"
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor. Lanza ValueError si el cursor no es válido."""
+    fecha, hora, codigo = cursor.split('|', 2)
+    return (
+        datetime.strptime(fecha, '%Y-%m-%d').date(),
+        datetime.strptime(hora, '%H:%M:%S').time(),
+        codigo,
+    )
+
+
+def bloques_libres(desde=None, veterinario_id=None, hora_desde=None, hora_hasta=None,
+                   limite=LIMITE_POR_DEFECTO, cursor=None):
+    """
+    Próximos bloques DISPONIBLE desde la fecha `desde` (hoy por defecto), de
+    un veterinario o de cualquiera, opcionalmente dentro de una franja
+    horaria. Pagina por keyset sobre (fecha, hora_inicio, codigo_atencion),
+    así cada página es un rango del índice y no un OFFSET.
+
+    Retorna (filas, cursor_siguiente); cursor_siguiente es None en la última
+    página. Cada fila es un dict con los datos a mostrar, sin instanciar
+    modelos.
+    """
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    qs = BloqueAtencion.objects.filter(estado='DISPONIBLE', fecha__gte=desde or date.today())
+    if veterinario_id:
+        qs = qs.filter(veterinario_id=veterinario_id)
+    if hora_desde:
+        qs = qs.filter(hora_inicio__gte=hora_desde)
+    if hora_hasta:
+        qs = qs.filter(hora_fin__lte=hora_hasta)
+    if cursor:
+        fecha, hora, codigo = decodificar_cursor(cursor)
+        qs = qs.filter(
+            Q(fecha__gt=fecha)
+            | Q(fecha=fecha, hora_inicio__gt=hora)
+            | Q(fecha=fecha, hora_inicio=hora, codigo_atencion__gt=codigo)
+        )
+
+    filas = list(
+        qs.order_by('fecha', 'hora_inicio', 'codigo_atencion').values(
+            'codigo_atencion', 'fecha', 'hora_inicio', 'hora_fin',
+            'veterinario_id', 'veterinario__nombre',
+        )[:limite + 1]
+    )
+    siguiente = codificar_cursor(filas[limite - 1]) if len(filas) > limite else None
+    return filas[:limite], siguiente
+
+
+def etiqueta(fila):
+    """Texto de una fila para listas y <option>, igual que BloqueAtencion.__str__."""
+    return (
+        f"{fila['codigo_atencion']} - {fila['fecha']} "
+        f"{fila['hora_inicio']}-{fila['hora_fin']} / {fila['veterinario__nombre']}"
+    )
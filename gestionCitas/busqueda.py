@@ -0,0 +1,249 @@
+# gestionCitas/busqueda.py
+import re
+import unicodedata
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef, Prefetch
+
+from .archivo import bloques_historicos
+from .models import BloqueAtencion, Cliente, Mascota, TerminoBusqueda
+from .transiciones import estado_efectivo
+
+LIMITE_POR_DEFECTO = 10
+LIMITE_MAXIMO = 50
+DIAS_CITAS_RECIENTES = 90
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni puntuación: 'José-Pérez' -> 'jose perez'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def _compacto(valor):
+    """RUT o chip sin separadores: '12.345.678-K' -> '12345678k'."""
+    return normalizar(valor).replace(' ', '')
+
+
+def terminos_cliente(cliente):
+    return {_compacto(cliente.rut_cli), *normalizar(cliente.nombre).split()} - {''}
+
+
+def terminos_mascota(mascota):
+    return {_compacto(mascota.codigo_chip), *normalizar(mascota.nombre).split()} - {''}
+
+
+def _filas(tipo, clave, terminos):
+    return [TerminoBusqueda(termino=t[:100], tipo=tipo, clave=clave) for t in terminos]
+
+
+def indexar_cliente(cliente):
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(tipo='C', clave=cliente.pk).delete()
+        TerminoBusqueda.objects.bulk_create(_filas('C', cliente.pk, terminos_cliente(cliente)))
+
+
+def indexar_mascota(mascota):
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(tipo='M', clave=mascota.pk).delete()
+        TerminoBusqueda.objects.bulk_create(_filas('M', mascota.pk, terminos_mascota(mascota)))
+
+
+def indexar_lote(clientes=(), mascotas=()):
+    """Reindexa de una vez los objetos de una carga masiva (bulk_create no dispara señales)."""
+    with transaction.atomic():
+        for tipo, objetos, terminos in (('C', clientes, terminos_cliente), ('M', mascotas, terminos_mascota)):
+            claves = [obj.pk for obj in objetos]
+            if claves:
+                TerminoBusqueda.objects.filter(tipo=tipo, clave__in=claves).delete()
+                TerminoBusqueda.objects.bulk_create(
+                    [fila for obj in objetos for fila in _filas(tipo, obj.pk, terminos(obj))]
+                )
+
+
+def desindexar(tipo, clave):
+    TerminoBusqueda.objects.filter(tipo=tipo, clave=clave).delete()
+
+
+def reindexar_todo(tamano_lote=5000):
+    """Reconstruye el índice completo recorriendo clientes y mascotas por lotes."""
+    with transaction.atomic():
+        TerminoBusqueda.objects.all().delete()
+        total = 0
+        for tipo, qs, terminos in (
+            ('C', Cliente.objects.only('rut_cli', 'nombre'), terminos_cliente),
+            ('M', Mascota.objects.only('codigo_chip', 'nombre'), terminos_mascota),
+        ):
+            lote = []
+            for obj in qs.iterator(chunk_size=tamano_lote):
+                lote.extend(_filas(tipo, obj.pk, terminos(obj)))
+                if len(lote) >= tamano_lote:
+                    TerminoBusqueda.objects.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            TerminoBusqueda.objects.bulk_create(lote)
+            total += len(lote)
+    return total
+
+
+def _rango(termino):
+    """
+    Filtro de los términos que empiezan con `termino`, como rango
+    (termino <= x < siguiente) para que use el índice en cualquier base.
+    """
+    siguiente = termino[:-1] + chr(ord(termino[-1]) + 1)
+    return {'termino__gte': termino, 'termino__lt': siguiente}
+
+
+def _coincidencias(palabras, limite):
+    """
+    (tipo, clave) que tienen un término por cada palabra, ordenados por el
+    primer término que coincide con la primera. Las demás palabras se cruzan
+    en SQL (EXISTS sobre el índice por objeto), así que no se pierden
+    resultados por cortar la lista de candidatos antes de cruzarla. Se
+    agrupa por objeto antes de limitar: uno que calza con varios términos
+    ocupa un solo lugar.
+    """
+    qs = TerminoBusqueda.objects.filter(**_rango(palabras[0]))
+    for palabra in palabras[1:]:
+        qs = qs.filter(Exists(TerminoBusqueda.objects.filter(
+            tipo=OuterRef('tipo'), clave=OuterRef('clave'), **_rango(palabra),
+        )))
+    filas = (
+        qs.values('tipo', 'clave').annotate(primero=Min('termino'))
+        .order_by('primero', 'tipo', 'clave').values_list('tipo', 'clave', 'primero')[:limite]
+    )
+    return [(tipo, clave) for tipo, clave, _ in filas]
+
+
+def autocompletar(consulta, limite=LIMITE_POR_DEFECTO):
+    """
+    Busca clientes y mascotas por prefijo de RUT, chip o palabras del nombre.
+    Con varias palabras, cada una debe coincidir con algún término del mismo
+    cliente o mascota. Retorna una lista de dicts listos para JSON.
+    """
+    palabras = normalizar(consulta).split()
+    if not palabras:
+        return []
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    # La palabra más larga es la más selectiva: es la que recorre el índice
+    palabras.sort(key=len, reverse=True)
+    candidatos = _coincidencias(palabras, limite)
+
+    # Un RUT o chip escrito con separadores ('12.345.678-K') también se busca entero
+    if len(palabras) > 1:
+        candidatos = _coincidencias([_compacto(consulta)], limite) + candidatos
+    candidatos = list(dict.fromkeys(candidatos))[:limite]
+
+    ruts = [clave for tipo, clave in candidatos if tipo == 'C']
+    chips = [clave for tipo, clave in candidatos if tipo == 'M']
+    clientes = {c.pk: c for c in Cliente.objects.filter(pk__in=ruts).only('rut_cli', 'nombre')} if ruts else {}
+    mascotas = {
+        m.pk: m for m in Mascota.objects.filter(pk__in=chips).select_related('dueño')
+        .only('codigo_chip', 'nombre', 'especie', 'dueño__rut_cli', 'dueño__nombre')
+    } if chips else {}
+
+    resultados = []
+    for tipo, clave in candidatos:
+        if tipo == 'C' and clave in clientes:
+            c = clientes[clave]
+            resultados.append({'tipo': 'cliente', 'rut': c.rut_cli, 'nombre': c.nombre})
+        elif tipo == 'M' and clave in mascotas:
+            m = mascotas[clave]
+            resultados.append({
+                'tipo': 'mascota', 'codigo_chip': m.codigo_chip, 'nombre': m.nombre,
+                'especie': m.especie, 'dueno_rut': m.dueño.rut_cli, 'dueno_nombre': m.dueño.nombre,
+            })
+    return resultados
+
+
+# ===== Ficha combinada cliente + mascotas + citas =====
+
+def _mascota_json(m):
+    return {
+        'codigo_chip': m.codigo_chip,
+        'nombre': m.nombre,
+        'especie': m.especie,
+        'raza': m.raza,
+        'edad': m.edad if m.edad is not None else '',
+        'peso': str(m.peso) if m.peso is not None else '',
+    }
+
+
+def ficha_cliente(rut=None, chip=None):
+    """
+    Cliente (por RUT o por el chip de una de sus mascotas) con todas sus
+    mascotas y sus citas de los últimos DIAS_CITAS_RECIENTES días en
+    adelante. Son tres consultas fijas: cliente, mascotas y bloques.
+    Retorna None si no se encuentra.
+    """
+    hoy = date.today()
+    citas = BloqueAtencion.objects.filter(
+        fecha__gte=hoy - timedelta(days=DIAS_CITAS_RECIENTES),
+        estado__in=('RESERVADO', 'COMPLETADA'),
+    ).select_related('veterinario').order_by('fecha', 'hora_inicio')
+
+    qs = Cliente.objects.prefetch_related(
+        Prefetch('mascotas', queryset=Mascota.objects.order_by('nombre')),
+        Prefetch('mascotas__bloques', queryset=citas, to_attr='citas'),
+    )
+    qs = qs.filter(rut_cli=rut) if rut else qs.filter(mascotas__codigo_chip=chip)
+    cliente = qs.first()
+    if cliente is None:
+        return None
+
+    mascotas = list(cliente.mascotas.all())
+    todas = sorted(
+        ((b, m) for m in mascotas for b in m.citas),
+        key=lambda par: (par[0].fecha, par[0].hora_inicio),
+    )
+    return {
+        'cliente': {
+            'rut': cliente.rut_cli,
+            'nombre': cliente.nombre,
+            'telefono': cliente.telefono,
+            'email': cliente.email,
+            'direccion': cliente.direccion,
+        },
+        'mascotas': [_mascota_json(m) for m in mascotas],
+        'mascota': next((_mascota_json(m) for m in mascotas if m.codigo_chip == chip), None),
+        'citas': [{
+            'codigo_atencion': b.codigo_atencion,
+            'codigo_cita': b.codigo_cita,
+            'fecha': b.fecha.isoformat(),
+            'hora_inicio': b.hora_inicio.strftime('%H:%M'),
+            'hora_fin': b.hora_fin.strftime('%H:%M'),
+            'estado': estado_efectivo(b.estado, b.fecha, hoy),
+            'proxima': b.fecha >= hoy,
+            'veterinario': b.veterinario.nombre,
+            'mascota': m.nombre,
+        } for b, m in todas],
+    }
+
+
+def historial_mascota(chip, desde=None):
+    """
+    Todas las citas de una mascota (o desde `desde`), incluidas las que ya
+    se movieron al archivo, de la más reciente a la más antigua.
+    """
+    hoy = date.today()
+    campos = ('codigo_atencion', 'fecha', 'hora_inicio', 'hora_fin', 'estado', 'motivo_consulta',
+              'veterinario__nombre')
+    filas = bloques_historicos(
+        campos, ('-fecha', '-hora_inicio'), desde,
+        mascota_id=chip, estado__in=('RESERVADO', 'COMPLETADA', 'CANCELADO_VET', 'CANCELADO_PAC'),
+    )
+    return [{
+        'codigo_atencion': codigo,
+        'fecha': fecha.isoformat(),
+        'hora_inicio': inicio.strftime('%H:%M'),
+        'hora_fin': fin.strftime('%H:%M'),
+        'estado': estado_efectivo(estado, fecha, hoy),
+        'motivo_consulta': motivo,
+        'veterinario': veterinario,
+    } for codigo, fecha, inicio, fin, estado, motivo, veterinario in filas]
+
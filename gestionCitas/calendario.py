@@ -0,0 +1,146 @@
+# gestionCitas/calendario.py
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.template.loader import render_to_string
+
+from main.routers import PRIMARIA
+
+from .filas import filas_bloques
+from .models import BloqueAtencion
+from .transiciones import estado_efectivo
+from .versiones import version_datos
+
+MARCADOR_CSRF = '<!--csrf-->'
+
+
+def bloques_del_mes(year, month, veterinario_id=None, using=None):
+    """
+    Queryset de los bloques del mes (opcionalmente de un veterinario),
+    ordenados por fecha y hora de inicio. `using` fija la base (si no, la
+    elige el router).
+    """
+    _, num_dias = monthrange(year, month)
+    qs = BloqueAtencion.objects.db_manager(using).filter(
+        fecha__range=(date(year, month, 1), date(year, month, num_dias))
+    )
+    if veterinario_id:
+        qs = qs.filter(veterinario_id=veterinario_id)
+    return qs.order_by('fecha', 'hora_inicio')
+
+
+def construir_semanas(year, month, bloques):
+    """
+    Agrupa bloques (FilaBloque) ya ordenados por fecha en la grilla de
+    semanas del mes.
+
+    Cada semana es una lista de 7 elementos: None para los espacios en blanco
+    o un dict {'fecha': date, 'bloques': [FilaBloque, ...]}.
+    """
+    primer_dia_semana, num_dias = monthrange(year, month)
+
+    dias = [{'fecha': date(year, month, d), 'bloques': []} for d in range(1, num_dias + 1)]
+    for bloque in bloques:
+        dias[bloque.fecha.day - 1]['bloques'].append(bloque)
+
+    celdas = [None] * primer_dia_semana + dias
+    celdas += [None] * (-len(celdas) % 7)
+    return [celdas[i:i + 7] for i in range(0, len(celdas), 7)]
+
+
+def semanas_del_mes(year, month, veterinario_id=None, using=None):
+    """
+    Grilla del mes lista para la plantilla, con una única consulta a bloques
+    que trae solo las columnas que se muestran (ver gestionCitas.filas). Las
+    reservas de días pasados se muestran como COMPLETADA.
+    """
+    return construir_semanas(year, month, filas_bloques(bloques_del_mes(year, month, veterinario_id, using)))
+
+
+# ===== Cache de la grilla renderizada =====
+
+def grilla_mes_html(year, month, veterinario_id=None):
+    """
+    HTML de la grilla del mes, cacheado por (año, mes, veterinario, versión de
+    datos, día actual). Si nada cambió no se consulta la tabla de bloques ni
+    se vuelve a renderizar. El HTML trae MARCADOR_CSRF donde va el token.
+
+    Se arma siempre con la base principal, igual que se lee la versión: con
+    una réplica atrasada quedaría cacheado un mes viejo bajo la versión
+    nueva, y lo verían todos hasta el siguiente cambio.
+    """
+    clave = 'calendario:grilla:{}:{}:{}:{}:{}'.format(
+        version_datos(), date.today().isoformat(), year, month, veterinario_id or ''
+    )
+    html = cache.get(clave)
+    if html is None:
+        html = render_to_string('gestionCitas/_grilla_mes.html', {
+            'semanas': semanas_del_mes(year, month, veterinario_id, using=PRIMARIA),
+            'year': year,
+            'month': month,
+            'veterinario_seleccionado': veterinario_id or None,
+        })
+        cache.set(clave, html, getattr(settings, 'CALENDARIO_CACHE_TTL', 3600))
+    return html
+
+
+# ===== Datos compactos para la API JSON =====
+
+CAMPOS_API = (
+    'codigo_atencion', 'veterinario_id', 'fecha', 'hora_inicio', 'hora_fin',
+    'estado', 'mascota_id', 'mascota__nombre', 'motivo_consulta',
+)
+
+
+def rango_periodo(periodo, params):
+    """
+    Rango de fechas (desde, hasta) de un periodo 'mes', 'semana' o 'dia'
+    según los parámetros GET. Lanza ValueError si son inválidos.
+    """
+    hoy = date.today()
+    if periodo == 'mes':
+        year = int(params.get('year', hoy.year))
+        month = int(params.get('month', hoy.month))
+        return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+    fecha_str = params.get('fecha')
+    fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date() if fecha_str else hoy
+    if periodo == 'semana':
+        lunes = fecha - timedelta(days=fecha.weekday())
+        return lunes, lunes + timedelta(days=6)
+    if periodo == 'dia':
+        return fecha, fecha
+    raise ValueError(periodo)
+
+
+def bloques_periodo(desde, hasta, veterinario_id=None):
+    qs = BloqueAtencion.objects.filter(fecha__range=(desde, hasta))
+    if veterinario_id:
+        qs = qs.filter(veterinario_id=veterinario_id)
+    return qs
+
+
+def sello_bloques(qs):
+    """
+    (última modificación, cantidad) de los bloques del queryset. Cambia con
+    cualquier alta o modificación; la cantidad cubre además los borrados.
+    """
+    sello = qs.aggregate(ultimo=Max('actualizado'), total=Count('pk'))
+    return sello['ultimo'], sello['total']
+
+
+def filas_api(qs):
+    """Filas compactas (listas) en el orden de CAMPOS_API, sin instanciar modelos."""
+    hoy = date.today()
+    filas = []
+    for codigo, vet, fecha, inicio, fin, estado, chip, mascota, motivo in (
+        qs.order_by('fecha', 'hora_inicio').values_list(*CAMPOS_API)
+    ):
+        filas.append([
+            codigo, vet, fecha.isoformat(), inicio.strftime('%H:%M'), fin.strftime('%H:%M'),
+            estado_efectivo(estado, fecha, hoy), chip, mascota, motivo,
+        ])
+    return filas
@@ -0,0 +1,119 @@
+# gestionCitas/codigos.py
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db import IntegrityError, transaction
+
+# Base32 de Crockford: sin I, L, O ni U, y su orden ASCII es el orden numérico
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LARGO = 10
+
+# 8 caracteres de milisegundos (40 bits, alcanza hasta ~2059) + 2 de contador (10 bits)
+BITS_CONTADOR = 10
+MAX_CONTADOR = (1 << BITS_CONTADOR) - 1
+# Cada milisegundo el contador parte en un valor al azar bajo este tope. Eso
+# baja la probabilidad de que dos procesos que generan en el mismo
+# milisegundo repitan un código, pero no la elimina: quien inserta códigos
+# nuevos como clave primaria lo hace con insertar_con_reintento()
+INICIO_CONTADOR_MAX = 1 << (BITS_CONTADOR - 2)
+INTENTOS_INSERCION = 3
+EPOCA = datetime(2025, 1, 1, tzinfo=timezone.utc)
+EPOCA_MS = int(EPOCA.timestamp() * 1000)
+
+
+def codificar(numero, largo=LARGO):
+    caracteres = []
+    for _ in range(largo):
+        numero, resto = divmod(numero, 32)
+        caracteres.append(ALFABETO[resto])
+    return ''.join(reversed(caracteres))
+
+
+def decodificar(codigo):
+    numero = 0
+    for caracter in codigo.upper():
+        numero = numero * 32 + ALFABETO.index(caracter)
+    return numero
+
+
+class GeneradorCodigos:
+    """
+    Códigos de 10 caracteres ordenables por tiempo: milisegundos desde EPOCA
+    seguidos de un contador. Dentro de un proceso son estrictamente
+    crecientes y nunca se repiten (entre procesos sí pueden, ver
+    insertar_con_reintento); si en un milisegundo se agota el
+    contador, se toma prestado el milisegundo siguiente. Así los inserts
+    quedan al final del índice de la clave primaria en vez de repartirse.
+    """
+
+    def __init__(self, reloj=time.time, azar=None):
+        self._reloj = reloj
+        self._azar = azar or random.SystemRandom()
+        self._lock = threading.Lock()
+        self._ultimo_ms = -1
+        self._contador = 0
+
+    def reiniciar(self):
+        """Olvida el estado (se usa tras un fork para no repetir los códigos del padre)."""
+        self._lock = threading.Lock()
+        self._ultimo_ms = -1
+
+    def _avanzar(self):
+        ahora = int(self._reloj() * 1000) - EPOCA_MS
+        if ahora > self._ultimo_ms:
+            self._ultimo_ms = ahora
+            self._contador = self._azar.randrange(INICIO_CONTADOR_MAX)
+        elif self._contador < MAX_CONTADOR:
+            self._contador += 1
+        else:
+            self._ultimo_ms += 1
+            self._contador = self._azar.randrange(INICIO_CONTADOR_MAX)
+        return codificar((self._ultimo_ms << BITS_CONTADOR) | self._contador)
+
+    def siguiente(self):
+        with self._lock:
+            return self._avanzar()
+
+    def lote(self, cantidad):
+        with self._lock:
+            return [self._avanzar() for _ in range(cantidad)]
+
+
+_generador = GeneradorCodigos()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_generador.reiniciar)
+
+
+def nuevo_codigo():
+    """Código único y ordenable por tiempo para codigo_atencion o codigo_cita."""
+    return _generador.siguiente()
+
+
+def nuevos_codigos(cantidad):
+    """`cantidad` códigos crecientes de una vez, para cargas masivas."""
+    return _generador.lote(cantidad)
+
+
+def instante_codigo(codigo):
+    """Momento (UTC) en que se generó un código de este módulo."""
+    ms = decodificar(codigo) >> BITS_CONTADOR
+    return EPOCA + timedelta(milliseconds=ms)
+
+
+def insertar_con_reintento(insertar, intentos=INTENTOS_INSERCION):
+    """
+    Ejecuta insertar() en un savepoint y, si choca con una clave ya
+    existente (otro proceso generó el mismo código en el mismo
+    milisegundo), lo vuelve a intentar. En cada reintento insertar() debe
+    usar códigos nuevos.
+    """
+    for intento in range(intentos):
+        try:
+            with transaction.atomic():
+                return insertar()
+        except IntegrityError:
+            if intento + 1 == intentos:
+                raise
@@ -0,0 +1,100 @@
+# gestionCitas/disponibilidad.py
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from .codigos import insertar_con_reintento, nuevo_codigo, nuevos_codigos
+from .models import BloqueAtencion, Veterinario
+from .solapamiento import IndiceIntervalos
+
+TAMANO_LOTE = 1000
+
+
+def expandir_plantilla(veterinario_ids, fecha_inicio, fecha_fin, dias_semana,
+                       hora_inicio, hora_fin, duracion_minutos):
+    """
+    Genera las tuplas (veterinario_id, fecha, hora_inicio, hora_fin) de una
+    plantilla semanal. `dias_semana` usa la convención de date.weekday()
+    (0 = lunes ... 6 = domingo).
+    """
+    dias_semana = set(dias_semana)
+    duracion = timedelta(minutes=duracion_minutos)
+
+    # Los cortes del día son los mismos para todas las fechas: se calculan una vez
+    cortes = []
+    actual = datetime.combine(fecha_inicio, hora_inicio)
+    limite = datetime.combine(fecha_inicio, hora_fin)
+    while actual + duracion <= limite:
+        cortes.append((actual.time(), (actual + duracion).time()))
+        actual += duracion
+
+    fecha = fecha_inicio
+    while fecha <= fecha_fin:
+        if fecha.weekday() in dias_semana:
+            for vet_id in veterinario_ids:
+                for inicio, fin in cortes:
+                    yield vet_id, fecha, inicio, fin
+        fecha += timedelta(days=1)
+
+
+def _insertar_lote(lote):
+    """bulk_create del lote; si un código choca, se reintenta con códigos nuevos para todo el lote."""
+    reintento = False
+
+    def insertar():
+        nonlocal reintento
+        if reintento:
+            for bloque, codigo in zip(lote, nuevos_codigos(len(lote))):
+                bloque.codigo_atencion = codigo
+        reintento = True
+        return BloqueAtencion.objects.bulk_create(lote)
+
+    insertar_con_reintento(insertar)
+
+
+def crear_bloques_recurrentes(veterinario_ids, fecha_inicio, fecha_fin, dias_semana,
+                              hora_inicio, hora_fin, duracion_minutos):
+    """
+    Crea los bloques DISPONIBLE de una plantilla semanal con bulk_create por
+    lotes, todo dentro de una transacción. Los bloques que se solapan con uno
+    existente se omiten en vez de fallar.
+
+    Retorna un dict con la cantidad de bloques 'creados' y 'omitidos', y la
+    lista 'conflictos' con el detalle de cada bloque omitido.
+    """
+    veterinario_ids = list(veterinario_ids)
+    creados = 0
+    conflictos = []
+    lote = []
+    with transaction.atomic():
+        # Mismo bloqueo que agregar_disponibilidad: nadie agrega bloques de
+        # estos veterinarios entre la carga del índice y el último lote
+        list(Veterinario.objects.select_for_update().filter(pk__in=veterinario_ids).values_list('pk'))
+        indice = IndiceIntervalos.cargar(veterinario_ids, fecha_inicio, fecha_fin)
+        for vet_id, fecha, inicio, fin in expandir_plantilla(
+            veterinario_ids, fecha_inicio, fecha_fin, dias_semana,
+            hora_inicio, hora_fin, duracion_minutos,
+        ):
+            conflicto = indice.verificar(vet_id, fecha, inicio, fin)
+            if conflicto:
+                conflictos.append(conflicto)
+                continue
+            codigo = nuevo_codigo()
+            indice.agregar(vet_id, fecha, inicio, fin, codigo)
+            lote.append(BloqueAtencion(
+                codigo_atencion=codigo,
+                veterinario_id=vet_id,
+                fecha=fecha,
+                hora_inicio=inicio,
+                hora_fin=fin,
+                estado='DISPONIBLE',
+            ))
+            if len(lote) >= TAMANO_LOTE:
+                _insertar_lote(lote)
+                creados += len(lote)
+                lote = []
+        if lote:
+            _insertar_lote(lote)
+            creados += len(lote)
+
+    return {'creados': creados, 'omitidos': len(conflictos), 'conflictos': conflictos}
@@ -0,0 +1,72 @@
+# gestionCitas/exportacion.py
+import csv
+from datetime import date
+
+from .archivo import bloques_historicos
+from .transiciones import estado_efectivo, filtro_estado_efectivo
+
+TAMANO_TROZO = 2000
+
+# (encabezado, campo) en el orden del CSV. Los datos de mascota y dueño se
+# resuelven con JOIN en la misma consulta, sin instanciar modelos.
+COLUMNAS = [
+    ('codigo_atencion', 'codigo_atencion'),
+    ('codigo_cita', 'codigo_cita'),
+    ('fecha', 'fecha'),
+    ('hora_inicio', 'hora_inicio'),
+    ('hora_fin', 'hora_fin'),
+    ('estado', 'estado'),
+    ('rut_veterinario', 'veterinario__rut_vet'),
+    ('veterinario', 'veterinario__nombre'),
+    ('chip', 'mascota__codigo_chip'),
+    ('mascota', 'mascota__nombre'),
+    ('especie', 'mascota__especie'),
+    ('rut_dueno', 'mascota__dueño__rut_cli'),
+    ('dueno', 'mascota__dueño__nombre'),
+    ('telefono', 'mascota__dueño__telefono'),
+    ('email', 'mascota__dueño__email'),
+    ('motivo_consulta', 'motivo_consulta'),
+]
+_INDICE_ESTADO = [campo for _, campo in COLUMNAS].index('estado')
+_INDICE_FECHA = [campo for _, campo in COLUMNAS].index('fecha')
+
+
+def filas_agenda(desde, hasta, veterinario_id=None, estado=None, tamano_trozo=TAMANO_TROZO):
+    """
+    Tuplas de la agenda entre `desde` y `hasta` (inclusive), leídas por
+    trozos con iterator(): la memoria no depende del largo del rango. Un
+    rango anterior al corte de archivo incluye los bloques archivados.
+    `estado` filtra por el estado efectivo, el mismo que sale en la columna:
+    COMPLETADA incluye las reservas de días pasados y RESERVADO no.
+    """
+    hoy = date.today()
+    filtros = {}
+    if veterinario_id:
+        filtros['veterinario_id'] = veterinario_id
+    condicion = filtro_estado_efectivo(estado, hoy) if estado else None
+    for fila in (
+        bloques_historicos(
+            [campo for _, campo in COLUMNAS], ('fecha', 'hora_inicio', 'veterinario__rut_vet'),
+            desde, hasta, condicion, **filtros,
+        ).iterator(chunk_size=tamano_trozo)
+    ):
+        fila = list(fila)
+        fila[_INDICE_ESTADO] = estado_efectivo(fila[_INDICE_ESTADO], fila[_INDICE_FECHA], hoy)
+        yield fila
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: write() devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(filas, bom=False):
+    """Líneas CSV (encabezado incluido) a medida que llegan las filas."""
+    escritor = csv.writer(_Eco())
+    encabezado = escritor.writerow([nombre for nombre, _ in COLUMNAS])
+    # El BOM hace que Excel abra el archivo como UTF-8
+    yield ('\ufeff' + encabezado) if bom else encabezado
+    for fila in filas:
+        yield escritor.writerow(fila)
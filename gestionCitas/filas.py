@@ -0,0 +1,68 @@
+# gestionCitas/filas.py
+from datetime import date
+from urllib.parse import quote
+
+from django.urls import reverse
+
+from .transiciones import estado_efectivo
+
+# Columnas que muestran la grilla del mes y la agenda del día. Se leen con
+# values_list: sin instancias de modelo ni las columnas anchas (dirección,
+# email, teléfono) de veterinario, mascota y dueño.
+CAMPOS = (
+    'codigo_atencion', 'fecha', 'hora_inicio', 'hora_fin', 'estado', 'motivo_consulta',
+    'veterinario__nombre', 'mascota_id', 'mascota__nombre', 'mascota__especie',
+)
+CAMPOS_CON_DUENO = CAMPOS + ('mascota__dueño__nombre',)
+
+_MARCA = 'CODIGO'
+
+
+class FilaBloque:
+    """Bloque listo para la plantilla, con los enlaces ya armados."""
+
+    __slots__ = (
+        'pk', 'fecha', 'hora_inicio', 'hora_fin', 'estado', 'motivo_consulta', 'veterinario_nombre',
+        'chip', 'mascota_nombre', 'mascota_especie', 'dueno_nombre',
+        'url_agendar', 'url_reprogramar', 'url_cancelar',
+    )
+
+    @property
+    def mascota(self):
+        """Mismo texto que str(Mascota): 'Firulais (Perro)'."""
+        return f"{self.mascota_nombre} ({self.mascota_especie})" if self.chip else ''
+
+    def __repr__(self):
+        return f"<FilaBloque {self.pk} {self.fecha} {self.hora_inicio} {self.estado}>"
+
+
+def _plantilla_url(nombre):
+    """Parte la URL en (antes, después) del código: un reverse() por llamada, no por bloque."""
+    antes, _, despues = reverse(nombre, args=[_MARCA]).partition(_MARCA)
+    return antes, despues
+
+
+def filas_bloques(qs, hoy=None, con_dueno=False):
+    """
+    Lista de FilaBloque de un queryset de BloqueAtencion, en el orden del
+    queryset y con el estado efectivo ya aplicado. `con_dueno` agrega el
+    nombre del dueño (un JOIN más).
+    """
+    hoy = hoy or date.today()
+    agendar = _plantilla_url('gestionCitas:agendar_cita')
+    reprogramar = _plantilla_url('gestionCitas:reprogramar_cita')
+    cancelar = _plantilla_url('gestionCitas:cancelar_bloques_veterinario')
+
+    filas = []
+    for valores in qs.values_list(*(CAMPOS_CON_DUENO if con_dueno else CAMPOS)):
+        fila = FilaBloque()
+        (fila.pk, fila.fecha, fila.hora_inicio, fila.hora_fin, estado, fila.motivo_consulta,
+         fila.veterinario_nombre, fila.chip, fila.mascota_nombre, fila.mascota_especie) = valores[:10]
+        fila.dueno_nombre = valores[10] if con_dueno else None
+        fila.estado = estado_efectivo(estado, fila.fecha, hoy)
+        codigo = quote(fila.pk, safe='')
+        fila.url_agendar = agendar[0] + codigo + agendar[1]
+        fila.url_reprogramar = reprogramar[0] + codigo + reprogramar[1]
+        fila.url_cancelar = cancelar[0] + codigo + cancelar[1]
+        filas.append(fila)
+    return filas
@@ -1,6 +1,10 @@
 # gestionCitas/forms.py
+from datetime import date
+
 from django import forms
+from .bloques_libres import bloques_libres, etiqueta
 from .models import BloqueAtencion, Mascota, Veterinario, Cliente
+from .validators import normalizar_rut
 
 
 class CancelarBloquesForm(forms.Form):
@@ -8,6 +12,70 @@ class CancelarBloquesForm(forms.Form):
     fecha_inicio = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     fecha_fin = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
 
+    def clean(self):
+        cleaned = super().clean()
+        fecha_inicio, fecha_fin = cleaned.get('fecha_inicio'), cleaned.get('fecha_fin')
+        if fecha_inicio and fecha_fin and fecha_inicio > fecha_fin:
+            raise forms.ValidationError('La fecha de inicio debe ser anterior o igual a la de fin.')
+        return cleaned
+
+
+class ExportarAgendaForm(forms.Form):
+    desde = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    veterinario = forms.ModelChoiceField(queryset=Veterinario.objects.all(), required=False)
+    estado = forms.ChoiceField(
+        choices=[('', 'Todos')] + BloqueAtencion.ESTADO_CHOICES, required=False
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        desde, hasta = cleaned.get('desde'), cleaned.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha de inicio debe ser anterior o igual a la de fin.')
+        return cleaned
+
+
+class ReporteForm(forms.Form):
+    desde = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    veterinario = forms.ModelChoiceField(queryset=Veterinario.objects.all(), required=False)
+    agrupacion = forms.ChoiceField(choices=[('semana', 'Semana'), ('mes', 'Mes')], initial='semana')
+
+    def clean(self):
+        cleaned = super().clean()
+        desde, hasta = cleaned.get('desde'), cleaned.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha de inicio debe ser anterior o igual a la de fin.')
+        return cleaned
+
+
+class DisponibilidadRecurrenteForm(forms.Form):
+    DIAS_SEMANA = [
+        (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+        (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+    ]
+
+    veterinarios = forms.ModelMultipleChoiceField(queryset=Veterinario.objects.all())
+    fecha_inicio = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    fecha_fin = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    dias_semana = forms.TypedMultipleChoiceField(
+        choices=DIAS_SEMANA, coerce=int, widget=forms.CheckboxSelectMultiple
+    )
+    hora_inicio = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
+    hora_fin = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
+    duracion = forms.IntegerField(min_value=5, max_value=480, initial=30, label='Duración (minutos)')
+
+    def clean(self):
+        cleaned = super().clean()
+        fecha_inicio, fecha_fin = cleaned.get('fecha_inicio'), cleaned.get('fecha_fin')
+        if fecha_inicio and fecha_fin and fecha_inicio > fecha_fin:
+            raise forms.ValidationError('La fecha de inicio debe ser anterior o igual a la de fin.')
+        hora_inicio, hora_fin = cleaned.get('hora_inicio'), cleaned.get('hora_fin')
+        if hora_inicio and hora_fin and hora_inicio >= hora_fin:
+            raise forms.ValidationError('La hora de inicio debe ser anterior a la de fin.')
+        return cleaned
+
 
 class ReprogramarCitaForm(forms.Form):
     nuevo_bloque = forms.ModelChoiceField(
@@ -15,14 +83,30 @@ class ReprogramarCitaForm(forms.Form):
         label='Nuevo bloque disponible'
     )
 
+    # Opciones que se muestran de entrada; el resto se carga por páginas
+    # desde la API de bloques libres.
+    OPCIONES_INICIALES = 20
+
     def __init__(self, *args, **kwargs):
         veterinario = kwargs.pop('veterinario', None)
         super().__init__(*args, **kwargs)
 
-        qs = BloqueAtencion.objects.filter(estado='DISPONIBLE')
+        # La validación solo hace un get() sobre este queryset
+        qs = BloqueAtencion.objects.filter(estado='DISPONIBLE', fecha__gte=date.today())
         if veterinario:
             qs = qs.filter(veterinario=veterinario)
-        self.fields['nuevo_bloque'].queryset = qs.order_by('fecha', 'hora_inicio')
+        campo = self.fields['nuevo_bloque']
+        campo.queryset = qs
+
+        # No se renderiza el queryset completo: solo la primera página
+        filas, self.cursor_siguiente = bloques_libres(
+            veterinario_id=veterinario.pk if veterinario else None,
+            limite=self.OPCIONES_INICIALES,
+        )
+        campo.widget.choices = [('', campo.empty_label)] + [
+            (f['codigo_atencion'], etiqueta(f)) for f in filas
+        ]
+        self.veterinario = veterinario
 
 
 class ClienteForm(forms.ModelForm):
@@ -31,8 +115,7 @@ class ClienteForm(forms.ModelForm):
         fields = ['rut_cli', 'nombre', 'telefono', 'email', 'direccion']
 
     def clean_rut_cli(self):
-        rut = (self.cleaned_data.get('rut_cli') or '')
-        return rut.replace('-', '').replace(' ', '').replace('.', '').upper().strip()
+        return normalizar_rut(self.cleaned_data.get('rut_cli'))
 
 
 class MascotaForm(forms.ModelForm):
@@ -0,0 +1,148 @@
+# gestionCitas/ics.py
+import secrets
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max
+
+from .models import BloqueAtencion, Veterinario
+from .transiciones import estado_efectivo
+
+# Ventana móvil del feed alrededor de hoy
+DIAS_ATRAS = 30
+DIAS_ADELANTE = 180
+TAMANO_TROZO = 500
+
+# Bloques que son citas; los cancelados se publican como STATUS:CANCELLED
+ESTADOS_CITA = ('RESERVADO', 'COMPLETADA')
+ESTADOS_CANCELADOS = ('CANCELADO_VET', 'CANCELADO_PAC')
+
+CAMPOS = (
+    'codigo_atencion', 'codigo_cita', 'fecha', 'hora_inicio', 'hora_fin', 'estado',
+    'motivo_consulta', 'actualizado', 'mascota__nombre', 'mascota__especie',
+    'mascota__dueño__nombre', 'mascota__dueño__telefono',
+)
+
+
+def asignar_token(veterinario, regenerar=False):
+    """Token del feed del veterinario; lo crea (o lo cambia, revocando el anterior) si hace falta."""
+    if veterinario.token_calendario and not regenerar:
+        return veterinario.token_calendario
+    veterinario.token_calendario = secrets.token_urlsafe(32)
+    Veterinario.objects.filter(pk=veterinario.pk).update(token_calendario=veterinario.token_calendario)
+    return veterinario.token_calendario
+
+
+def ventana(hoy=None):
+    hoy = hoy or date.today()
+    return hoy - timedelta(days=DIAS_ATRAS), hoy + timedelta(days=DIAS_ADELANTE)
+
+
+def bloques_feed(veterinario_id, desde, hasta, cambios_desde=None):
+    """
+    Citas del veterinario en la ventana. Con `cambios_desde` solo las
+    modificadas después de ese momento, incluidas las canceladas (para que
+    el cliente las quite); se resuelve con el índice (veterinario, actualizado).
+    """
+    qs = BloqueAtencion.objects.filter(veterinario_id=veterinario_id, fecha__range=(desde, hasta))
+    if cambios_desde is None:
+        return qs.filter(estado__in=ESTADOS_CITA)
+    return qs.filter(
+        actualizado__gt=cambios_desde,
+        estado__in=ESTADOS_CITA + ESTADOS_CANCELADOS,
+        mascota__isnull=False,
+    )
+
+
+def sello_feed(veterinario_id, desde, hasta):
+    """
+    Sello del feed del veterinario para el ETag, en dos consultas: el último
+    cambio de sus bloques (índice veterinario, actualizado) y, en la
+    ventana, la cantidad de bloques, cuántos tienen mascota y el último
+    cambio de esas mascotas y sus dueños, cuyos datos salen en el feed.
+    Solo depende de este veterinario: una reserva con otro no lo cambia.
+
+    Retorna (último cambio de bloques, total, con mascota, último cambio de fichas).
+    """
+    bloques = BloqueAtencion.objects.filter(veterinario_id=veterinario_id)
+    ultimo = bloques.aggregate(ultimo=Max('actualizado'))['ultimo']
+    ventana = bloques.filter(fecha__range=(desde, hasta)).aggregate(
+        total=Count('pk'),
+        con_mascota=Count('mascota'),
+        mascotas=Max('mascota__actualizado'),
+        duenos=Max('mascota__dueño__actualizado'),
+    )
+    fichas = max(filter(None, (ventana['mascotas'], ventana['duenos'])), default=None)
+    return ultimo, ventana['total'], ventana['con_mascota'], fichas
+
+
+def escapar(texto):
+    """Escapa un TEXT de iCalendar (RFC 5545, 3.3.11)."""
+    return (
+        (texto or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def plegar(linea):
+    """Corta la línea en trozos de 75 octetos como pide el RFC, terminada en CRLF."""
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    partes, inicio, limite = [], 0, 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        # No cortar a mitad de un carácter UTF-8
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80:
+            fin -= 1
+        partes.append(datos[inicio:fin].decode('utf-8'))
+        inicio, limite = fin, 74  # las continuaciones empiezan con un espacio
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def _utc(momento):
+    return momento.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _local(fecha, hora):
+    # Hora "flotante": se muestra tal cual en el teléfono, como en la agenda
+    return datetime.combine(fecha, hora).strftime('%Y%m%dT%H%M%S')
+
+
+def lineas_ics(veterinario, filas, hoy=None):
+    """Genera el calendario línea a línea a partir de tuplas en el orden de CAMPOS."""
+    hoy = hoy or date.today()
+    yield plegar('BEGIN:VCALENDAR')
+    yield plegar('VERSION:2.0')
+    yield plegar('PRODID:-//Pochita S.A.//Agenda veterinaria//ES')
+    yield plegar('CALSCALE:GREGORIAN')
+    yield plegar('METHOD:PUBLISH')
+    yield plegar(f'X-WR-CALNAME:{escapar("Agenda " + veterinario.nombre)}')
+    for (codigo, codigo_cita, fecha, inicio, fin, estado, motivo, actualizado,
+         mascota, especie, dueno, telefono) in filas:
+        estado = estado_efectivo(estado, fecha, hoy)
+        resumen = f"{mascota} ({especie})" + (f" - {motivo}" if motivo else '')
+        descripcion = f"Dueño: {dueno} {telefono}\nEstado: {estado}\nCita: {codigo_cita or '-'}"
+        yield plegar('BEGIN:VEVENT')
+        yield plegar(f'UID:{codigo}@pochita')
+        yield plegar(f'DTSTAMP:{_utc(actualizado)}')
+        yield plegar(f'LAST-MODIFIED:{_utc(actualizado)}')
+        yield plegar(f'SEQUENCE:{int(actualizado.timestamp())}')
+        yield plegar(f'DTSTART:{_local(fecha, inicio)}')
+        yield plegar(f'DTEND:{_local(fecha, fin)}')
+        yield plegar(f'SUMMARY:{escapar(resumen)}')
+        yield plegar(f'DESCRIPTION:{escapar(descripcion)}')
+        yield plegar('STATUS:CANCELLED' if estado in ESTADOS_CANCELADOS else 'STATUS:CONFIRMED')
+        yield plegar('END:VEVENT')
+    yield plegar('END:VCALENDAR')
+
+
+def feed(veterinario, cambios_desde=None, hoy=None):
+    """Líneas del .ics del veterinario, leyendo la base por trozos con iterator()."""
+    desde, hasta = ventana(hoy)
+    filas = (
+        bloques_feed(veterinario.pk, desde, hasta, cambios_desde)
+        .order_by('fecha', 'hora_inicio')
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=TAMANO_TROZO)
+    )
+    return lineas_ics(veterinario, filas, hoy)
@@ -0,0 +1,173 @@
+# gestionCitas/importacion.py
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+from django.db import transaction
+
+from .busqueda import indexar_lote
+from .models import Cliente, Mascota
+from .validators import error_rut, normalizar_rut
+from .versiones import invalidar_calendario
+
+TAMANO_LOTE = 1000
+
+# Columnas aceptadas. Cada fila es un cliente y, opcionalmente, una de sus
+# mascotas (un cliente con varias mascotas va en varias filas).
+CAMPOS_CLIENTE = ('rut', 'nombre', 'telefono', 'email', 'direccion')
+CAMPOS_MASCOTA = ('chip', 'mascota', 'especie', 'raza', 'edad', 'peso')
+
+_validar_email = EmailValidator()
+
+
+def leer_registros(archivo, formato):
+    """Itera (número de línea, dict) de un archivo CSV o JSONL sin cargarlo entero."""
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for registro in lector:
+            yield lector.line_num, registro
+    else:
+        for numero, linea in enumerate(archivo, start=1):
+            if linea.strip():
+                try:
+                    registro = json.loads(linea)
+                except ValueError as e:
+                    yield numero, {'_error': f"JSON inválido: {e}"}
+                    continue
+                yield numero, registro if isinstance(registro, dict) else {'_error': 'Se esperaba un objeto JSON'}
+
+
+def _texto(registro, campo, largo):
+    valor = registro.get(campo)
+    valor = '' if valor is None else str(valor).strip()
+    if len(valor) > largo:
+        raise ValueError(f"'{campo}' supera los {largo} caracteres")
+    return valor
+
+
+def convertir(registro):
+    """
+    Valida y normaliza una fila. Retorna (Cliente, Mascota o None) sin tocar
+    la base de datos; lanza ValueError con el motivo si la fila no sirve.
+    """
+    if '_error' in registro:
+        raise ValueError(registro['_error'])
+
+    rut = normalizar_rut(str(registro.get('rut') or ''))
+    error = error_rut(rut)
+    if error:
+        raise ValueError(error)
+    nombre = _texto(registro, 'nombre', 100)
+    if not nombre:
+        raise ValueError("Falta el nombre del cliente")
+    email = _texto(registro, 'email', 254)
+    if email:
+        try:
+            _validar_email(email)
+        except ValidationError:
+            raise ValueError(f"Email inválido: {email}")
+    cliente = Cliente(
+        rut_cli=rut, nombre=nombre, email=email,
+        telefono=_texto(registro, 'telefono', 20),
+        direccion=_texto(registro, 'direccion', 10_000),
+    )
+
+    chip = _texto(registro, 'chip', 15)
+    if not chip:
+        return cliente, None
+    nombre_mascota, especie = _texto(registro, 'mascota', 100), _texto(registro, 'especie', 50)
+    if not nombre_mascota or not especie:
+        raise ValueError("La mascota necesita nombre y especie")
+    edad = _texto(registro, 'edad', 3)
+    peso = _texto(registro, 'peso', 7).replace(',', '.')
+    try:
+        edad = int(edad) if edad else None
+        peso = Decimal(peso).quantize(Decimal('0.01')) if peso else None
+        # Decimal acepta 'nan', que después no se puede comparar
+        if peso is not None and not peso.is_finite():
+            raise ValueError(peso)
+    except (ValueError, InvalidOperation):
+        raise ValueError("Edad o peso no numéricos")
+    if (edad is not None and edad < 0) or (peso is not None and not 0 <= peso < 1000):
+        raise ValueError("Edad o peso fuera de rango")
+    mascota = Mascota(
+        codigo_chip=chip, nombre=nombre_mascota, especie=especie,
+        raza=_texto(registro, 'raza', 50), edad=edad, peso=peso, dueño_id=rut,
+    )
+    return cliente, mascota
+
+
+class Importador:
+    """
+    Carga clientes y mascotas por lotes con upsert (bulk_create con
+    update_conflicts). Solo mantiene en memoria el lote actual; las filas
+    rechazadas se escriben en `errores` (JSONL) a medida que aparecen.
+    """
+
+    def __init__(self, errores=None, tamano_lote=TAMANO_LOTE):
+        self.errores = errores
+        self.tamano_lote = tamano_lote
+        self.resumen = {'leidos': 0, 'clientes': 0, 'mascotas': 0, 'rechazados': 0}
+        self._clientes = {}
+        self._mascotas = {}
+        self._lineas = {}
+
+    def rechazar(self, linea, registro, motivo):
+        self.resumen['rechazados'] += 1
+        if self.errores is not None:
+            self.errores.write(json.dumps(
+                {'linea': linea, 'error': motivo, 'registro': registro}, ensure_ascii=False, default=str,
+            ) + '\n')
+
+    def importar(self, registros):
+        for linea, registro in registros:
+            self.resumen['leidos'] += 1
+            try:
+                cliente, mascota = convertir(registro)
+            except ValueError as e:
+                self.rechazar(linea, registro, str(e))
+                continue
+            # Dentro del lote gana la última fila de cada RUT / chip
+            self._clientes[cliente.pk] = cliente
+            if mascota:
+                self._mascotas[mascota.pk] = mascota
+                self._lineas[mascota.pk] = (linea, registro)
+            if len(self._clientes) + len(self._mascotas) >= self.tamano_lote:
+                self._guardar_lote()
+        self._guardar_lote()
+        if self.resumen['mascotas']:
+            invalidar_calendario()
+        return self.resumen
+
+    def _guardar_lote(self):
+        if not self._clientes and not self._mascotas:
+            return
+        clientes, mascotas = list(self._clientes.values()), list(self._mascotas.values())
+
+        # Un chip ya registrado a nombre de otro cliente no se reasigna
+        duenos = dict(Mascota.objects.filter(pk__in=self._mascotas).values_list('pk', 'dueño_id'))
+        aceptadas = []
+        for m in mascotas:
+            if duenos.get(m.pk, m.dueño_id) != m.dueño_id:
+                self.rechazar(*self._lineas[m.pk], 'El chip ya está asociado a otro cliente')
+            else:
+                aceptadas.append(m)
+
+        # 'actualizado' va en update_fields: el upsert solo copia esos campos
+        # y el feed .ics lo usa para saber si cambiaron los datos
+        with transaction.atomic():
+            Cliente.objects.bulk_create(
+                clientes, update_conflicts=True, unique_fields=['rut_cli'],
+                update_fields=['nombre', 'telefono', 'email', 'direccion', 'actualizado'],
+            )
+            Mascota.objects.bulk_create(
+                aceptadas, update_conflicts=True, unique_fields=['codigo_chip'],
+                update_fields=['nombre', 'especie', 'raza', 'edad', 'peso', 'actualizado'],
+            )
+            indexar_lote(clientes, aceptadas)
+
+        self.resumen['clientes'] += len(clientes)
+        self.resumen['mascotas'] += len(aceptadas)
+        self._clientes, self._mascotas, self._lineas = {}, {}, {}
@@ -0,0 +1,39 @@
+# gestionCitas/management/commands/archivar_bloques.py
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionCitas.archivo import TAMANO_LOTE, archivar, fecha_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve a la tabla de archivo los bloques más antiguos que "
+        "ARCHIVO_DIAS_ACTIVOS días, por lotes en transacciones cortas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int,
+            help='Archivar solo lo anterior a esta cantidad de días (no menos que ARCHIVO_DIAS_ACTIVOS).',
+        )
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Bloques por transacción (por defecto {TAMANO_LOTE}).')
+
+    def handle(self, *args, **options):
+        corte = fecha_corte()
+        if options['dias'] is not None:
+            # Las lecturas solo miran el archivo antes de fecha_corte(); un
+            # corte más reciente dejaría bloques fuera de las consultas
+            corte = date.today() - timedelta(days=options['dias'])
+            if corte > fecha_corte():
+                raise CommandError(f"El corte no puede ser posterior a {fecha_corte()} (ARCHIVO_DIAS_ACTIVOS).")
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que cero.")
+
+        inicio = time.perf_counter()
+        movidos = archivar(corte, options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Bloques archivados: {movidos} (anteriores a {corte}) en {time.perf_counter() - inicio:.1f}s"
+        ))
@@ -0,0 +1,96 @@
+# gestionCitas/management/commands/benchmark_codigos.py
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from gestionCitas.codigos import GeneradorCodigos
+from gestionCitas.models import BloqueAtencion, Veterinario
+
+ALIAS = 'benchmark'
+
+
+def codigos_uuid():
+    return uuid.uuid4().hex[:10].upper()
+
+
+ESQUEMAS = [
+    ('uuid4 (actual)', lambda: codigos_uuid),
+    ('ordenado por tiempo', lambda: GeneradorCodigos().siguiente),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el rendimiento de inserción de bloques con códigos uuid4 "
+        "aleatorios y con códigos ordenados por tiempo, cada uno sobre una "
+        "base SQLite temporal nueva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloques', type=int, default=500_000)
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument('--tramos', type=int, default=5,
+                            help='Cuántas mediciones parciales mostrar mientras crece la tabla.')
+
+    def handle(self, *args, **options):
+        for nombre, fabrica in ESQUEMAS:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {nombre} =="))
+            self._medir(fabrica(), options['bloques'], options['lote'], options['tramos'])
+
+    def _medir(self, generar, total, tamano_lote, tramos):
+        ruta = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        connections.settings[ALIAS] = dict(
+            connections.settings['default'], ENGINE='django.db.backends.sqlite3', NAME=ruta
+        )
+        try:
+            executor = MigrationExecutor(connections[ALIAS])
+            executor.migrate(executor.loader.graph.leaf_nodes())
+            vet_ids = [f"{i:08d}K" for i in range(40)]
+            Veterinario.objects.using(ALIAS).bulk_create(
+                Veterinario(rut_vet=r, nombre=f"Vet {r}") for r in vet_ids
+            )
+
+            desde = date.today()
+            por_tramo = max(1, total // tramos)
+            insertados = 0
+            inicio_total = time.perf_counter()
+            while insertados < total:
+                inicio = time.perf_counter()
+                objetivo = min(total, insertados + por_tramo)
+                while insertados < objetivo:
+                    lote = []
+                    for n in range(insertados, min(objetivo, insertados + tamano_lote)):
+                        dia, resto = divmod(n, len(vet_ids) * 20)
+                        vet, slot = divmod(resto, 20)
+                        minutos = 9 * 60 + slot * 30
+                        lote.append(BloqueAtencion(
+                            codigo_atencion=generar(),
+                            veterinario_id=vet_ids[vet],
+                            fecha=desde + timedelta(days=dia),
+                            hora_inicio=f"{minutos // 60:02d}:{minutos % 60:02d}",
+                            hora_fin=f"{(minutos + 30) // 60:02d}:{(minutos + 30) % 60:02d}",
+                        ))
+                    with transaction.atomic(using=ALIAS):
+                        BloqueAtencion.objects.using(ALIAS).bulk_create(lote)
+                    insertados += len(lote)
+                segundos = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"hasta {insertados} filas: {por_tramo / segundos:,.0f} filas/s"
+                )
+            segundos = time.perf_counter() - inicio_total
+            self.stdout.write(self.style.SUCCESS(
+                f"Total {insertados} filas en {segundos:.1f}s "
+                f"({insertados / segundos:,.0f} filas/s), archivo {os.path.getsize(ruta) / 1e6:.1f} MB"
+            ))
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.settings[ALIAS]
+            if os.path.exists(ruta):
+                os.remove(ruta)
@@ -0,0 +1,136 @@
+# gestionCitas/management/commands/benchmark_indices.py
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from gestionCitas.transiciones import filtro_por_completar
+
+ALIAS = 'benchmark'
+ANTES = ('gestionCitas', '0005_marcaproceso')
+DESPUES = ('gestionCitas', '0006_indices_bloqueatencion')
+
+ESTADOS = [
+    ('DISPONIBLE', 40), ('RESERVADO', 20), ('COMPLETADA', 30),
+    ('CANCELADO_VET', 5), ('CANCELADO_PAC', 5),
+]
+
+
+def consultas_calientes(Bloque, vet_id, dia):
+    """Consultas de las vistas más usadas, en la forma en que las hacen."""
+    inicio_mes = dia.replace(day=1)
+    fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return [
+        ('calendario_mes', Bloque.objects.filter(
+            fecha__range=(inicio_mes, fin_mes)).order_by('fecha', 'hora_inicio')),
+        ('calendario_mes (vet)', Bloque.objects.filter(
+            veterinario_id=vet_id, fecha__range=(inicio_mes, fin_mes)).order_by('fecha', 'hora_inicio')),
+        ('agenda_dia', Bloque.objects.filter(fecha=dia).order_by('hora_inicio')),
+        ('agenda_dia (vet)', Bloque.objects.filter(
+            veterinario_id=vet_id, fecha=dia).order_by('hora_inicio')),
+        ('reprogramar (vet)', Bloque.objects.filter(
+            estado='DISPONIBLE', veterinario_id=vet_id, fecha__gte=dia).order_by('fecha', 'hora_inicio')),
+        ('reprogramar', Bloque.objects.filter(
+            estado='DISPONIBLE', fecha__gte=dia).order_by('fecha', 'hora_inicio')[:50]),
+        # El mismo filtro que usa el worker (transiciones.actualizar_citas_completadas)
+        ('citas_completadas', Bloque.objects.filter(filtro_por_completar(dia))),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra una base SQLite temporal con muchos bloques y muestra "
+        "EXPLAIN QUERY PLAN y tiempos de las consultas calientes antes y "
+        "después de la migración de índices."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloques', type=int, default=1_000_000)
+        parser.add_argument('--veterinarios', type=int, default=40)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--archivo', help='Ruta del SQLite temporal (se borra al terminar).')
+
+    def handle(self, *args, **options):
+        ruta = options['archivo'] or os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        connections.settings[ALIAS] = dict(
+            connections.settings['default'], ENGINE='django.db.backends.sqlite3', NAME=ruta
+        )
+        try:
+            executor = MigrationExecutor(connections[ALIAS])
+            executor.migrate([ANTES])
+            estado = executor.loader.project_state(ANTES)
+            Bloque = estado.apps.get_model('gestionCitas', 'BloqueAtencion')
+            Vet = estado.apps.get_model('gestionCitas', 'Veterinario')
+
+            vet_ids, dia = self._sembrar(Vet, Bloque, options['bloques'], options['veterinarios'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== Antes ({ANTES[1]}) =="))
+            self._medir(Bloque, vet_ids[0], dia, options['repeticiones'])
+
+            inicio = time.perf_counter()
+            executor = MigrationExecutor(connections[ALIAS])
+            executor.migrate([DESPUES])
+            connections[ALIAS].cursor().execute('ANALYZE')
+            self.stdout.write(f"Migración aplicada en {time.perf_counter() - inicio:.2f}s")
+
+            Bloque = executor.loader.project_state(DESPUES).apps.get_model('gestionCitas', 'BloqueAtencion')
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== Después ({DESPUES[1]}) =="))
+            self._medir(Bloque, vet_ids[0], dia, options['repeticiones'])
+        finally:
+            connections[ALIAS].close()
+            del connections.settings[ALIAS]
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _sembrar(self, Vet, Bloque, total, num_vets):
+        vet_ids = [f"{i:08d}K" for i in range(num_vets)]
+        Vet.objects.using(ALIAS).bulk_create(Vet(rut_vet=r, nombre=f"Vet {r}") for r in vet_ids)
+
+        # ~20 bloques de 30 minutos por veterinario y día, centrado en hoy
+        por_dia = num_vets * 20
+        dias = max(1, total // por_dia)
+        desde = date.today() - timedelta(days=dias // 2)
+        estados, pesos = zip(*ESTADOS)
+        rnd = random.Random(42)
+
+        inicio = time.perf_counter()
+        lote = []
+        for n in range(total):
+            d, resto = divmod(n, por_dia)
+            vet, slot = divmod(resto, 20)
+            minutos = 9 * 60 + slot * 30
+            lote.append(Bloque(
+                codigo_atencion=f"{n:010X}",
+                veterinario_id=vet_ids[vet],
+                fecha=desde + timedelta(days=d % dias),
+                hora_inicio=f"{minutos // 60:02d}:{minutos % 60:02d}",
+                hora_fin=f"{(minutos + 30) // 60:02d}:{(minutos + 30) % 60:02d}",
+                estado=rnd.choices(estados, pesos)[0],
+            ))
+            if len(lote) == 5000:
+                Bloque.objects.using(ALIAS).bulk_create(lote)
+                lote = []
+        Bloque.objects.using(ALIAS).bulk_create(lote)
+        self.stdout.write(f"Sembrados {total} bloques en {time.perf_counter() - inicio:.1f}s")
+        return vet_ids, date.today()
+
+    def _medir(self, Bloque, vet_id, dia, repeticiones):
+        for nombre, qs in consultas_calientes(Bloque, vet_id, dia):
+            qs = qs.using(ALIAS)
+            plan = qs.explain()
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                filas = len(list(qs.values_list('pk', flat=True)))
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre}: {filas} filas, mediana {tiempos[len(tiempos) // 2]:.2f} ms"
+            ))
+            for linea in plan.splitlines():
+                self.stdout.write(f"    {linea}")
@@ -0,0 +1,154 @@
+# gestionCitas/management/commands/benchmark_sqlite.py
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from gestionCitas.models import BloqueAtencion, Veterinario
+
+ALIAS = 'benchmark'
+VETERINARIOS = [f"{i:08d}K" for i in range(20)]
+
+MODOS = [
+    # (nombre, pragmas, OPTIONS de la conexión)
+    ('sin ajustes (config de fábrica)', {}, {}),
+    ('WAL + busy_timeout + pragmas', {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+     {'transaction_mode': 'IMMEDIATE'}),
+]
+
+
+def _configurar_alias(ruta, opciones):
+    if ALIAS in connections.settings:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+    connections.settings[ALIAS] = dict(
+        connections.settings['default'],
+        ENGINE='django.db.backends.sqlite3', NAME=ruta, OPTIONS=opciones,
+    )
+
+
+def _trabajador(pragmas, duracion, proporcion_escritura, semilla, cola):
+    """Mezcla de lecturas (mes del calendario) y reservas hasta agotar `duracion`."""
+    # Cada proceso abre su propia conexión con los pragmas del modo
+    settings.SQLITE_PRAGMAS = pragmas if pragmas is not None else getattr(settings, 'SQLITE_PRAGMAS', None)
+    connections[ALIAS].close()
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    resultado = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        try:
+            if rnd.random() < proporcion_escritura:
+                # Como agendar_cita: leer un bloque libre y luego reservarlo
+                with transaction.atomic(using=ALIAS):
+                    pk = (BloqueAtencion.objects.using(ALIAS)
+                          .filter(estado='DISPONIBLE', veterinario_id=rnd.choice(VETERINARIOS),
+                                  fecha=hoy + timedelta(days=rnd.randrange(60)))
+                          .order_by('hora_inicio').values_list('pk', flat=True).first())
+                    if pk:
+                        BloqueAtencion.objects.using(ALIAS).filter(pk=pk, estado='DISPONIBLE').update(
+                            estado='RESERVADO', motivo_consulta='benchmark'
+                        )
+                resultado['escrituras'] += 1
+            else:
+                # Mes del calendario filtrado por veterinario
+                inicio = hoy + timedelta(days=rnd.randrange(30))
+                len(BloqueAtencion.objects.using(ALIAS).filter(
+                    veterinario_id=rnd.choice(VETERINARIOS),
+                    fecha__range=(inicio, inicio + timedelta(days=30)),
+                ).order_by('fecha', 'hora_inicio').values_list('pk', 'estado'))
+                resultado['lecturas'] += 1
+        except OperationalError:
+            resultado['bloqueos'] += 1
+    connections[ALIAS].close()
+    cola.put(resultado)
+
+
+class Command(BaseCommand):
+    help = (
+        "Lanza varios procesos que leen y reservan bloques sobre una base SQLite "
+        "temporal, con y sin la capa de pragmas de main.sqlite, y muestra "
+        "operaciones por segundo y tasa de errores 'database is locked'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--escrituras', type=float, default=0.2,
+                            help='Proporción de operaciones que reservan (0 a 1).')
+        parser.add_argument('--bloques', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        ruta = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        contexto = multiprocessing.get_context('fork')
+        try:
+            _configurar_alias(ruta, {})
+            executor = MigrationExecutor(connections[ALIAS])
+            executor.migrate(executor.loader.graph.leaf_nodes())
+            self._sembrar(options['bloques'])
+
+            for nombre, pragmas, opciones in MODOS:
+                # journal_mode queda grabado en el archivo: se vuelve a DELETE antes de cada modo
+                connections[ALIAS].close()
+                with sqlite3.connect(ruta) as conexion:
+                    conexion.execute('PRAGMA journal_mode = DELETE')
+                    conexion.execute("UPDATE gestionCitas_bloqueatencion SET estado = 'DISPONIBLE'")
+                _configurar_alias(ruta, opciones)
+
+                cola = contexto.Queue()
+                procesos = [
+                    contexto.Process(target=_trabajador, args=(
+                        pragmas, options['segundos'], options['escrituras'], n, cola,
+                    ))
+                    for n in range(options['procesos'])
+                ]
+                for p in procesos:
+                    p.start()
+                resultados = [cola.get() for _ in procesos]
+                for p in procesos:
+                    p.join()
+
+                lecturas = sum(r['lecturas'] for r in resultados)
+                escrituras = sum(r['escrituras'] for r in resultados)
+                bloqueos = sum(r['bloqueos'] for r in resultados)
+                intentos = lecturas + escrituras + bloqueos
+                self.stdout.write(self.style.MIGRATE_HEADING(f"== {nombre} =="))
+                self.stdout.write(self.style.SUCCESS(
+                    f"{(lecturas + escrituras) / options['segundos']:,.0f} ops/s "
+                    f"({lecturas} lecturas, {escrituras} reservas), "
+                    f"bloqueos: {bloqueos} ({100 * bloqueos / max(1, intentos):.2f}%)"
+                ))
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.settings[ALIAS]
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(ruta + sufijo):
+                    os.remove(ruta + sufijo)
+
+    def _sembrar(self, total):
+        Veterinario.objects.using(ALIAS).bulk_create(
+            Veterinario(rut_vet=r, nombre=f"Vet {r}") for r in VETERINARIOS
+        )
+        desde = date.today()
+        lote = []
+        for n in range(total):
+            dia, resto = divmod(n, len(VETERINARIOS) * 20)
+            vet, slot = divmod(resto, 20)
+            minutos = 9 * 60 + slot * 30
+            lote.append(BloqueAtencion(
+                codigo_atencion=f"{n:010X}",
+                veterinario_id=VETERINARIOS[vet],
+                fecha=desde + timedelta(days=dia % 60),
+                hora_inicio=f"{minutos // 60:02d}:{minutos % 60:02d}",
+                hora_fin=f"{(minutos + 30) // 60:02d}:{(minutos + 30) % 60:02d}",
+            ))
+        BloqueAtencion.objects.using(ALIAS).bulk_create(lote, batch_size=5000)
@@ -0,0 +1,177 @@
+# gestionCitas/management/commands/benchmark_vistas.py
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from gestionCitas.models import BloqueAtencion, Cliente, Mascota, Veterinario
+from gestionCitas.sembrado import sembrar
+from gestionCitas.versiones import invalidar_calendario
+
+TAMANOS = {
+    'chico': {'veterinarios': 5, 'clientes': 500, 'dias': 120},
+    'mediano': {'veterinarios': 20, 'clientes': 5000, 'dias': 365},
+    'grande': {'veterinarios': 40, 'clientes': 20000, 'dias': 365},
+}
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def _resumen(tiempos, consultas):
+    tiempos, consultas = sorted(tiempos), sorted(consultas)
+    return {
+        'n': len(tiempos),
+        'p50_ms': round(_percentil(tiempos, 50), 2),
+        'p90_ms': round(_percentil(tiempos, 90), 2),
+        'p95_ms': round(_percentil(tiempos, 95), 2),
+        'p99_ms': round(_percentil(tiempos, 99), 2),
+        'max_ms': round(tiempos[-1], 2),
+        'media_ms': round(sum(tiempos) / len(tiempos), 2),
+        'consultas_p50': _percentil(consultas, 50),
+        'consultas_max': consultas[-1],
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra una base de prueba temporal en varios tamaños y mide con el "
+        "cliente de pruebas las vistas principales (calendario, agenda, "
+        "agendar y búsquedas AJAX). Imprime percentiles de latencia y "
+        "cantidad de consultas en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='chico,mediano',
+                            help=f"Lista separada por comas de: {', '.join(TAMANOS)}.")
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--salida', help='Archivo donde escribir el JSON (por defecto stdout).')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        tamanos = [t.strip() for t in options['tamanos'].split(',') if t.strip()]
+        desconocidos = [t for t in tamanos if t not in TAMANOS]
+        if desconocidos:
+            raise CommandError(f"Tamaños desconocidos: {', '.join(desconocidos)}")
+
+        resultado = {
+            'commit': _commit(),
+            'fecha': date.today().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeticiones': options['repeticiones'],
+            'tamanos': {},
+        }
+
+        setup_test_environment()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for tamano in tamanos:
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                inicio = time.perf_counter()
+                datos = sembrar(semilla=options['semilla'], **TAMANOS[tamano])
+                self.stderr.write(f"{tamano}: {datos['bloques']} bloques sembrados en "
+                                  f"{time.perf_counter() - inicio:.1f}s")
+                resultado['tamanos'][tamano] = {
+                    'datos': datos,
+                    'vistas': self._medir(options['repeticiones'], random.Random(options['semilla'])),
+                }
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(salida + '\n')
+            self.stderr.write(f"Resultados en {options['salida']}")
+        else:
+            self.stdout.write(salida)
+
+    def _escenarios(self, rnd):
+        hoy = date.today()
+        vets = list(Veterinario.objects.values_list('pk', flat=True))
+        ruts = list(Cliente.objects.values_list('pk', 'nombre')[:2000])
+        chips = list(Mascota.objects.values_list('pk', flat=True)[:2000])
+        libres = list(BloqueAtencion.objects.filter(estado='DISPONIBLE', fecha__gte=hoy)
+                      .values_list('pk', flat=True)[:2000])
+
+        def dia():
+            return (hoy + timedelta(days=rnd.randrange(-30, 30))).isoformat()
+
+        return [
+            # (nombre, función que arma (url, params), preparación antes de cada request)
+            ('calendario_mes (sin cache)',
+             lambda: (reverse('gestionCitas:calendario_mes'), {}), invalidar_calendario),
+            ('calendario_mes (cache)',
+             lambda: (reverse('gestionCitas:calendario_mes'), {}), None),
+            ('calendario_mes por veterinario (sin cache)',
+             lambda: (reverse('gestionCitas:calendario_mes'), {'veterinario': rnd.choice(vets)}),
+             invalidar_calendario),
+            ('agenda_dia',
+             lambda: (reverse('gestionCitas:agenda_dia'), {'fecha': dia()}), None),
+            ('agenda_dia por veterinario',
+             lambda: (reverse('gestionCitas:agenda_dia'), {'fecha': dia(), 'veterinario': rnd.choice(vets)}), None),
+            ('agendar_cita (GET)',
+             lambda: (reverse('gestionCitas:agendar_cita', args=[rnd.choice(libres)]), {}), None),
+            ('buscar_cliente',
+             lambda: (reverse('gestionCitas:buscar_cliente'), {'rut': rnd.choice(ruts)[0]}), None),
+            ('buscar_mascota',
+             lambda: (reverse('gestionCitas:buscar_mascota'), {'chip': rnd.choice(chips)}), None),
+            ('autocompletar',
+             lambda: (reverse('gestionCitas:autocompletar'), {'q': rnd.choice(ruts)[1][:4]}), None),
+            ('ficha_cliente',
+             lambda: (reverse('gestionCitas:ficha_cliente'), {'rut': rnd.choice(ruts)[0]}), None),
+            ('api_bloques_libres',
+             lambda: (reverse('gestionCitas:api_bloques_libres'), {'veterinario': rnd.choice(vets)}), None),
+        ]
+
+    def _medir(self, repeticiones, rnd):
+        grupo, _ = Group.objects.get_or_create(name='Recepcionista')
+        user = User.objects.create_user('benchmark', password='benchmark-123')
+        user.groups.add(grupo)
+        client = Client()
+        client.force_login(user)
+
+        resultados = {}
+        for nombre, armar, preparar in self._escenarios(rnd):
+            tiempos, consultas = [], []
+            # Una request de calentamiento por vista, fuera de la medición
+            url, params = armar()
+            client.get(url, params)
+            for _ in range(repeticiones):
+                url, params = armar()
+                if preparar:
+                    preparar()
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    response = client.get(url, params)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f"{nombre}: {url} respondió {response.status_code}")
+                consultas.append(len(capturadas.captured_queries))
+            resultados[nombre] = _resumen(tiempos, consultas)
+        return resultados
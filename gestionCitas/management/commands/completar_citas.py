@@ -0,0 +1,28 @@
+# gestionCitas/management/commands/completar_citas.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestionCitas.transiciones import actualizar_citas_completadas
+
+
+class Command(BaseCommand):
+    help = "Pasa a COMPLETADA las citas RESERVADAS de días ya pasados (incremental)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Queda corriendo como worker, repitiendo cada --intervalo segundos.',
+        )
+        parser.add_argument(
+            '--intervalo', type=int, default=300,
+            help='Segundos entre corridas en modo --loop (por defecto 300).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            actualizados = actualizar_citas_completadas()
+            self.stdout.write(self.style.SUCCESS(f"Citas completadas: {actualizados}"))
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
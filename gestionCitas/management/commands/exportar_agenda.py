@@ -0,0 +1,39 @@
+# gestionCitas/management/commands/exportar_agenda.py
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionCitas.exportacion import filas_agenda, lineas_csv
+from gestionCitas.models import BloqueAtencion
+
+
+def _fecha(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {texto} (usa AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Exporta la agenda de un rango de fechas a CSV, fila por fila (memoria constante)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='AAAA-MM-DD')
+        parser.add_argument('--hasta', required=True, help='AAAA-MM-DD')
+        parser.add_argument('--veterinario', help='RUT del veterinario')
+        parser.add_argument('--estado', choices=[e for e, _ in BloqueAtencion.ESTADO_CHOICES])
+        parser.add_argument('--salida', help='Archivo CSV (por defecto stdout).')
+
+    def handle(self, *args, **options):
+        desde, hasta = _fecha(options['desde']), _fecha(options['hasta'])
+        if desde > hasta:
+            raise CommandError("--desde debe ser anterior o igual a --hasta")
+
+        filas = filas_agenda(desde, hasta, options['veterinario'], options['estado'])
+        salida = open(options['salida'], 'w', encoding='utf-8', newline='') if options['salida'] else self.stdout
+        try:
+            for linea in lineas_csv(filas):
+                salida.write(linea)
+        finally:
+            if salida is not self.stdout:
+                salida.close()
@@ -0,0 +1,54 @@
+# gestionCitas/management/commands/generar_disponibilidad.py
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionCitas.disponibilidad import crear_bloques_recurrentes
+from gestionCitas.models import Veterinario
+
+
+class Command(BaseCommand):
+    help = "Genera bloques DISPONIBLE a partir de una plantilla semanal."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--veterinario', action='append', dest='veterinarios',
+                            help='RUT del veterinario (repetible). Por defecto, todos.')
+        parser.add_argument('--desde', required=True, help='Fecha inicial YYYY-MM-DD.')
+        parser.add_argument('--hasta', required=True, help='Fecha final YYYY-MM-DD (incluida).')
+        parser.add_argument('--dias', default='0,1,2,3,4',
+                            help='Días de la semana separados por coma (0 = lunes). Por defecto lunes a viernes.')
+        parser.add_argument('--inicio', default='09:00', help='Hora de inicio HH:MM.')
+        parser.add_argument('--fin', default='18:00', help='Hora de fin HH:MM.')
+        parser.add_argument('--duracion', type=int, default=30, help='Minutos por bloque.')
+
+    def handle(self, *args, **options):
+        try:
+            desde = datetime.strptime(options['desde'], '%Y-%m-%d').date()
+            hasta = datetime.strptime(options['hasta'], '%Y-%m-%d').date()
+            inicio = datetime.strptime(options['inicio'], '%H:%M').time()
+            fin = datetime.strptime(options['fin'], '%H:%M').time()
+            dias = [int(d) for d in options['dias'].split(',') if d.strip()]
+        except ValueError as exc:
+            raise CommandError(f"Parámetro inválido: {exc}")
+
+        if desde > hasta or inicio >= fin or options['duracion'] <= 0:
+            raise CommandError("Rango de fechas, horario o duración inválidos.")
+
+        vets = Veterinario.objects.all()
+        if options['veterinarios']:
+            vets = vets.filter(rut_vet__in=options['veterinarios'])
+        vet_ids = list(vets.values_list('rut_vet', flat=True))
+        if not vet_ids:
+            raise CommandError("No se encontraron veterinarios.")
+
+        resultado = crear_bloques_recurrentes(
+            vet_ids, desde, hasta, dias, inicio, fin, options['duracion']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Bloques creados: {resultado['creados']}. Omitidos por solapamiento: {resultado['omitidos']}."
+        ))
+        for c in resultado['conflictos']:
+            self.stdout.write(
+                f"  {c['veterinario']} {c['fecha']} {c['hora_inicio']:%H:%M}-{c['hora_fin']:%H:%M} "
+                f"choca con #{c['conflicto_con']} ({c['conflicto_inicio']:%H:%M}-{c['conflicto_fin']:%H:%M})"
+            )
@@ -0,0 +1,45 @@
+# gestionCitas/management/commands/importar_clientes.py
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionCitas.importacion import CAMPOS_CLIENTE, CAMPOS_MASCOTA, TAMANO_LOTE, Importador, leer_registros
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes y mascotas desde un CSV o JSONL (columnas: "
+        f"{', '.join(CAMPOS_CLIENTE + CAMPOS_MASCOTA)}), por lotes y con "
+        "upsert. Las filas rechazadas se escriben en un archivo de errores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Por defecto se deduce de la extensión del archivo.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+        parser.add_argument('--errores', help='Archivo JSONL de rechazos (por defecto <archivo>.errores.jsonl).')
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        formato = options['formato'] or ('csv' if ruta.lower().endswith('.csv') else 'jsonl')
+        ruta_errores = options['errores'] or f"{os.path.splitext(ruta)[0]}.errores.jsonl"
+
+        inicio = time.perf_counter()
+        try:
+            with open(ruta, encoding='utf-8-sig', newline='') as archivo, \
+                    open(ruta_errores, 'w', encoding='utf-8') as errores:
+                resumen = Importador(errores, options['lote']).importar(leer_registros(archivo, formato))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Leídas {resumen['leidos']} filas en {time.perf_counter() - inicio:.1f}s: "
+            f"{resumen['clientes']} clientes y {resumen['mascotas']} mascotas guardados, "
+            f"{resumen['rechazados']} rechazadas."
+        ))
+        if resumen['rechazados']:
+            self.stdout.write(f"Detalle de rechazos en {ruta_errores}")
+        else:
+            os.remove(ruta_errores)
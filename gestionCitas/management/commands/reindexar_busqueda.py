@@ -0,0 +1,12 @@
+# gestionCitas/management/commands/reindexar_busqueda.py
+from django.core.management.base import BaseCommand
+
+from gestionCitas.busqueda import reindexar_todo
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de autocompletado de clientes y mascotas."
+
+    def handle(self, *args, **options):
+        total = reindexar_todo()
+        self.stdout.write(self.style.SUCCESS(f"Términos indexados: {total}"))
@@ -0,0 +1,33 @@
+# gestionCitas/management/commands/sembrar_datos.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestionCitas.sembrado import sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga datos sintéticos (veterinarios, clientes, mascotas y un año de "
+        "bloques con estados realistas) con bulk_create por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--veterinarios', type=int, default=10)
+        parser.add_argument('--clientes', type=int, default=1000)
+        parser.add_argument('--mascotas-por-cliente', type=float, default=1.5)
+        parser.add_argument('--dias', type=int, default=365,
+                            help='Días de agenda, centrados en hoy (por defecto 365).')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        creados = sembrar(
+            veterinarios=options['veterinarios'],
+            clientes=options['clientes'],
+            mascotas_por_cliente=options['mascotas_por_cliente'],
+            dias=options['dias'],
+            semilla=options['semilla'],
+        )
+        resumen = ', '.join(f"{nombre}: {cantidad}" for nombre, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(f"{resumen} ({time.perf_counter() - inicio:.1f}s)"))
@@ -0,0 +1,55 @@
+# gestionCitas/management/commands/sincronizar_replica.py
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def copiar_sqlite(origen, destino):
+    """
+    Copia consistente de la base `origen` sobre `destino` con la API de
+    backup de SQLite: se puede hacer con la primaria en uso, y los lectores
+    de la réplica solo esperan (busy_timeout) mientras se escribe la copia.
+    """
+    fuente = sqlite3.connect(origen)
+    copia = sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        copia.close()
+        fuente.close()
+
+
+class Command(BaseCommand):
+    help = "Copia la base SQLite 'default' sobre la réplica de lectura (REPLICA_LECTURA o --replica)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', default=None,
+                            help="Alias de la réplica (por defecto REPLICA_LECTURA o 'replica').")
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Queda corriendo, copiando cada --intervalo segundos.',
+        )
+        parser.add_argument(
+            '--intervalo', type=int, default=5,
+            help='Segundos entre copias en modo --loop (por defecto 5).',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['replica'] or getattr(settings, 'REPLICA_LECTURA', None) or 'replica'
+        if alias not in settings.DATABASES:
+            raise CommandError(f"No existe el alias de base de datos '{alias}'.")
+        origen, destino = settings.DATABASES['default'], settings.DATABASES[alias]
+        if 'sqlite3' not in origen['ENGINE'] or 'sqlite3' not in destino['ENGINE']:
+            raise CommandError("La copia por backup solo sirve entre bases SQLite.")
+
+        while True:
+            inicio = time.perf_counter()
+            copiar_sqlite(str(origen['NAME']), str(destino['NAME']))
+            self.stdout.write(self.style.SUCCESS(
+                f"Réplica '{alias}' sincronizada en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,23 @@
+# gestionCitas/management/commands/token_calendario.py
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from gestionCitas.ics import asignar_token
+from gestionCitas.models import Veterinario
+
+
+class Command(BaseCommand):
+    help = "Muestra (o crea) el enlace del feed .ics de un veterinario."
+
+    def add_arguments(self, parser):
+        parser.add_argument('rut', help='RUT del veterinario')
+        parser.add_argument('--regenerar', action='store_true',
+                            help='Crea un token nuevo; el enlace anterior deja de funcionar.')
+
+    def handle(self, *args, **options):
+        try:
+            veterinario = Veterinario.objects.get(pk=options['rut'])
+        except Veterinario.DoesNotExist:
+            raise CommandError(f"No existe el veterinario {options['rut']}")
+        token = asignar_token(veterinario, regenerar=options['regenerar'])
+        self.stdout.write(reverse('gestionCitas:feed_ics', args=[token]))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0005_marcaproceso'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(fields=['veterinario', 'fecha', 'hora_inicio'], name='bloque_vet_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(fields=['fecha', 'hora_inicio'], name='bloque_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(condition=models.Q(('estado', 'DISPONIBLE')), fields=['fecha', 'hora_inicio'], name='bloque_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(condition=models.Q(('estado', 'RESERVADO')), fields=['fecha'], name='bloque_reservado_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia de la normalización de gestionCitas.busqueda al momento de esta
+# migración: si el módulo cambia después, la migración sigue armando el
+# mismo índice.
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def terminos(clave, nombre):
+    return {normalizar(clave).replace(' ', ''), *normalizar(nombre).split()} - {''}
+
+
+def indexar_existentes(apps, schema_editor):
+    Cliente = apps.get_model('gestionCitas', 'Cliente')
+    Mascota = apps.get_model('gestionCitas', 'Mascota')
+    TerminoBusqueda = apps.get_model('gestionCitas', 'TerminoBusqueda')
+    db = schema_editor.connection.alias
+
+    filas = [
+        TerminoBusqueda(termino=t[:100], tipo='C', clave=c.pk)
+        for c in Cliente.objects.using(db) for t in terminos(c.rut_cli, c.nombre)
+    ] + [
+        TerminoBusqueda(termino=t[:100], tipo='M', clave=m.pk)
+        for m in Mascota.objects.using(db) for t in terminos(m.codigo_chip, m.nombre)
+    ]
+    TerminoBusqueda.objects.using(db).bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0007_bloqueatencion_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('C', 'Cliente'), ('M', 'Mascota')], max_length=1)),
+                ('clave', models.CharField(max_length=15)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termino', 'tipo'], name='termino_busqueda_idx'), models.Index(fields=['tipo', 'clave'], name='termino_objeto_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
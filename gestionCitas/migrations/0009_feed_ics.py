@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0008_terminobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='veterinario',
+            name='token_calendario',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(fields=['veterinario', 'actualizado'], name='bloque_vet_actualizado_idx'),
+        ),
+    ]
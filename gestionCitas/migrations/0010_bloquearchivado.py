@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0009_feed_ics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueArchivado',
+            fields=[
+                ('codigo_atencion', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('codigo_cita', models.CharField(blank=True, max_length=10, null=True)),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('estado', models.CharField(choices=[('DISPONIBLE', 'Disponible'), ('RESERVADO', 'Reservado'), ('COMPLETADA', 'Completada'), ('CANCELADO_VET', 'Cancelado por veterinario'), ('CANCELADO_PAC', 'Cancelado por paciente')], max_length=20)),
+                ('motivo_consulta', models.CharField(blank=True, max_length=30)),
+                ('actualizado', models.DateTimeField()),
+                ('mascota', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bloques_archivados', to='gestionCitas.mascota')),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloques_archivados', to='gestionCitas.veterinario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'hora_inicio'], name='archivado_fecha_hora_idx'), models.Index(fields=['mascota', 'fecha'], name='archivado_mascota_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+# Copia de gestionCitas.ocupacion.CAMPO_POR_ESTADO al momento de esta
+# migración, para que no cambie si el módulo cambia después
+CAMPO_POR_ESTADO = {
+    'DISPONIBLE': 'disponibles',
+    'RESERVADO': 'reservados',
+    'COMPLETADA': 'completadas',
+    'CANCELADO_VET': 'cancelados_vet',
+    'CANCELADO_PAC': 'cancelados_pac',
+}
+
+
+def resumir_existentes(apps, schema_editor):
+    OcupacionDiaria = apps.get_model('gestionCitas', 'OcupacionDiaria')
+    db = schema_editor.connection.alias
+    conteos = {
+        campo: Count('pk', filter=Q(estado=estado)) for estado, campo in CAMPO_POR_ESTADO.items()
+    }
+    for nombre in ('BloqueAtencion', 'BloqueArchivado'):
+        modelo = apps.get_model('gestionCitas', nombre)
+        filas = modelo.objects.using(db).order_by().values('veterinario_id', 'fecha').annotate(**conteos)
+        OcupacionDiaria.objects.using(db).bulk_create(
+            (OcupacionDiaria(**fila) for fila in filas.iterator()), batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0010_bloquearchivado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('disponibles', models.PositiveIntegerField(default=0)),
+                ('reservados', models.PositiveIntegerField(default=0)),
+                ('completadas', models.PositiveIntegerField(default=0)),
+                ('cancelados_vet', models.PositiveIntegerField(default=0)),
+                ('cancelados_pac', models.PositiveIntegerField(default=0)),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion', to='gestionCitas.veterinario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='ocupacion_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('veterinario', 'fecha'), name='ocupacion_vet_fecha_unica')],
+            },
+        ),
+        migrations.RunPython(resumir_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0011_ocupaciondiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloquearchivado',
+            index=models.Index(condition=models.Q(('estado', 'CANCELADO_PAC')), fields=['fecha'], name='archivado_cancelado_pac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueatencion',
+            index=models.Index(condition=models.Q(('estado', 'CANCELADO_PAC')), fields=['fecha'], name='bloque_cancelado_pac_idx'),
+        ),
+    ]
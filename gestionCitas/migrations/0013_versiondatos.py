@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0012_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('clave', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=10)),
+            ],
+        ),
+    ]
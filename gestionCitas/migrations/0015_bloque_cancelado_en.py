@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:24
+
+from django.db import migrations, models
+from django.db.models import F
+
+# Copia de models.ESTADOS_CANCELADOS al momento de esta migración
+ESTADOS_CANCELADOS = ('CANCELADO_VET', 'CANCELADO_PAC')
+
+
+def completar_cancelado_en(apps, schema_editor):
+    # Para lo ya cancelado no se sabe cuándo fue: la última modificación es
+    # lo más cercano que hay
+    db = schema_editor.connection.alias
+    for modelo in ('BloqueAtencion', 'BloqueArchivado'):
+        apps.get_model('gestionCitas', modelo).objects.using(db).filter(
+            estado__in=ESTADOS_CANCELADOS,
+        ).update(cancelado_en=F('actualizado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionCitas', '0014_fichas_actualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bloquearchivado',
+            name='cancelado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bloqueatencion',
+            name='cancelado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(completar_cancelado_en, migrations.RunPython.noop),
+    ]
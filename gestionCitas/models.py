@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from .validators import validar_rut, validar_numeros
 
 class Cliente(models.Model):
@@ -7,6 +8,8 @@ class Cliente(models.Model):
     telefono = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
     direccion = models.TextField(blank=True)
+    # Último cambio: el feed .ics muestra nombre y teléfono (ver ics.sello_feed)
+    actualizado = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -20,6 +23,7 @@ class Mascota(models.Model):
     edad = models.PositiveIntegerField(null=True, blank=True)  # Edad opcional
     peso = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # Peso opcional
     dueño = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='mascotas')  # Relación con Cliente
+    actualizado = models.DateTimeField(auto_now=True)  # Último cambio (ver ics.sello_feed)
 
     def __str__(self):
         return f"{self.nombre} ({self.especie})"
@@ -32,11 +36,72 @@ class Veterinario(models.Model):
     telefono = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
     direccion = models.TextField(blank=True)
+    # Token secreto del feed .ics de su agenda (ver gestionCitas.ics)
+    token_calendario = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.nombre
 
 
+# Campos que cambian a qué día y columna de OcupacionDiaria cuenta un bloque
+CAMPOS_OCUPACION = ('estado', 'veterinario', 'veterinario_id', 'fecha')
+
+# Estados que fijan BloqueAtencion.cancelado_en
+ESTADOS_CANCELADOS = ('CANCELADO_VET', 'CANCELADO_PAC')
+
+
+class BloqueQuerySet(models.QuerySet):
+    """
+    Mantiene OcupacionDiaria y la versión del calendario en las escrituras
+    masivas, que no disparan señales: update() y bulk_create() recalculan
+    los días que tocan e invalidan las grillas en la misma transacción.
+    update() además fija cancelado_en cuando cambia el estado. save() y
+    delete() de instancias van por signals.
+    """
+
+    def update(self, **kwargs):
+        from .ocupacion import recalcular
+        from .versiones import invalidar_calendario
+
+        if isinstance(kwargs.get('estado'), str):
+            kwargs.setdefault(
+                'cancelado_en', timezone.now() if kwargs['estado'] in ESTADOS_CANCELADOS else None
+            )
+        with transaction.atomic(using=self.db, savepoint=False):
+            if not any(campo in kwargs for campo in CAMPOS_OCUPACION):
+                actualizados = super().update(**kwargs)
+            else:
+                filas = list(self.values_list('pk', 'veterinario_id', 'fecha'))
+                if not filas:
+                    return 0
+                actualizados = super().update(**kwargs)
+                claves = {(vet, fecha) for _, vet, fecha in filas}
+                if {'veterinario', 'veterinario_id', 'fecha'} & kwargs.keys():
+                    # Los días de destino también cambian
+                    claves |= set(BloqueAtencion.objects.using(self.db).filter(
+                        pk__in=[pk for pk, _, _ in filas]).values_list('veterinario_id', 'fecha'))
+                recalcular(claves, using=self.db)
+            if actualizados:
+                invalidar_calendario(using=self.db)
+        return actualizados
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .ocupacion import recalcular
+        from .versiones import invalidar_calendario
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            creados = super().bulk_create(objs, *args, **kwargs)
+            recalcular({(obj.veterinario_id, obj.fecha) for obj in objs}, using=self.db)
+            if objs:
+                invalidar_calendario(using=self.db)
+        return creados
+
+    bulk_create.alters_data = True
+
+
 class BloqueAtencion(models.Model):
     ESTADO_CHOICES = [
         ('DISPONIBLE', 'Disponible'),
@@ -74,5 +139,193 @@ class BloqueAtencion(models.Model):
     )
     motivo_consulta = models.CharField(max_length=30, blank=True)
 
+    # Última modificación; los update() de queryset deben fijarlo a mano
+    actualizado = models.DateTimeField(auto_now=True)
+    # Cuándo pasó a un estado cancelado (None si no lo está). Lo fijan
+    # BloqueQuerySet.update() y signals; otras ediciones no lo mueven
+    cancelado_en = models.DateTimeField(null=True, blank=True)
+
+    objects = BloqueQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Calendario/agenda filtrados por veterinario
+            models.Index(fields=['veterinario', 'fecha', 'hora_inicio'], name='bloque_vet_fecha_hora_idx'),
+            # Calendario/agenda de todos los veterinarios
+            models.Index(fields=['fecha', 'hora_inicio'], name='bloque_fecha_hora_idx'),
+            # Búsqueda de bloques libres (reprogramar)
+            models.Index(
+                fields=['fecha', 'hora_inicio'],
+                condition=models.Q(estado='DISPONIBLE'),
+                name='bloque_disponible_idx',
+            ),
+            # Feed .ics: último cambio y cambios desde `since` de un veterinario
+            models.Index(fields=['veterinario', 'actualizado'], name='bloque_vet_actualizado_idx'),
+            # Paso de reservas vencidas a COMPLETADA
+            models.Index(
+                fields=['fecha'],
+                condition=models.Q(estado='RESERVADO'),
+                name='bloque_reservado_idx',
+            ),
+            # Cancelaciones del paciente en los reportes
+            models.Index(
+                fields=['fecha'],
+                condition=models.Q(estado='CANCELADO_PAC'),
+                name='bloque_cancelado_pac_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Día con que se cargó, para que un save() que lo cambie recalcule
+        # la ocupación del día de origen (ver signals)
+        instancia._dia_cargado = (instancia.__dict__.get('veterinario_id'), instancia.__dict__.get('fecha'))
+        return instancia
+
     def __str__(self):
         return f"{self.codigo_atencion} - {self.fecha} {self.hora_inicio}-{self.hora_fin} / {self.veterinario}"
+
+
+class BloqueArchivado(models.Model):
+    """
+    Bloque histórico movido desde BloqueAtencion por `archivar_bloques`
+    (ver gestionCitas.archivo). Mismas columnas, con el estado efectivo ya
+    aplicado; solo se lee al consultar fechas anteriores al corte.
+    """
+    codigo_atencion = models.CharField(max_length=10, primary_key=True)
+    codigo_cita = models.CharField(max_length=10, null=True, blank=True)
+    veterinario = models.ForeignKey(
+        Veterinario,
+        on_delete=models.CASCADE,
+        related_name='bloques_archivados'
+    )
+    fecha = models.DateField()
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    estado = models.CharField(max_length=20, choices=BloqueAtencion.ESTADO_CHOICES)
+    mascota = models.ForeignKey(
+        Mascota,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bloques_archivados'
+    )
+    motivo_consulta = models.CharField(max_length=30, blank=True)
+    actualizado = models.DateTimeField()
+    cancelado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Exportaciones por rango de fechas
+            models.Index(fields=['fecha', 'hora_inicio'], name='archivado_fecha_hora_idx'),
+            # Historial de una mascota
+            models.Index(fields=['mascota', 'fecha'], name='archivado_mascota_fecha_idx'),
+            # Cancelaciones del paciente en los reportes
+            models.Index(
+                fields=['fecha'],
+                condition=models.Q(estado='CANCELADO_PAC'),
+                name='archivado_cancelado_pac_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo_atencion} - {self.fecha} {self.hora_inicio}-{self.hora_fin} (archivado)"
+
+
+class OcupacionDiaria(models.Model):
+    """
+    Resumen por veterinario y día: cuántos bloques hay en cada estado. Lo
+    mantienen las escrituras de BloqueAtencion (ver BloqueQuerySet y
+    signals) y se puede rehacer con el comando `reconstruir_ocupacion`. Los
+    días archivados se conservan: archivar no los recalcula.
+
+    Cuenta el estado guardado: una reserva de un día pasado sigue en
+    `reservados` hasta que `completar_citas` la pasa a COMPLETADA. Quien
+    lee el resumen lo ajusta con ocupacion.conteos_efectivos.
+    """
+    veterinario = models.ForeignKey(
+        Veterinario,
+        on_delete=models.CASCADE,
+        related_name='ocupacion'
+    )
+    fecha = models.DateField()
+    disponibles = models.PositiveIntegerField(default=0)
+    reservados = models.PositiveIntegerField(default=0)
+    completadas = models.PositiveIntegerField(default=0)
+    cancelados_vet = models.PositiveIntegerField(default=0)
+    cancelados_pac = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['veterinario', 'fecha'], name='ocupacion_vet_fecha_unica'),
+        ]
+        indexes = [
+            # Resumen de un rango de días de todos los veterinarios
+            models.Index(fields=['fecha'], name='ocupacion_fecha_idx'),
+        ]
+
+    @property
+    def total(self):
+        return self.disponibles + self.reservados + self.completadas + self.cancelados_vet + self.cancelados_pac
+
+    @property
+    def ocupados(self):
+        return self.reservados + self.completadas
+
+    def __str__(self):
+        return f"{self.veterinario_id} {self.fecha}: {self.ocupados}/{self.total}"
+
+
+class MarcaProceso(models.Model):
+    """
+    Marca de avance (high-water mark) de un proceso en segundo plano.
+    Guarda hasta qué fecha ya se procesó, para que cada corrida solo
+    trabaje sobre los días nuevos.
+    """
+    nombre = models.CharField(max_length=50, primary_key=True)
+    fecha = models.DateField()
+
+    def __str__(self):
+        return f"{self.nombre}: {self.fecha}"
+
+
+class VersionDatos(models.Model):
+    """
+    Versión de un conjunto de datos cacheados (las grillas del calendario,
+    los reportes de un mes). Está en la base y no en el cache porque el
+    cache es local a cada proceso: así un comando o cualquier worker que
+    escribe cambia la versión que ven todos, en la misma transacción que
+    sus datos. Ver gestionCitas.versiones.
+    """
+    clave = models.CharField(max_length=30, primary_key=True)
+    version = models.CharField(max_length=10)
+
+    def __str__(self):
+        return f"{self.clave}: {self.version}"
+
+
+class TerminoBusqueda(models.Model):
+    """
+    Índice de búsqueda por prefijo para el autocompletado: un término
+    normalizado (RUT, chip o palabra del nombre) por fila, apuntando al
+    cliente o mascota que lo contiene. Se mantiene con señales (ver
+    gestionCitas.busqueda).
+    """
+    TIPO_CHOICES = [
+        ('C', 'Cliente'),
+        ('M', 'Mascota'),
+    ]
+
+    termino = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=1, choices=TIPO_CHOICES)
+    clave = models.CharField(max_length=15)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['termino', 'tipo'], name='termino_busqueda_idx'),
+            models.Index(fields=['tipo', 'clave'], name='termino_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.termino} -> {self.tipo}:{self.clave}"
@@ -0,0 +1,126 @@
+# gestionCitas/ocupacion.py
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.db import router, transaction
+from django.db.models import Count, Q
+
+from .models import BloqueArchivado, BloqueAtencion, OcupacionDiaria
+from .versiones import invalidar_meses
+
+# Columna de OcupacionDiaria que cuenta cada estado
+CAMPO_POR_ESTADO = {
+    'DISPONIBLE': 'disponibles',
+    'RESERVADO': 'reservados',
+    'COMPLETADA': 'completadas',
+    'CANCELADO_VET': 'cancelados_vet',
+    'CANCELADO_PAC': 'cancelados_pac',
+}
+CAMPOS = tuple(CAMPO_POR_ESTADO.values())
+TAMANO_LOTE = 2000
+_RESERVADOS, _COMPLETADAS = CAMPOS.index('reservados'), CAMPOS.index('completadas')
+
+
+def conteos_efectivos(fecha, conteos, hoy=None):
+    """
+    Conteos de un día (lista en el orden de CAMPOS) según el estado efectivo:
+    en un día pasado las reservas cuentan como completadas, igual que las
+    muestra el calendario (ver transiciones.estado_efectivo). El resumen
+    guarda el estado almacenado, que no cambia solo porque pasó el día;
+    por eso se ajusta al leer.
+    """
+    if fecha < (hoy or date.today()) and conteos[_RESERVADOS]:
+        conteos = list(conteos)
+        conteos[_COMPLETADAS] += conteos[_RESERVADOS]
+        conteos[_RESERVADOS] = 0
+    return conteos
+
+
+def _conteos(qs):
+    """Una fila (veterinario_id, fecha, conteos...) por día, agrupando en SQL."""
+    return qs.order_by().values('veterinario_id', 'fecha').annotate(**{
+        campo: Count('pk', filter=Q(estado=estado)) for estado, campo in CAMPO_POR_ESTADO.items()
+    })
+
+
+def _guardar(filas, using):
+    OcupacionDiaria.objects.using(using).bulk_create(
+        filas, batch_size=TAMANO_LOTE, update_conflicts=True,
+        unique_fields=['veterinario', 'fecha'], update_fields=list(CAMPOS),
+    )
+
+
+def recalcular(claves, using=None):
+    """
+    Recalcula desde BloqueAtencion el resumen de los (veterinario_id, fecha)
+    dados: una consulta agregada y un upsert. Se recalcula en vez de sumar
+    deltas para que cada escritura deje el día correcto aunque el resumen
+    estuviera desfasado. Los días que quedaron sin bloques se borran.
+    """
+    claves = {(vet, fecha) for vet, fecha in claves if vet and fecha}
+    if not claves:
+        return
+    using = using or router.db_for_write(OcupacionDiaria)
+    bloques = BloqueAtencion.objects.using(using).filter(
+        veterinario_id__in={vet for vet, _ in claves},
+        fecha__in={fecha for _, fecha in claves},
+    )
+    # El filtro puede traer días de más (el cruce vets x fechas); también
+    # son conteos correctos, así que se guardan igual
+    filas = [OcupacionDiaria(**fila) for fila in _conteos(bloques)]
+    _guardar(filas, using)
+    vacias = claves - {(fila.veterinario_id, fila.fecha) for fila in filas}
+    if vacias:
+        OcupacionDiaria.objects.using(using).filter(
+            reduce(or_, (Q(veterinario_id=vet, fecha=fecha) for vet, fecha in vacias))
+        ).delete()
+    invalidar_meses((fecha for _, fecha in claves), using=using)
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Rehace el resumen del rango (todo si no se indica) desde cero, contando
+    también los bloques archivados. Retorna la cantidad de filas escritas.
+    """
+    rango = {}
+    if desde:
+        rango['fecha__gte'] = desde
+    if hasta:
+        rango['fecha__lte'] = hasta
+    using = router.db_for_write(OcupacionDiaria)
+    with transaction.atomic(using=using):
+        # Meses con resumen antes y después de rehacerlo, para invalidar sus reportes
+        meses = set(OcupacionDiaria.objects.using(using).filter(**rango).dates('fecha', 'month'))
+        OcupacionDiaria.objects.using(using).filter(**rango).delete()
+        escritas = 0
+        for modelo in (BloqueAtencion, BloqueArchivado):
+            # Un día está entero en una de las dos tablas (se archiva por fecha)
+            lote = []
+            for fila in _conteos(modelo.objects.using(using).filter(**rango)).iterator(chunk_size=TAMANO_LOTE):
+                lote.append(OcupacionDiaria(**fila))
+                if len(lote) >= TAMANO_LOTE:
+                    _guardar(lote, using)
+                    escritas += len(lote)
+                    lote = []
+            _guardar(lote, using)
+            escritas += len(lote)
+        meses |= set(OcupacionDiaria.objects.using(using).filter(**rango).dates('fecha', 'month'))
+        invalidar_meses(meses, using=using)
+    return escritas
+
+
+def ocupacion_periodo(desde, hasta, veterinario_id=None):
+    """
+    Resumen de un rango leído de OcupacionDiaria (a lo más días x
+    veterinarios filas chicas): {(veterinario_id, fecha): {campo: n, ...}},
+    con los conteos según el estado efectivo (ver conteos_efectivos).
+    """
+    hoy = date.today()
+    qs = OcupacionDiaria.objects.filter(fecha__range=(desde, hasta))
+    if veterinario_id:
+        qs = qs.filter(veterinario_id=veterinario_id)
+    return {
+        (vet, fecha): dict(zip(CAMPOS, conteos_efectivos(fecha, conteos, hoy)))
+        for vet, fecha, *conteos in qs.values_list('veterinario_id', 'fecha', *CAMPOS)
+    }
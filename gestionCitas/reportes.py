@@ -0,0 +1,163 @@
+# gestionCitas/reportes.py
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+
+from main.routers import PRIMARIA
+
+from .archivo import fecha_corte
+from .models import BloqueArchivado, BloqueAtencion, Mascota, OcupacionDiaria, Veterinario
+from .ocupacion import CAMPOS, conteos_efectivos
+from .versiones import versiones_meses
+
+# Primer día del periodo de una fecha. Se agrupa por (veterinario, fecha) en
+# SQL y por periodo acá: Trunc* en SQLite es una función Python por fila.
+AGRUPACIONES = {
+    'semana': lambda fecha: fecha - timedelta(days=fecha.weekday()),
+    'mes': lambda fecha: fecha.replace(day=1),
+}
+REINCIDENTES = 10
+_RESERVADOS, _COMPLETADAS = CAMPOS.index('reservados'), CAMPOS.index('completadas')
+
+
+def _tasa(parte, total):
+    return round(parte / total, 4) if total else None
+
+
+def metricas(conteos, tardias=0):
+    """
+    Indicadores de un grupo de días a partir de sus conteos por estado:
+    - ocupacion: citas (reservadas o completadas) sobre los bloques que se
+      ofrecieron, es decir, todos menos los que canceló el veterinario.
+    - tasa_cancelado_vet: bloques cancelados por el veterinario sobre el total.
+    - tasa_cancelado_pac: citas canceladas por el paciente sobre las citas
+      que se tomaron (las que siguieron y las canceladas).
+    - tasa_cancelacion_tardia: cancelaciones del paciente registradas el
+      mismo día de la cita o después (lo más parecido a un "no se presentó").
+    """
+    total = sum(conteos[campo] for campo in CAMPOS)
+    ocupados = conteos['reservados'] + conteos['completadas']
+    tomadas = ocupados + conteos['cancelados_pac']
+    return {
+        **conteos,
+        'bloques': total,
+        'ocupados': ocupados,
+        'ocupacion': _tasa(ocupados, total - conteos['cancelados_vet']),
+        'tasa_cancelado_vet': _tasa(conteos['cancelados_vet'], total),
+        'tasa_cancelado_pac': _tasa(conteos['cancelados_pac'], tomadas),
+        'cancelaciones_tardias': tardias,
+        'tasa_cancelacion_tardia': _tasa(tardias, tomadas),
+    }
+
+
+def _cancelaciones_tardias(desde, hasta, veterinario_id):
+    """
+    Cancelaciones tardías por (veterinario, fecha) y por mascota, agrupadas
+    en SQL en la tabla activa y, si el rango llega antes del corte, también
+    en el archivo. Tardía es la que el paciente canceló el mismo día de la
+    cita o después, según cancelado_en (no `actualizado`, que se mueve con
+    cualquier edición posterior).
+    """
+    por_dia, por_mascota = Counter(), Counter()
+    modelos = [BloqueAtencion] + ([BloqueArchivado] if desde < fecha_corte() else [])
+    for modelo in modelos:
+        qs = modelo.objects.using(PRIMARIA).filter(
+            estado='CANCELADO_PAC', fecha__range=(desde, hasta), cancelado_en__date__gte=F('fecha'),
+        )
+        if veterinario_id:
+            qs = qs.filter(veterinario_id=veterinario_id)
+        for vet, fecha, n in qs.order_by().values_list('veterinario_id', 'fecha').annotate(n=Count('pk')):
+            por_dia[vet, fecha] += n
+        for fila in qs.exclude(mascota=None).order_by().values('mascota_id').annotate(n=Count('pk')):
+            por_mascota[fila['mascota_id']] += fila['n']
+    return por_dia, por_mascota
+
+
+def calcular(desde, hasta, veterinario_id=None, agrupacion='semana'):
+    """
+    Reporte de ocupación y cancelaciones entre `desde` y `hasta`. No recorre
+    bloques: lee los conteos por estado de OcupacionDiaria (a lo más días x
+    veterinarios filas chicas) y las cancelaciones tardías ya agrupadas por
+    día en SQL; en Python solo se suman esas filas por periodo. Lee de la
+    base principal, como las versiones con que se cachea (ver reporte()).
+    """
+    periodo_de = AGRUPACIONES[agrupacion]
+    resumen = OcupacionDiaria.objects.using(PRIMARIA).filter(fecha__range=(desde, hasta))
+    if veterinario_id:
+        resumen = resumen.filter(veterinario_id=veterinario_id)
+    tardias, por_mascota = _cancelaciones_tardias(desde, hasta, veterinario_id)
+
+    vacio = dict.fromkeys(CAMPOS, 0)
+    por_periodo = defaultdict(lambda: dict(vacio))
+    por_vet = defaultdict(lambda: dict(vacio))
+    carga = defaultdict(Counter)
+    periodos_fecha = {}
+    hoy = date.today()
+    for vet, fecha, *conteos in resumen.values_list('veterinario_id', 'fecha', *CAMPOS):
+        conteos = conteos_efectivos(fecha, conteos, hoy)
+        periodo = periodos_fecha.get(fecha)
+        if periodo is None:
+            periodo = periodos_fecha[fecha] = periodo_de(fecha)
+        grupo_periodo, grupo_vet = por_periodo[periodo], por_vet[vet]
+        for campo, n in zip(CAMPOS, conteos):
+            grupo_periodo[campo] += n
+            grupo_vet[campo] += n
+        carga[vet][periodo] += conteos[_RESERVADOS] + conteos[_COMPLETADAS]
+
+    periodos = sorted(por_periodo)
+    tardias_periodo, tardias_vet = Counter(), Counter()
+    for (vet, fecha), n in tardias.items():
+        tardias_periodo[periodo_de(fecha)] += n
+        tardias_vet[vet] += n
+    nombres = dict(Veterinario.objects.using(PRIMARIA).filter(pk__in=por_vet).values_list('pk', 'nombre'))
+    reincidentes = por_mascota.most_common(REINCIDENTES)
+    mascotas = dict(Mascota.objects.using(PRIMARIA).filter(pk__in=[chip for chip, _ in reincidentes]).values_list('pk', 'nombre'))
+
+    total = dict(vacio)
+    for conteos in por_periodo.values():
+        for campo in CAMPOS:
+            total[campo] += conteos[campo]
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupacion': agrupacion,
+        'veterinario': veterinario_id,
+        'total': metricas(total, sum(tardias.values())),
+        'periodos': [{'inicio': p, **metricas(por_periodo[p], tardias_periodo[p])} for p in periodos],
+        'veterinarios': sorted((
+            {
+                'rut': vet,
+                'nombre': nombres.get(vet, vet),
+                **metricas(conteos, tardias_vet[vet]),
+                # Citas por periodo, alineadas con 'periodos'
+                'carga': [carga[vet].get(p, 0) for p in periodos],
+            } for vet, conteos in por_vet.items()
+        ), key=lambda v: -v['ocupados']),
+        'reincidentes': [
+            {'chip': chip, 'nombre': mascotas.get(chip, chip), 'cancelaciones_tardias': n}
+            for chip, n in reincidentes
+        ],
+    }
+
+
+def reporte(desde, hasta, veterinario_id=None, agrupacion='semana'):
+    """
+    calcular() con cache por rango, veterinario y agrupación. La clave incluye
+    la versión de cada mes del rango (ver versiones.invalidar_meses), así que
+    un cambio en un mes solo invalida los reportes que lo contienen, y el
+    día actual, porque de él depende el estado efectivo de las reservas.
+    """
+    # Las versiones van tal cual en la clave: hash() cambia entre procesos
+    # (PYTHONHASHSEED) y dos tuplas distintas pueden chocar
+    clave = (
+        f"reporte:{desde}:{hasta}:{veterinario_id or ''}:{agrupacion}:{date.today()}:"
+        f"{'.'.join(versiones_meses(desde, hasta))}"
+    )
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular(desde, hasta, veterinario_id, agrupacion)
+        cache.set(clave, resultado, getattr(settings, 'REPORTES_CACHE_TTL', 3600))
+    return resultado
@@ -0,0 +1,78 @@
+# gestionCitas/reservas.py
+from django.db import transaction
+from django.db.models import Exists
+from django.utils import timezone
+
+from .codigos import nuevo_codigo
+from .models import BloqueAtencion
+
+ESTADOS_AGENDABLES = ('DISPONIBLE', 'CANCELADO_VET')
+
+
+class BloqueNoDisponible(Exception):
+    """El bloque dejó de estar agendable mientras se completaba la reserva."""
+
+
+def reservar_bloque(bloque_id, mascota, motivo_consulta='', codigo_cita=None):
+    """
+    Reserva el bloque para la mascota solo si sigue agendable.
+
+    Es un compare-and-set: un único UPDATE condicionado al estado, así que de
+    dos recepcionistas que intentan tomar el mismo bloque solo una gana.
+    Escribe únicamente los campos de la reserva. Retorna True si se reservó.
+    """
+    actualizados = BloqueAtencion.objects.filter(
+        pk=bloque_id, estado__in=ESTADOS_AGENDABLES
+    ).update(
+        mascota=mascota,
+        motivo_consulta=(motivo_consulta or '').strip()[:30],
+        codigo_cita=codigo_cita or nuevo_codigo(),
+        estado='RESERVADO',
+        actualizado=timezone.now(),
+    )
+    return actualizados == 1
+
+
+def reprogramar_bloque(bloque_original, nuevo_bloque_id):
+    """
+    Mueve la cita (mascota, motivo y codigo_cita) del bloque original al
+    nuevo bloque y deja el original como CANCELADO_VET, en una transacción
+    corta. El original puede estar RESERVADO o ya cancelado por el
+    veterinario (p. ej. por cancelar_ausencia sin cupo); en ese caso queda
+    como está. Las escrituras son compare-and-set: el original tiene que
+    seguir siendo esa misma cita y el nuevo tiene que seguir DISPONIBLE; si
+    alguno cambió entretanto no se escribe nada. Retorna True si se
+    reprogramó.
+    """
+    with transaction.atomic():
+        original = BloqueAtencion.objects.filter(
+            pk=bloque_original.pk,
+            mascota_id=bloque_original.mascota_id,
+            codigo_cita=bloque_original.codigo_cita,
+        )
+        cancelado = original.filter(estado='RESERVADO').update(
+            estado='CANCELADO_VET', actualizado=timezone.now()
+        )
+        if not cancelado:
+            pendiente = original.select_for_update().filter(estado='CANCELADO_VET')
+            if bloque_original.codigo_cita:
+                # Una cita ya reubicada no se vuelve a agendar
+                pendiente = pendiente.exclude(Exists(BloqueAtencion.objects.filter(
+                    codigo_cita=bloque_original.codigo_cita, estado='RESERVADO',
+                )))
+            if not pendiente.exists():
+                return False
+        tomado = BloqueAtencion.objects.filter(
+            pk=nuevo_bloque_id, estado='DISPONIBLE'
+        ).update(
+            mascota_id=bloque_original.mascota_id,
+            motivo_consulta=bloque_original.motivo_consulta,
+            codigo_cita=bloque_original.codigo_cita,
+            estado='RESERVADO',
+            actualizado=timezone.now(),
+        )
+        if not tomado:
+            # Deshace la cancelación del original
+            transaction.set_rollback(True)
+            return False
+    return True
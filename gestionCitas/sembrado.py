@@ -0,0 +1,146 @@
+# gestionCitas/sembrado.py
+import random
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .busqueda import reindexar_todo
+from .codigos import nuevos_codigos
+from .models import ESTADOS_CANCELADOS, BloqueAtencion, Cliente, Mascota, Veterinario
+from .validators import digito_verificador
+from .versiones import invalidar_calendario
+
+TAMANO_LOTE = 5000
+
+NOMBRES = ['Ana', 'Luis', 'Camila', 'Pedro', 'Josefa', 'Matías', 'Valentina', 'Benjamín',
+           'Florencia', 'Tomás', 'Isidora', 'Vicente', 'Catalina', 'Agustín', 'Fernanda']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva',
+             'Martínez', 'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Araya']
+MASCOTAS = ['Firulais', 'Luna', 'Rocky', 'Michi', 'Toby', 'Nala', 'Max', 'Kira', 'Simba',
+            'Coco', 'Canela', 'Bruno', 'Maya', 'Oliver', 'Pelusa']
+ESPECIES = [('Perro', 55), ('Gato', 35), ('Conejo', 5), ('Hurón', 3), ('Ave', 2)]
+MOTIVOS = ['Control', 'Vacuna', 'Desparasitación', 'Cojera', 'Vómitos', 'Piel', 'Castración']
+
+# Jornada de 09:00 a 18:00 en bloques de 30 minutos, de lunes a sábado
+HORA_APERTURA, HORA_CIERRE, DURACION = 9, 18, 30
+
+# Estados de días ya pasados: casi todo se atendió
+ESTADOS_PASADO = [('COMPLETADA', 70), ('DISPONIBLE', 17), ('CANCELADO_PAC', 10), ('CANCELADO_VET', 3)]
+
+
+def rut_con_dv(numero):
+    """RUT sin puntos ni guion con su dígito verificador: 12345678 -> '123456785'."""
+    return f"{numero}{digito_verificador(numero)}"
+
+
+def _lotes(objetos, modelo):
+    lote = []
+    for obj in objetos:
+        lote.append(obj)
+        if len(lote) >= TAMANO_LOTE:
+            modelo.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+
+
+def _horarios():
+    minutos = HORA_APERTURA * 60
+    while minutos + DURACION <= HORA_CIERRE * 60:
+        yield time(minutos // 60, minutos % 60), time((minutos + DURACION) // 60, (minutos + DURACION) % 60)
+        minutos += DURACION
+
+
+def sembrar(veterinarios=10, clientes=1000, mascotas_por_cliente=1.5, dias=365, desde=None, semilla=42):
+    """
+    Carga un conjunto de datos sintético con proporciones realistas: la mitad
+    del rango de días hacia atrás (casi todo COMPLETADA) y la otra mitad
+    hacia adelante (ocupación que baja a medida que se aleja de hoy). Todo se
+    inserta con bulk_create por lotes; al final se reconstruye el índice de
+    búsqueda (bulk_create no dispara señales). Retorna las cantidades creadas.
+    """
+    rnd = random.Random(semilla)
+    desde = desde or date.today() - timedelta(days=dias // 2)
+    hoy = date.today()
+    especies, pesos_especie = zip(*ESPECIES)
+    estados_pasado, pesos_pasado = zip(*ESTADOS_PASADO)
+
+    with transaction.atomic():
+        vets = [
+            Veterinario(rut_vet=rut_con_dv(5_000_000 + i), nombre=f"Dr(a). {rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}",
+                        especialidad=rnd.choice(['General', 'Felinos', 'Exóticos', 'Cirugía']))
+            for i in range(veterinarios)
+        ]
+        _lotes(vets, Veterinario)
+
+        _lotes((
+            Cliente(rut_cli=rut_con_dv(10_000_000 + i),
+                    nombre=f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+                    telefono=f"+569{rnd.randrange(10**7, 10**8)}",
+                    email=f"cliente{i}@example.com")
+            for i in range(clientes)
+        ), Cliente)
+
+        chips = []
+
+        def mascotas():
+            for i in range(clientes):
+                cantidad = int(mascotas_por_cliente) + (rnd.random() < mascotas_por_cliente % 1)
+                for j in range(max(1, cantidad)):
+                    chip = f"CHIP{i:08d}{j}"
+                    chips.append(chip)
+                    yield Mascota(codigo_chip=chip, nombre=rnd.choice(MASCOTAS),
+                                  especie=rnd.choices(especies, pesos_especie)[0],
+                                  edad=rnd.randrange(0, 16), dueño_id=rut_con_dv(10_000_000 + i))
+        _lotes(mascotas(), Mascota)
+
+        horarios = list(_horarios())
+        total_bloques = 0
+
+        def bloques():
+            nonlocal total_bloques
+            for d in range(dias):
+                fecha = desde + timedelta(days=d)
+                if fecha.weekday() == 6:
+                    continue
+                # Dos códigos por bloque: codigo_atencion y, si tiene paciente, codigo_cita
+                codigos = iter(nuevos_codigos(2 * len(vets) * len(horarios)))
+                for vet in vets:
+                    for inicio, fin in horarios:
+                        if fecha < hoy:
+                            estado = rnd.choices(estados_pasado, pesos_pasado)[0]
+                        else:
+                            ocupacion = max(0.05, 0.7 - 0.01 * (fecha - hoy).days)
+                            estado = 'RESERVADO' if rnd.random() < ocupacion else 'DISPONIBLE'
+                        codigo, codigo_cita = next(codigos), next(codigos)
+                        con_paciente = estado != 'DISPONIBLE' and bool(chips)
+                        cancelado_en = None
+                        if estado in ESTADOS_CANCELADOS:
+                            # Entre tres días antes y el mismo día (tardía)
+                            cancelado_en = timezone.make_aware(
+                                datetime.combine(fecha - timedelta(days=rnd.randrange(4)), inicio))
+                        total_bloques += 1
+                        yield BloqueAtencion(
+                            codigo_atencion=codigo,
+                            codigo_cita=codigo_cita if con_paciente else None,
+                            veterinario_id=vet.rut_vet,
+                            fecha=fecha, hora_inicio=inicio, hora_fin=fin, estado=estado,
+                            mascota_id=rnd.choice(chips) if con_paciente else None,
+                            motivo_consulta=rnd.choice(MOTIVOS) if con_paciente else '',
+                            cancelado_en=cancelado_en,
+                        )
+        _lotes(bloques(), BloqueAtencion)
+
+        terminos = reindexar_todo()
+        # Los bloques ya la invalidan (BloqueQuerySet); los veterinarios y
+        # mascotas creados con bulk_create no pasan por señales
+        invalidar_calendario()
+
+    return {
+        'veterinarios': len(vets),
+        'clientes': clientes,
+        'mascotas': len(chips),
+        'bloques': total_bloques,
+        'terminos_busqueda': terminos,
+    }
@@ -0,0 +1,71 @@
+# gestionCitas/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .busqueda import desindexar, indexar_cliente, indexar_mascota
+from .models import ESTADOS_CANCELADOS, BloqueAtencion, Cliente, Mascota, Veterinario
+from .ocupacion import recalcular as recalcular_ocupacion
+from .versiones import invalidar_calendario
+
+
+@receiver(post_save, sender=BloqueAtencion)
+@receiver(post_delete, sender=BloqueAtencion)
+@receiver(post_save, sender=Mascota)
+@receiver(post_delete, sender=Mascota)
+@receiver(post_save, sender=Veterinario)
+@receiver(post_delete, sender=Veterinario)
+def datos_calendario_cambiaron(sender, using=None, **kwargs):
+    invalidar_calendario(using=using)
+
+
+@receiver(pre_save, sender=BloqueAtencion)
+def marcar_cancelacion(sender, instance, raw=False, **kwargs):
+    # Se fija al cancelar y se conserva en los save() siguientes
+    if raw:
+        return
+    if instance.estado not in ESTADOS_CANCELADOS:
+        instance.cancelado_en = None
+    elif instance.cancelado_en is None:
+        instance.cancelado_en = timezone.now()
+
+
+# ===== Resumen de ocupación diaria =====
+# Las escrituras masivas (update, bulk_create) lo mantienen en BloqueQuerySet.
+
+@receiver(post_save, sender=BloqueAtencion)
+def ocupacion_bloque_guardado(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    claves = {(instance.veterinario_id, instance.fecha), getattr(instance, '_dia_cargado', (None, None))}
+    recalcular_ocupacion(claves, using=using)
+    instance._dia_cargado = (instance.veterinario_id, instance.fecha)
+
+
+@receiver(post_delete, sender=BloqueAtencion)
+def ocupacion_bloque_borrado(sender, instance, using=None, **kwargs):
+    recalcular_ocupacion({(instance.veterinario_id, instance.fecha)}, using=using)
+
+
+# ===== Índice de autocompletado =====
+
+@receiver(post_save, sender=Cliente)
+def indexar_cliente_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexar_cliente(instance)
+
+
+@receiver(post_save, sender=Mascota)
+def indexar_mascota_guardada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexar_mascota(instance)
+
+
+@receiver(post_delete, sender=Cliente)
+def desindexar_cliente(sender, instance, **kwargs):
+    desindexar('C', instance.pk)
+
+
+@receiver(post_delete, sender=Mascota)
+def desindexar_mascota(sender, instance, **kwargs):
+    desindexar('M', instance.pk)
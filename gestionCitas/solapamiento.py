@@ -0,0 +1,90 @@
+# gestionCitas/solapamiento.py
+from bisect import bisect_left
+from collections import defaultdict
+
+from .models import BloqueAtencion
+
+
+class IndiceIntervalos:
+    """
+    Índice en memoria de los bloques de cada (veterinario, fecha), ordenados
+    por hora de inicio, para detectar solapamientos con búsqueda binaria.
+
+    Se carga con una sola consulta para todos los veterinarios y fechas
+    afectados; cada verificación cuesta O(log n). No supone que los bloques
+    ya guardados estén libres de solapes (puede haber datos anteriores a
+    esta validación): junto a cada lista se guarda, por posición, el bloque
+    con el mayor fin entre los que empiezan hasta ahí. Los bloques
+    cancelados no ocupan el horario y no se cargan.
+    """
+
+    def __init__(self):
+        # (veterinario_id, fecha) -> lista ordenada de (hora_inicio, hora_fin, codigo)
+        self._intervalos = defaultdict(list)
+        # (veterinario_id, fecha) -> por posición, el intervalo de mayor fin hasta ella
+        self._maximos = defaultdict(list)
+
+    def _recalcular_maximos(self, clave, desde=0):
+        intervalos, maximos = self._intervalos[clave], self._maximos[clave]
+        del maximos[desde:]
+        mayor = maximos[-1] if maximos else None
+        for intervalo in intervalos[desde:]:
+            if mayor is None or intervalo[1] > mayor[1]:
+                mayor = intervalo
+            maximos.append(mayor)
+
+    @classmethod
+    def cargar(cls, veterinario_ids, fecha_inicio, fecha_fin=None):
+        indice = cls()
+        filas = BloqueAtencion.objects.filter(
+            veterinario_id__in=list(veterinario_ids),
+            fecha__range=(fecha_inicio, fecha_fin or fecha_inicio),
+        ).exclude(
+            estado__in=('CANCELADO_VET', 'CANCELADO_PAC'),
+        ).order_by('veterinario_id', 'fecha', 'hora_inicio').values_list(
+            'veterinario_id', 'fecha', 'hora_inicio', 'hora_fin', 'codigo_atencion'
+        )
+        for vet_id, fecha, inicio, fin, codigo in filas:
+            indice._intervalos[(vet_id, fecha)].append((inicio, fin, codigo))
+        for clave in indice._intervalos:
+            indice._recalcular_maximos(clave)
+        return indice
+
+    def buscar_conflicto(self, veterinario_id, fecha, hora_inicio, hora_fin):
+        """Retorna el bloque (inicio, fin, codigo) que se solapa, o None."""
+        intervalos = self._intervalos.get((veterinario_id, fecha))
+        if not intervalos:
+            return None
+        # Entre los bloques que empiezan antes de que termine el candidato,
+        # el que termina más tarde
+        i = bisect_left(intervalos, (hora_fin,))
+        if i:
+            mayor = self._maximos[(veterinario_id, fecha)][i - 1]
+            if mayor[1] > hora_inicio:
+                return mayor
+        return None
+
+    def agregar(self, veterinario_id, fecha, hora_inicio, hora_fin, codigo=''):
+        clave = (veterinario_id, fecha)
+        intervalo = (hora_inicio, hora_fin, codigo)
+        posicion = bisect_left(self._intervalos[clave], intervalo)
+        self._intervalos[clave].insert(posicion, intervalo)
+        self._recalcular_maximos(clave, posicion)
+
+    def verificar(self, veterinario_id, fecha, hora_inicio, hora_fin):
+        """
+        Retorna un dict con el detalle del conflicto (listo para mostrar o
+        serializar) o None si el bloque cabe.
+        """
+        choque = self.buscar_conflicto(veterinario_id, fecha, hora_inicio, hora_fin)
+        if choque is None:
+            return None
+        return {
+            'veterinario': veterinario_id,
+            'fecha': fecha,
+            'hora_inicio': hora_inicio,
+            'hora_fin': hora_fin,
+            'conflicto_con': choque[2],
+            'conflicto_inicio': choque[0],
+            'conflicto_fin': choque[1],
+        }
@@ -1,3 +1,1076 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time as time_module
+import tracemalloc
+from datetime import date, datetime, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .archivo import archivar
+from .ausencias import cancelar_ausencia
+from .bloques_libres import bloques_libres
+from .busqueda import autocompletar, ficha_cliente as buscar_ficha_cliente, indexar_lote
+from .calendario import bloques_del_mes, semanas_del_mes
+from .codigos import GeneradorCodigos, insertar_con_reintento, instante_codigo
+from .disponibilidad import crear_bloques_recurrentes
+from .exportacion import filas_agenda
+from .filas import filas_bloques
+from .ics import asignar_token
+from .importacion import Importador
+from .reportes import calcular, reporte
+from .reservas import reprogramar_bloque, reservar_bloque
+from .sembrado import rut_con_dv, sembrar
+from .solapamiento import IndiceIntervalos
+from .models import BloqueArchivado, BloqueAtencion, Cliente, MarcaProceso, Mascota, OcupacionDiaria, Veterinario
+from .transiciones import MARCA_COMPLETADAS, actualizar_citas_completadas
+from .versiones import CLAVE_CALENDARIO, invalidar_calendario
+
+
+class BaseCitasTestCase(TestCase):
+    """Datos mínimos: una recepcionista logueada, dos veterinarios y un paciente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupo = Group.objects.create(name='Recepcionista')
+        cls.user = User.objects.create_user('recepcion', password='clave-segura-123')
+        cls.user.groups.add(cls.grupo)
+
+        cls.vet = Veterinario.objects.create(rut_vet='111111111', nombre='Dra. Ana')
+        cls.vet2 = Veterinario.objects.create(rut_vet='222222222', nombre='Dr. Luis')
+        cls.cliente = Cliente.objects.create(rut_cli='123456785', nombre='Pedro')
+        cls.mascota = Mascota.objects.create(
+            codigo_chip='CHIP1', nombre='Firulais', especie='Perro', dueño=cls.cliente
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def crear_bloque(codigo, vet, fecha, hora, estado='DISPONIBLE', mascota=None):
+        return BloqueAtencion.objects.create(
+            codigo_atencion=codigo,
+            veterinario=vet,
+            fecha=fecha,
+            hora_inicio=time(hora, 0),
+            hora_fin=time(hora, 30),
+            estado=estado,
+            mascota=mascota,
+        )
+
+
+class CalendarioMesTests(BaseCitasTestCase):
+
+    def test_grilla_agrupa_bloques_por_dia(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 1), 10)
+        self.crear_bloque('B2', self.vet, date(2030, 1, 1), 9)
+        self.crear_bloque('B3', self.vet2, date(2030, 1, 31), 9)
+
+        with self.assertNumQueries(1):
+            semanas = semanas_del_mes(2030, 1)
+
+        # Enero 2030 parte un martes: un espacio en blanco al inicio.
+        self.assertIsNone(semanas[0][0])
+        self.assertTrue(all(len(semana) == 7 for semana in semanas))
+        dias = [dia for semana in semanas for dia in semana if dia]
+        self.assertEqual(len(dias), 31)
+        self.assertEqual([b.pk for b in dias[0]['bloques']], ['B2', 'B1'])
+        self.assertEqual([b.pk for b in dias[30]['bloques']], ['B3'])
+
+        solo_vet2 = semanas_del_mes(2030, 1, self.vet2.pk)
+        dias = [dia for semana in solo_vet2 for dia in semana if dia]
+        self.assertEqual(dias[0]['bloques'], [])
+
+    def test_cantidad_de_consultas_no_depende_de_los_bloques(self):
+        url = reverse('gestionCitas:calendario_mes') + '?year=2030&month=3'
+        self.client.get(url)
+        invalidar_calendario()  # forzar que se vuelva a armar la grilla
+        # Sesión, usuario, versión de datos, veterinarios y bloques del mes
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+        for dia in range(1, 32):
+            self.crear_bloque(f'A{dia}', self.vet, date(2030, 3, dia), 9)
+            self.crear_bloque(f'B{dia}', self.vet2, date(2030, 3, dia), 10,
+                              estado='RESERVADO', mascota=self.mascota)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertContains(response, 'Firulais')
+
+    def test_version_cambiada_por_otro_proceso(self):
+        self.crear_bloque('B1', self.vet, date(2030, 3, 4), 9)
+        url = reverse('gestionCitas:calendario_mes') + '?year=2030&month=3'
+        self.assertNotContains(self.client.get(url), 'Firulais')
+
+        # Otro proceso (un comando, otro worker) reserva el bloque: escribe en
+        # la base y cambia la versión sin pasar por el cache de este proceso
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE gestionCitas_bloqueatencion SET estado = 'RESERVADO', mascota_id = %s "
+                "WHERE codigo_atencion = 'B1'", [self.mascota.pk],
+            )
+            cursor.execute(
+                "UPDATE gestionCitas_versiondatos SET version = 'OTRO' WHERE clave = %s",
+                [CLAVE_CALENDARIO],
+            )
+        self.assertContains(self.client.get(url), 'Firulais')
+
+
+class CitasCompletadasTests(BaseCitasTestCase):
+
+    def test_worker_es_incremental(self):
+        pasado = self.crear_bloque('P1', self.vet, date(2030, 1, 10), 9,
+                                   estado='RESERVADO', mascota=self.mascota)
+        futuro = self.crear_bloque('F1', self.vet, date(2030, 1, 20), 9,
+                                   estado='RESERVADO', mascota=self.mascota)
+
+        self.assertEqual(actualizar_citas_completadas(hoy=date(2030, 1, 15)), 1)
+        self.assertEqual(MarcaProceso.objects.get(nombre=MARCA_COMPLETADAS).fecha, date(2030, 1, 15))
+        # Misma fecha: no vuelve a escribir.
+        with self.assertNumQueries(3):
+            self.assertEqual(actualizar_citas_completadas(hoy=date(2030, 1, 15)), 0)
+
+        self.assertEqual(actualizar_citas_completadas(hoy=date(2030, 1, 25)), 1)
+        pasado.refresh_from_db()
+        futuro.refresh_from_db()
+        self.assertEqual((pasado.estado, futuro.estado), ('COMPLETADA', 'COMPLETADA'))
+
+    def test_reserva_anterior_a_la_marca(self):
+        actualizar_citas_completadas(hoy=date(2030, 1, 15))
+        # Reserva que aparece con una fecha anterior a la última corrida
+        viejo = self.crear_bloque('V1', self.vet, date(2030, 1, 2), 9,
+                                  estado='RESERVADO', mascota=self.mascota)
+
+        self.assertEqual(actualizar_citas_completadas(hoy=date(2030, 1, 16)), 1)
+        viejo.refresh_from_db()
+        self.assertEqual(viejo.estado, 'COMPLETADA')
+
+    def test_vistas_no_escriben_y_muestran_completada(self):
+        ayer = date.today() - timedelta(days=1)
+        bloque = self.crear_bloque('P1', self.vet, ayer, 9, estado='RESERVADO', mascota=self.mascota)
+
+        response = self.client.get(reverse('gestionCitas:agenda_dia'), {'fecha': ayer.isoformat()})
+        self.assertEqual(response.context['bloques_ocupados'][0].estado, 'COMPLETADA')
+        bloque.refresh_from_db()
+        self.assertEqual(bloque.estado, 'RESERVADO')
+
+    def test_comando(self):
+        self.crear_bloque('P1', self.vet, date.today() - timedelta(days=3), 9,
+                          estado='RESERVADO', mascota=self.mascota)
+        salida = StringIO()
+        call_command('completar_citas', stdout=salida)
+        self.assertIn('Citas completadas: 1', salida.getvalue())
+
+
+class DisponibilidadRecurrenteTests(BaseCitasTestCase):
+
+    def test_genera_plantilla_y_omite_existentes(self):
+        # Lunes 7 y miércoles 9 de enero de 2030, 09:00-11:00 en bloques de 30 min.
+        self.crear_bloque('EXISTE', self.vet, date(2030, 1, 7), 9)
+        resultado = crear_bloques_recurrentes(
+            [self.vet.pk, self.vet2.pk], date(2030, 1, 7), date(2030, 1, 13),
+            [0, 2], time(9, 0), time(11, 0), 30,
+        )
+        self.assertEqual((resultado['creados'], resultado['omitidos']), (15, 1))
+        self.assertEqual(resultado['conflictos'][0]['conflicto_con'], 'EXISTE')
+        self.assertEqual(BloqueAtencion.objects.filter(fecha=date(2030, 1, 8)).count(), 0)
+        self.assertEqual(BloqueAtencion.objects.filter(veterinario=self.vet2).count(), 8)
+
+        repetido = crear_bloques_recurrentes(
+            [self.vet.pk], date(2030, 1, 7), date(2030, 1, 13),
+            [0, 2], time(9, 0), time(11, 0), 30,
+        )
+        self.assertEqual((repetido['creados'], repetido['omitidos']), (0, 8))
+
+    def test_vista(self):
+        response = self.client.post(reverse('gestionCitas:generar_disponibilidad'), {
+            'veterinarios': [self.vet.pk],
+            'fecha_inicio': '2030-01-01',
+            'fecha_fin': '2030-01-31',
+            'dias_semana': ['0', '1', '2', '3', '4'],
+            'hora_inicio': '09:00',
+            'hora_fin': '13:00',
+            'duracion': '60',
+        })
+        self.assertRedirects(response, reverse('gestionCitas:calendario_mes'))
+        self.assertEqual(BloqueAtencion.objects.count(), 23 * 4)
+
+
+class SolapamientoTests(BaseCitasTestCase):
+
+    def test_detecta_solapamientos(self):
+        dia = date(2030, 1, 7)
+        self.crear_bloque('A', self.vet, dia, 9)    # 09:00-09:30
+        self.crear_bloque('B', self.vet, dia, 11)   # 11:00-11:30
+        indice = IndiceIntervalos.cargar([self.vet.pk, self.vet2.pk], dia)
+
+        self.assertIsNone(indice.buscar_conflicto(self.vet.pk, dia, time(9, 30), time(11, 0)))
+        self.assertIsNone(indice.buscar_conflicto(self.vet2.pk, dia, time(9, 0), time(9, 30)))
+        self.assertEqual(indice.buscar_conflicto(self.vet.pk, dia, time(9, 15), time(9, 45))[2], 'A')
+        self.assertEqual(indice.buscar_conflicto(self.vet.pk, dia, time(10, 0), time(12, 0))[2], 'B')
+        self.assertEqual(indice.buscar_conflicto(self.vet.pk, dia, time(8, 0), time(10, 0))[2], 'A')
+
+        indice.agregar(self.vet.pk, dia, time(10, 0), time(10, 30), 'C')
+        self.assertEqual(indice.verificar(self.vet.pk, dia, time(10, 15), time(10, 45))['conflicto_con'], 'C')
+
+    def test_datos_solapados_y_cancelados(self):
+        dia = date(2030, 1, 7)
+        # Bloque largo anterior a la validación, con otro adentro
+        largo = self.crear_bloque('L', self.vet, dia, 9)
+        BloqueAtencion.objects.filter(pk=largo.pk).update(hora_fin=time(12, 0))
+        self.crear_bloque('D', self.vet, dia, 10)
+        self.crear_bloque('X', self.vet, dia, 14, estado='CANCELADO_VET')
+        indice = IndiceIntervalos.cargar([self.vet.pk], dia)
+
+        # El vecino inmediato (D, 10:00-10:30) no choca; el bloque largo sí
+        self.assertEqual(indice.buscar_conflicto(self.vet.pk, dia, time(11, 0), time(11, 30))[2], 'L')
+        self.assertIsNone(indice.buscar_conflicto(self.vet.pk, dia, time(12, 0), time(12, 30)))
+        # El horario de un bloque cancelado queda libre
+        self.assertIsNone(indice.buscar_conflicto(self.vet.pk, dia, time(14, 0), time(14, 30)))
+
+        indice.agregar(self.vet.pk, dia, time(8, 0), time(13, 0), 'M')
+        self.assertEqual(indice.buscar_conflicto(self.vet.pk, dia, time(12, 30), time(13, 30))[2], 'M')
+
+    def test_agregar_disponibilidad_rechaza_solapado(self):
+        self.crear_bloque('A', self.vet, date(2030, 1, 7), 9)
+        url = reverse('gestionCitas:agregar_disponibilidad', args=['2030-01-07', '0'])
+        self.client.post(url, {'veterinario': self.vet.pk, 'hora_inicio': '09:15', 'hora_fin': '10:00'})
+        self.assertEqual(BloqueAtencion.objects.count(), 1)
+        self.client.post(url, {'veterinario': self.vet.pk, 'hora_inicio': '09:30', 'hora_fin': '10:00'})
+        self.assertEqual(BloqueAtencion.objects.count(), 2)
+
+
+class ReservaAtomicaTests(BaseCitasTestCase):
+
+    def test_agendar_cita(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9)
+        response = self.client.post(reverse('gestionCitas:agendar_cita', args=['B1']), {
+            'cliente-rut_cli': '12.345.678-5', 'cliente-nombre': 'Pedro',
+            'mascota-codigo_chip': 'CHIP1', 'mascota-nombre': 'Firulais', 'mascota-especie': 'Perro',
+            'motivo_consulta': 'Vacuna',
+        })
+        self.assertRedirects(response, reverse('gestionCitas:calendario_mes'))
+        bloque = BloqueAtencion.objects.get(pk='B1')
+        self.assertEqual((bloque.estado, bloque.mascota_id, bloque.motivo_consulta), ('RESERVADO', 'CHIP1', 'Vacuna'))
+        self.assertTrue(bloque.codigo_cita)
+
+    def test_no_reserva_bloque_tomado(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9, estado='RESERVADO', mascota=self.mascota)
+        otra = Mascota.objects.create(codigo_chip='CHIP2', nombre='Michi', especie='Gato', dueño=self.cliente)
+        self.assertFalse(reservar_bloque('B1', otra))
+        self.assertEqual(BloqueAtencion.objects.get(pk='B1').mascota_id, 'CHIP1')
+
+    def test_reprogramar(self):
+        original = self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('B2', self.vet, date(2030, 1, 8), 9)
+        self.assertTrue(reprogramar_bloque(original, 'B2'))
+        self.assertFalse(reprogramar_bloque(original, 'B2'))
+        self.assertEqual(BloqueAtencion.objects.get(pk='B1').estado, 'CANCELADO_VET')
+        self.assertEqual(BloqueAtencion.objects.get(pk='B2').mascota_id, 'CHIP1')
+
+    def test_reprogramar_conserva_codigo_y_no_pisa_cambios(self):
+        original = self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9)
+        self.crear_bloque('B2', self.vet, date(2030, 1, 8), 9)
+        self.crear_bloque('B3', self.vet, date(2030, 1, 9), 9, estado='RESERVADO', mascota=self.mascota)
+        reservar_bloque('B1', self.mascota, codigo_cita='CITA000001')
+        original.refresh_from_db()
+
+        # El nuevo bloque ya no está libre: el original queda como estaba
+        self.assertFalse(reprogramar_bloque(original, 'B3'))
+        self.assertEqual(BloqueAtencion.objects.get(pk='B1').estado, 'RESERVADO')
+
+        # El original se canceló mientras se elegía el nuevo bloque
+        BloqueAtencion.objects.filter(pk='B1').update(estado='CANCELADO_PAC')
+        self.assertFalse(reprogramar_bloque(original, 'B2'))
+        self.assertEqual(BloqueAtencion.objects.get(pk='B2').estado, 'DISPONIBLE')
+
+        BloqueAtencion.objects.filter(pk='B1').update(estado='RESERVADO')
+        self.assertTrue(reprogramar_bloque(original, 'B2'))
+        self.assertEqual(BloqueAtencion.objects.get(pk='B2').codigo_cita, 'CITA000001')
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    """Muchas recepcionistas intentan tomar el mismo bloque a la vez."""
+
+    INTENTOS = 50
+
+    def test_solo_una_reserva_gana(self):
+        vet = Veterinario.objects.create(rut_vet='111111111', nombre='Dra. Ana')
+        cliente = Cliente.objects.create(rut_cli='123456785', nombre='Pedro')
+        mascotas = Mascota.objects.bulk_create(
+            Mascota(codigo_chip=f'CHIP{i}', nombre=f'M{i}', especie='Perro', dueño=cliente)
+            for i in range(self.INTENTOS)
+        )
+        BloqueAtencion.objects.create(
+            codigo_atencion='B1', veterinario=vet, fecha=date(2030, 1, 7),
+            hora_inicio=time(9, 0), hora_fin=time(9, 30),
+        )
+
+        barrera = threading.Barrier(self.INTENTOS)
+        ganadores = []
+
+        def intentar(mascota):
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        if reservar_bloque('B1', mascota):
+                            ganadores.append(mascota.pk)
+                        return
+                    except OperationalError:
+                        # SQLite: la base está bloqueada por otra escritura, reintentar
+                        continue
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=intentar, args=(m,)) for m in mascotas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(ganadores), 1)
+        bloque = BloqueAtencion.objects.get(pk='B1')
+        self.assertEqual((bloque.estado, bloque.mascota_id), ('RESERVADO', ganadores[0]))
+
+
+class CacheCalendarioTests(BaseCitasTestCase):
+
+    def test_mes_sin_cambios_no_consulta_bloques(self):
+        self.crear_bloque('B1', self.vet, date(2030, 3, 4), 9)
+        url = reverse('gestionCitas:calendario_mes') + '?year=2030&month=3'
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if 'bloqueatencion' in q['sql']])
+        self.assertContains(response, 'name="csrfmiddlewaretoken"', count=0)  # sin reservas no hay formularios
+
+    def test_cambios_invalidan_la_grilla(self):
+        bloque = self.crear_bloque('B1', self.vet, date(2030, 3, 4), 9)
+        url = reverse('gestionCitas:calendario_mes') + '?year=2030&month=3'
+        self.assertContains(self.client.get(url), 'Disponible')
+
+        reservar_bloque('B1', self.mascota)  # update() sin señales
+        response = self.client.get(url)
+        self.assertContains(response, 'Firulais')
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+        self.assertNotContains(response, '<!--csrf-->')
+
+        self.mascota.nombre = 'Rex'
+        self.mascota.save()
+        self.assertContains(self.client.get(url), 'Rex')
+
+        # Cualquier update() del queryset invalida, sin llamadas a mano
+        BloqueAtencion.objects.filter(pk='B1').update(estado='CANCELADO_PAC')
+        self.assertNotContains(self.client.get(url), 'Rex')
+        BloqueAtencion.objects.filter(pk='B1').update(estado='RESERVADO')
+        self.assertContains(self.client.get(url), 'Rex')
+
+        bloque.delete()
+        self.assertContains(self.client.get(url), 'Sin bloques')
+
+
+class ApiBloquesTests(BaseCitasTestCase):
+
+    def test_mes_semana_dia(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('B2', self.vet2, date(2030, 1, 9), 9)
+        self.crear_bloque('B3', self.vet, date(2030, 1, 20), 9)
+
+        mes = self.client.get(reverse('gestionCitas:api_bloques_mes'), {'year': 2030, 'month': 1}).json()
+        self.assertEqual([fila[0] for fila in mes['bloques']], ['B1', 'B2', 'B3'])
+        fila = dict(zip(mes['campos'], mes['bloques'][0]))
+        self.assertEqual((fila['hora_inicio'], fila['estado'], fila['mascota__nombre']), ('09:00', 'RESERVADO', 'Firulais'))
+
+        semana = self.client.get(reverse('gestionCitas:api_bloques_semana'), {'fecha': '2030-01-09'}).json()
+        self.assertEqual((semana['desde'], semana['hasta']), ('2030-01-07', '2030-01-13'))
+        self.assertEqual([fila[0] for fila in semana['bloques']], ['B1', 'B2'])
+
+        dia = self.client.get(reverse('gestionCitas:api_bloques_dia'),
+                              {'fecha': '2030-01-09', 'veterinario': self.vet.pk}).json()
+        self.assertEqual(dia['bloques'], [])
+
+        self.assertEqual(self.client.get(reverse('gestionCitas:api_bloques_mes'), {'month': 13}).status_code, 400)
+
+    def test_get_condicional(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9)
+        url = reverse('gestionCitas:api_bloques_mes') + '?year=2030&month=1'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        bloques_sql = [q['sql'] for q in ctx.captured_queries if 'bloqueatencion' in q['sql']]
+        self.assertEqual(len(bloques_sql), 1)  # solo el agregado, sin serializar
+
+        reservar_bloque('B1', self.mascota)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Cambia solo un dato unido: la mascota del bloque
+        etag = response['ETag']
+        self.mascota.nombre = 'Bobby'
+        self.mascota.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Bobby')
+
+        BloqueAtencion.objects.filter(pk='B1').delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class AutocompletarTests(BaseCitasTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente2 = Cliente.objects.create(rut_cli='98765432K', nombre='María José Pérez')
+        Mascota.objects.create(codigo_chip='900-111', nombre='Pelusa', especie='Gato', dueño=cls.cliente2)
+
+    def buscar(self, q, **extra):
+        response = self.client.get(reverse('gestionCitas:autocompletar'), {'q': q, **extra})
+        return [(r['tipo'], r.get('rut') or r.get('codigo_chip')) for r in response.json()['resultados']]
+
+    def test_prefijos(self):
+        self.assertEqual(self.buscar('1234'), [('cliente', '123456785')])
+        self.assertEqual(self.buscar('12.345.6'), [('cliente', '123456785')])
+        self.assertEqual(self.buscar('9876'), [('cliente', '98765432K')])
+        self.assertEqual(self.buscar('900-1'), [('mascota', '900-111')])
+        self.assertEqual(self.buscar('fir'), [('mascota', 'CHIP1')])
+        self.assertEqual(self.buscar('PE'), [('cliente', '123456785'), ('mascota', '900-111'), ('cliente', '98765432K')])
+        self.assertEqual(self.buscar('jose per'), [('cliente', '98765432K')])
+        self.assertEqual(self.buscar('pe', limite=1), [('cliente', '123456785')])
+        self.assertEqual(self.buscar('x'), [])
+
+    def test_limite_cuenta_cada_objeto_una_vez(self):
+        # Calza con 'ped' por dos términos: antes ocupaba dos de los lugares
+        Cliente.objects.create(rut_cli='111111111', nombre='Pedrito Pedraza')
+        self.assertEqual(self.buscar('ped', limite=2), [('cliente', '111111111'), ('cliente', '123456785')])
+
+    def test_varias_palabras_con_muchos_candidatos(self):
+        # Más clientes que calzan con la palabra más larga que los que se
+        # revisarían cortando la lista antes de cruzar con la otra palabra
+        Cliente.objects.bulk_create(
+            Cliente(rut_cli=f'5{i:07d}1', nombre=f'Gonzalez {i}') for i in range(1100)
+        )
+        Cliente.objects.create(rut_cli='999999999', nombre='Zoe Gonzalez')
+        indexar_lote(clientes=Cliente.objects.all())
+        self.assertEqual(self.buscar('gonzalez zo'), [('cliente', '999999999')])
+
+    def test_indice_sigue_a_los_cambios(self):
+        self.mascota.nombre = 'Bobby'
+        self.mascota.save()
+        self.assertEqual(self.buscar('fir'), [])
+        self.assertEqual(self.buscar('bob'), [('mascota', 'CHIP1')])
+
+        self.cliente2.delete()
+        self.assertEqual(self.buscar('pelu'), [])
+        self.assertEqual(self.buscar('maria'), [])
+
+        call_command('reindexar_busqueda', stdout=StringIO())
+        self.assertEqual(self.buscar('bob'), [('mascota', 'CHIP1')])
+
+
+class FichaClienteTests(BaseCitasTestCase):
+
+    def test_por_rut_y_por_chip(self):
+        otra = Mascota.objects.create(codigo_chip='CHIP2', nombre='Michi', especie='Gato', dueño=self.cliente)
+        hoy = date.today()
+        self.crear_bloque('P1', self.vet, hoy + timedelta(days=3), 9, estado='RESERVADO', mascota=otra)
+        self.crear_bloque('R1', self.vet, hoy - timedelta(days=10), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('V1', self.vet, hoy - timedelta(days=400), 9, estado='COMPLETADA', mascota=self.mascota)
+
+        with self.assertNumQueries(3):
+            ficha = buscar_ficha_cliente(rut='123456785')
+        self.assertEqual([m['codigo_chip'] for m in ficha['mascotas']], ['CHIP1', 'CHIP2'])
+        self.assertEqual([(c['codigo_atencion'], c['estado'], c['proxima']) for c in ficha['citas']],
+                         [('R1', 'COMPLETADA', False), ('P1', 'RESERVADO', True)])
+        self.assertIsNone(ficha['mascota'])
+
+        data = self.client.get(reverse('gestionCitas:ficha_cliente'), {'chip': 'CHIP2'}).json()
+        self.assertTrue(data['encontrado'])
+        self.assertEqual((data['cliente']['rut'], data['mascota']['nombre']), ('123456785', 'Michi'))
+
+        data = self.client.get(reverse('gestionCitas:ficha_cliente'), {'rut': '11.111.111-1'}).json()
+        self.assertFalse(data['encontrado'])
+
+    def test_buscar_mascota_requiere_rol(self):
+        self.client.logout()
+        response = self.client.get(reverse('gestionCitas:buscar_mascota'), {'chip': 'CHIP1'})
+        self.assertEqual(response.status_code, 302)
+
+
+class BloquesLibresTests(BaseCitasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dia = date.today() + timedelta(days=1)
+        for hora in range(8, 18):
+            self.crear_bloque(f'A{hora}', self.vet, self.dia, hora)
+            self.crear_bloque(f'B{hora}', self.vet2, self.dia, hora)
+        self.crear_bloque('PASADO', self.vet, date.today() - timedelta(days=1), 9)
+        self.crear_bloque('TOMADO', self.vet, self.dia + timedelta(days=1), 9,
+                          estado='RESERVADO', mascota=self.mascota)
+
+    def test_paginacion_por_cursor(self):
+        vistos = []
+        cursor = None
+        while True:
+            filas, cursor = bloques_libres(limite=7, cursor=cursor)
+            vistos += [f['codigo_atencion'] for f in filas]
+            if cursor is None:
+                break
+        self.assertEqual(len(vistos), 20)
+        self.assertEqual(len(set(vistos)), 20)
+        self.assertEqual(vistos[:4], ['A8', 'B8', 'A9', 'B9'])
+
+    def test_filtros(self):
+        filas, siguiente = bloques_libres(veterinario_id=self.vet2.pk, hora_desde=time(10, 0),
+                                          hora_hasta=time(12, 0))
+        self.assertEqual([f['codigo_atencion'] for f in filas], ['B10', 'B11'])
+        self.assertIsNone(siguiente)
+
+        data = self.client.get(reverse('gestionCitas:api_bloques_libres'),
+                               {'veterinario': self.vet.pk, 'limite': 3}).json()
+        self.assertEqual([b['codigo_atencion'] for b in data['bloques']], ['A8', 'A9', 'A10'])
+        data = self.client.get(reverse('gestionCitas:api_bloques_libres'),
+                               {'veterinario': self.vet.pk, 'limite': 3, 'cursor': data['siguiente']}).json()
+        self.assertEqual(data['bloques'][0]['codigo_atencion'], 'A11')
+
+    def test_formulario_reprogramar_sin_n_mas_1(self):
+        original = self.crear_bloque('ORIG', self.vet, self.dia + timedelta(days=2), 9,
+                                     estado='RESERVADO', mascota=self.mascota)
+        url = reverse('gestionCitas:reprogramar_cita', args=[original.pk])
+        self.client.get(url)
+        with self.assertNumQueries(4):  # sesión, usuario, bloque original, primera página
+            response = self.client.get(url)
+        self.assertContains(response, 'A17')
+        self.assertNotContains(response, 'B8 -')
+        self.assertNotContains(response, 'PASADO')
+
+        # Un bloque fuera de la primera página (cargado por la API) también se acepta
+        response = self.client.post(url, {'nuevo_bloque': 'A17'})
+        self.assertEqual(BloqueAtencion.objects.get(pk='A17').mascota_id, 'CHIP1')
+        response = self.client.post(reverse('gestionCitas:reprogramar_cita', args=['A17']), {'nuevo_bloque': 'PASADO'})
+        self.assertFalse(response.context['form'].is_valid())
+
+
+class AusenciaVeterinarioTests(BaseCitasTestCase):
+
+    def test_cancela_rango_y_reubica(self):
+        inicio = date.today() + timedelta(days=10)
+        fin = inicio + timedelta(days=1)
+        otras = [
+            Mascota.objects.create(codigo_chip=f'CHIP{i}', nombre=f'Mascota {i}', especie='Gato', dueño=self.cliente)
+            for i in (2, 3)
+        ]
+        self.crear_bloque('R1', self.vet, inicio, 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('R2', self.vet, inicio, 10, estado='RESERVADO', mascota=otras[0])
+        self.crear_bloque('R3', self.vet, fin, 9, estado='RESERVADO', mascota=otras[1])
+        self.crear_bloque('D1', self.vet, inicio, 11)
+        self.crear_bloque('V1', self.vet, fin + timedelta(days=2), 9)
+        self.crear_bloque('L1', self.vet2, inicio, 10)
+        self.crear_bloque('FUERA', self.vet, fin + timedelta(days=1), 15, estado='RESERVADO', mascota=self.mascota)
+
+        response = self.client.post(reverse('gestionCitas:ausencia_veterinario'), {
+            'veterinario': self.vet.pk, 'fecha_inicio': inicio, 'fecha_fin': fin,
+        })
+        reporte = response.context['reporte']
+
+        self.assertEqual(reporte['cancelados'], 4)
+        # El primero conserva a su veterinario; el segundo pasa al otro; el tercero queda sin cupo
+        self.assertEqual(
+            [(r['original']['codigo_atencion'], r['nuevo']['codigo_atencion']) for r in reporte['reubicados']],
+            [('R1', 'V1'), ('R2', 'L1')],
+        )
+        self.assertEqual([f['codigo_atencion'] for f in reporte['sin_cupo']], ['R3'])
+        self.assertContains(response, reverse('gestionCitas:reprogramar_cita', args=['R3']))
+
+        estados = dict(BloqueAtencion.objects.values_list('codigo_atencion', 'estado'))
+        for codigo in ('R1', 'R2', 'R3', 'D1'):
+            self.assertEqual(estados[codigo], 'CANCELADO_VET')
+        self.assertEqual(estados['FUERA'], 'RESERVADO')
+        self.assertEqual(BloqueAtencion.objects.get(pk='V1').mascota_id, 'CHIP1')
+        self.assertEqual(BloqueAtencion.objects.get(pk='L1').mascota_id, 'CHIP2')
+
+    def test_no_cancela_dias_pasados(self):
+        ayer, manana = date.today() - timedelta(days=1), date.today() + timedelta(days=1)
+        self.crear_bloque('PASADA', self.vet, ayer, 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('FUTURA', self.vet, manana, 9, estado='RESERVADO', mascota=self.mascota)
+
+        reporte = cancelar_ausencia(self.vet.pk, ayer, manana)
+
+        self.assertEqual(reporte['cancelados'], 1)
+        estados = dict(BloqueAtencion.objects.values_list('codigo_atencion', 'estado'))
+        self.assertEqual((estados['PASADA'], estados['FUTURA']), ('RESERVADO', 'CANCELADO_VET'))
+
+    def test_reprogramar_paciente_sin_cupo(self):
+        manana = date.today() + timedelta(days=1)
+        self.crear_bloque('R1', self.vet, manana, 9, estado='RESERVADO', mascota=self.mascota)
+        BloqueAtencion.objects.filter(pk='R1').update(codigo_cita='CITA000001')
+        reporte = cancelar_ausencia(self.vet.pk, manana, manana)
+        self.assertEqual([f['codigo_atencion'] for f in reporte['sin_cupo']], ['R1'])
+        cancelado = BloqueAtencion.objects.get(pk='R1')
+
+        # El link del reporte: el original ya está CANCELADO_VET y queda como está
+        self.crear_bloque('N1', self.vet, manana + timedelta(days=2), 9)
+        response = self.client.post(reverse('gestionCitas:reprogramar_cita', args=['R1']), {'nuevo_bloque': 'N1'})
+        self.assertRedirects(response, reverse('gestionCitas:calendario_mes'))
+        nuevo = BloqueAtencion.objects.get(pk='N1')
+        self.assertEqual((nuevo.estado, nuevo.mascota_id, nuevo.codigo_cita), ('RESERVADO', 'CHIP1', 'CITA000001'))
+        original = BloqueAtencion.objects.get(pk='R1')
+        self.assertEqual((original.estado, original.actualizado), ('CANCELADO_VET', cancelado.actualizado))
+
+        # La cita ya tiene bloque: no se agenda una segunda vez
+        self.crear_bloque('N2', self.vet, manana + timedelta(days=3), 9)
+        self.assertFalse(reprogramar_bloque(original, 'N2'))
+        self.assertEqual(BloqueAtencion.objects.get(pk='N2').estado, 'DISPONIBLE')
+
+
+class CodigosTests(BaseCitasTestCase):
+
+    def test_codigos_crecientes_y_unicos(self):
+        # Reloj detenido: todo cae en el mismo milisegundo y obliga a desbordar el contador
+        generador = GeneradorCodigos(reloj=lambda: 1767225600.0)
+        codigos = generador.lote(5000) + [generador.siguiente() for _ in range(100)]
+        self.assertEqual(len(set(codigos)), len(codigos))
+        self.assertEqual(codigos, sorted(codigos))
+        self.assertTrue(all(len(c) == 10 for c in codigos))
+        self.assertEqual(instante_codigo(codigos[0]).isoformat(), '2026-01-01T00:00:00+00:00')
+
+    def test_reintenta_si_el_codigo_choca(self):
+        dia = date(2030, 1, 7)
+        self.crear_bloque('B1', self.vet, dia, 9)
+        # Otro proceso ya usó 'B1': el primer intento choca y el segundo entra
+        codigos = iter(['B1', 'B2', 'B1', 'B1', 'B1'])
+
+        def insertar():
+            return BloqueAtencion.objects.create(
+                codigo_atencion=next(codigos), veterinario=self.vet, fecha=dia,
+                hora_inicio=time(10, 0), hora_fin=time(10, 30),
+            )
+
+        self.assertEqual(insertar_con_reintento(insertar).pk, 'B2')
+        with self.assertRaises(IntegrityError):
+            insertar_con_reintento(insertar)
+        self.assertEqual(BloqueAtencion.objects.count(), 2)
+
+    def test_vistas_usan_codigos_ordenados(self):
+        dia = date.today() + timedelta(days=3)
+        url = reverse('gestionCitas:agregar_disponibilidad', args=[dia.isoformat(), self.vet.pk])
+        self.client.post(url, {'veterinario': self.vet.pk, 'hora_inicio': '09:00', 'hora_fin': '09:30'})
+        self.client.post(url, {'veterinario': self.vet.pk, 'hora_inicio': '10:00', 'hora_fin': '10:30'})
+        primero, segundo = BloqueAtencion.objects.order_by('hora_inicio').values_list('pk', flat=True)
+        self.assertLess(primero, segundo)
+
+        reservar_bloque(primero, self.mascota)
+        codigo_cita = BloqueAtencion.objects.get(pk=primero).codigo_cita
+        self.assertGreater(codigo_cita, segundo)
+
+
+class SembradoTests(TestCase):
+
+    def test_sembrar_datos_realistas(self):
+        self.assertEqual(rut_con_dv(12345678), '123456785')
+        creados = sembrar(veterinarios=2, clientes=20, mascotas_por_cliente=1.5, dias=14)
+
+        self.assertEqual(Veterinario.objects.count(), 2)
+        self.assertEqual(Cliente.objects.count(), 20)
+        self.assertEqual(Mascota.objects.count(), creados['mascotas'])
+        self.assertEqual(BloqueAtencion.objects.count(), creados['bloques'])
+        hoy = date.today()
+        self.assertFalse(BloqueAtencion.objects.filter(fecha__lt=hoy, estado='RESERVADO').exists())
+        self.assertFalse(BloqueAtencion.objects.filter(estado='DISPONIBLE', mascota__isnull=False).exists())
+        self.assertTrue(BloqueAtencion.objects.filter(fecha__gte=hoy, estado='RESERVADO').exists())
+        # El índice de búsqueda se reconstruye aunque bulk_create no dispare señales
+        cliente = Cliente.objects.first()
+        self.assertEqual(autocompletar(cliente.rut_cli)[0]['nombre'], cliente.nombre)
+
+
+class ImportarClientesTests(BaseCitasTestCase):
+
+    def test_importa_csv_con_upsert_y_rechazos(self):
+        directorio = tempfile.mkdtemp()
+        ruta = os.path.join(directorio, 'clientes.csv')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(
+                "rut,nombre,telefono,email,direccion,chip,mascota,especie,raza,edad,peso\n"
+                "12.345.678-5,Pedro Pérez,+56911111111,pedro@example.com,,CHIP1,Firulais,Perro,,4,\"12,5\"\n"
+                "11.111.111-1,Marta Soto,,,,CHIP9,Luna,Gato,,,\n"
+                "11.111.111-1,Marta Soto,,,,CHIP10,Sol,Gato,,,\n"
+                "12345678-9,RUT malo,,,,,,,,,\n"
+                "11.111.111-1,Marta Soto,,,,CHIP1,Robado,Perro,,,\n"
+                "22222222-2,,,,,,,,,,\n"
+                "11.111.111-1,Marta Soto,,,,CHIP11,Nube,Gato,,,nan\n"
+                "11.111.111-1,Marta Soto,,,,CHIP12,Rayo,Gato,,,inf\n"
+            )
+        out = StringIO()
+        call_command('importar_clientes', ruta, '--lote', '2', stdout=out)
+        self.assertIn('5 rechazadas', out.getvalue())
+
+        self.assertEqual(Cliente.objects.get(pk='123456785').nombre, 'Pedro Pérez')  # actualizado
+        self.assertEqual(str(Mascota.objects.get(pk='CHIP1').peso), '12.50')
+        self.assertEqual(Mascota.objects.get(pk='CHIP1').dueño_id, '123456785')
+        self.assertEqual(
+            sorted(Mascota.objects.filter(dueño_id='111111111').values_list('pk', flat=True)),
+            ['CHIP10', 'CHIP9'],
+        )
+        self.assertEqual(autocompletar('marta')[0]['rut'], '111111111')
+
+        with open(os.path.join(directorio, 'clientes.errores.jsonl'), encoding='utf-8') as errores:
+            rechazos = [json.loads(linea) for linea in errores]
+        self.assertEqual([r['linea'] for r in rechazos], [5, 6, 7, 8, 9])
+        self.assertIn('dígito verificador', rechazos[0]['error'])
+        self.assertIn('otro cliente', rechazos[1]['error'])
+        self.assertFalse(Mascota.objects.filter(pk__in=['CHIP11', 'CHIP12']).exists())
+
+
+class ExportarAgendaTests(BaseCitasTestCase):
+
+    def test_exporta_csv_en_streaming(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('B2', self.vet2, date(2030, 1, 8), 10)
+        self.crear_bloque('FUERA', self.vet, date(2030, 2, 1), 9)
+
+        url = reverse('gestionCitas:exportar_agenda')
+        with self.assertNumQueries(4):  # sesión, usuario, roles y una sola consulta con los JOIN
+            response = self.client.get(url, {'desde': '2030-01-01', 'hasta': '2030-01-31'})
+            self.assertTrue(response.streaming)
+            contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        lineas = contenido.splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(lineas[0].startswith('codigo_atencion,'))
+        self.assertIn('B1,', lineas[1])
+        self.assertIn('Firulais', lineas[1])
+        self.assertIn('123456785,Pedro', lineas[1])
+        self.assertTrue(lineas[2].startswith('B2,'))
+
+        response = self.client.get(url, {'desde': '2030-01-01', 'hasta': '2030-01-31', 'estado': 'DISPONIBLE'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+        out = StringIO()
+        call_command('exportar_agenda', '--desde', '2030-01-01', '--hasta', '2030-12-31',
+                     '--veterinario', self.vet.pk, stdout=out)
+        self.assertEqual([l.split(',')[0] for l in out.getvalue().splitlines()],
+                         ['codigo_atencion', 'B1', 'FUERA'])
+
+    def test_filtro_por_estado_efectivo(self):
+        hoy = date.today()
+        self.crear_bloque('PASADA', self.vet, hoy - timedelta(days=2), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('HECHA', self.vet, hoy - timedelta(days=1), 9, estado='COMPLETADA', mascota=self.mascota)
+        self.crear_bloque('FUTURA', self.vet, hoy + timedelta(days=1), 9, estado='RESERVADO', mascota=self.mascota)
+        desde, hasta = hoy - timedelta(days=5), hoy + timedelta(days=5)
+
+        completadas = list(filas_agenda(desde, hasta, estado='COMPLETADA'))
+        self.assertEqual([(f[0], f[5]) for f in completadas], [('PASADA', 'COMPLETADA'), ('HECHA', 'COMPLETADA')])
+        self.assertEqual([f[0] for f in filas_agenda(desde, hasta, estado='RESERVADO')], ['FUTURA'])
+
+
+class FeedIcsTests(BaseCitasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.logout()  # el feed se autentica solo con el token
+        self.token = asignar_token(self.vet)
+        self.url = reverse('gestionCitas:feed_ics', args=[self.token])
+        manana = date.today() + timedelta(days=1)
+        self.cita = self.crear_bloque('C1', self.vet, manana, 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('LIBRE', self.vet, manana, 10)
+        self.crear_bloque('OTRO', self.vet2, manana, 9, estado='RESERVADO', mascota=self.mascota)
+
+    def test_token_invalido(self):
+        self.assertEqual(self.client.get(reverse('gestionCitas:feed_ics', args=['nada'])).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'since': 'ayer'}).status_code, 400)
+        for fuera_de_rango in ('1e20', 'inf', '-1e20', 'nan'):
+            self.assertEqual(self.client.get(self.url, {'since': fuera_de_rango}).status_code, 400)
+
+    def test_feed_y_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertTrue(contenido.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 1)
+        self.assertIn('UID:C1@pochita', contenido)
+        self.assertIn('SUMMARY:Firulais (Perro)', contenido)
+
+        with self.assertNumQueries(3):  # veterinario y los dos agregados del ETag
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_sigue_los_datos_del_veterinario(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # Una reserva con otro veterinario no cambia este feed
+        self.crear_bloque('AJENO', self.vet2, date.today() + timedelta(days=2), 9,
+                          estado='RESERVADO', mascota=self.mascota)
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+        # El teléfono del dueño sale en el feed
+        self.cliente.telefono = '+56922222222'
+        self.cliente.save()
+        nuevo = self.client.get(self.url)['ETag']
+        self.assertNotEqual(nuevo, etag)
+
+        # También por el importador, que escribe con bulk_create
+        importador = Importador()
+        importador.importar([(2, {'rut': self.cliente.pk, 'nombre': 'Pedro', 'telefono': '+56933333333'})])
+        self.assertNotEqual(self.client.get(self.url)['ETag'], nuevo)
+
+    def test_since_trae_cancelaciones(self):
+        since = timezone.now()
+        self.cita.estado = 'CANCELADO_VET'
+        self.cita.save()
+        response = self.client.get(self.url, {'since': since.isoformat()})
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 1)
+        self.assertIn('STATUS:CANCELLED', contenido)
+
+        response = self.client.get(self.url, {'since': str(int(timezone.now().timestamp()) + 60)})
+        self.assertNotIn('BEGIN:VEVENT', b''.join(response.streaming_content).decode())
+
+    def test_comando_regenera_token(self):
+        out = StringIO()
+        call_command('token_calendario', self.vet.pk, '--regenerar', stdout=out)
+        self.assertNotIn(self.token, out.getvalue())
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(out.getvalue().strip()).status_code, 200)
+
+
+class ArchivoBloquesTests(BaseCitasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        hoy = date.today()
+        self.viejo = hoy - timedelta(days=800)
+        self.crear_bloque('VIEJO1', self.vet, self.viejo, 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('VIEJO2', self.vet2, self.viejo, 10)
+        self.crear_bloque('VIGENTE', self.vet, hoy - timedelta(days=10), 9, estado='COMPLETADA', mascota=self.mascota)
+
+    def test_archiva_por_lotes(self):
+        out = StringIO()
+        call_command('archivar_bloques', '--lote', '1', stdout=out)
+        self.assertIn('Bloques archivados: 2', out.getvalue())
+        self.assertEqual(list(BloqueAtencion.objects.values_list('pk', flat=True)), ['VIGENTE'])
+        archivado = BloqueArchivado.objects.get(pk='VIEJO1')
+        self.assertEqual(archivado.estado, 'COMPLETADA')  # se guarda el estado efectivo
+        self.assertEqual(archivado.mascota_id, 'CHIP1')
+
+        call_command('archivar_bloques', stdout=out)
+        self.assertEqual(BloqueArchivado.objects.count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('archivar_bloques', '--dias', '30', stdout=out)
+
+    def test_lote_mas_grande_que_el_limite_de_parametros(self):
+        limite = connection.features.max_query_params
+        BloqueAtencion.objects.bulk_create(
+            BloqueAtencion(codigo_atencion=f'M{i:08d}', veterinario=self.vet, fecha=self.viejo - timedelta(days=1 + i),
+                           hora_inicio=time(9, 0), hora_fin=time(9, 30))
+            for i in range(limite)
+        )
+        self.assertEqual(archivar(tamano_lote=limite + 2), limite + 2)
+        self.assertEqual(list(BloqueAtencion.objects.values_list('pk', flat=True)), ['VIGENTE'])
+
+    def test_lecturas_unen_archivo(self):
+        archivar()
+        historial = self.client.get(reverse('gestionCitas:historial_mascota'), {'chip': 'CHIP1'}).json()
+        self.assertEqual([c['codigo_atencion'] for c in historial['citas']], ['VIGENTE', 'VIEJO1'])
+        self.assertEqual(historial['citas'][1]['veterinario'], 'Dra. Ana')
+
+        filas = list(filas_agenda(self.viejo, date.today()))
+        self.assertEqual([f[0] for f in filas], ['VIEJO1', 'VIEJO2', 'VIGENTE'])
+        # Un rango dentro de la tabla activa no consulta el archivo
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(len(list(filas_agenda(date.today() - timedelta(days=30), date.today()))), 1)
+        self.assertNotIn('bloquearchivado', consultas.captured_queries[0]['sql'])
+
+
+class OcupacionDiariaTests(BaseCitasTestCase):
+
+    def resumen(self):
+        return {
+            (o.veterinario_id, o.fecha): (o.disponibles, o.reservados, o.completadas, o.cancelados_vet)
+            for o in OcupacionDiaria.objects.all()
+        }
+
+    def test_escrituras_mantienen_resumen(self):
+        dia, otro = date(2030, 1, 7), date(2030, 1, 8)
+        b1 = self.crear_bloque('B1', self.vet, dia, 9)
+        self.crear_bloque('B2', self.vet, dia, 10)
+        self.crear_bloque('B3', self.vet2, otro, 9)
+        self.assertEqual(self.resumen()[(self.vet.pk, dia)], (2, 0, 0, 0))
+
+        reservar_bloque('B1', self.mascota)  # update() condicionado
+        self.assertEqual(self.resumen()[(self.vet.pk, dia)], (1, 1, 0, 0))
+        b1.refresh_from_db()
+        reprogramar_bloque(b1, 'B3')
+        self.assertEqual(self.resumen()[(self.vet.pk, dia)], (1, 0, 0, 1))
+        self.assertEqual(self.resumen()[(self.vet2.pk, otro)], (0, 1, 0, 0))
+
+        actualizar_citas_completadas(hoy=date(2030, 2, 1))
+        self.assertEqual(self.resumen()[(self.vet2.pk, otro)], (0, 0, 1, 0))
+
+        # save() que mueve el bloque a otro día recalcula ambos días
+        b2 = BloqueAtencion.objects.get(pk='B2')
+        b2.fecha = otro
+        b2.save()
+        self.assertEqual(self.resumen()[(self.vet.pk, dia)], (0, 0, 0, 1))
+        BloqueAtencion.objects.get(pk='B1').delete()
+        self.assertNotIn((self.vet.pk, dia), self.resumen())
+
+        crear_bloques_recurrentes([self.vet.pk], dia, dia, [dia.weekday()], time(14, 0), time(16, 0), 30)
+        self.assertEqual(self.resumen()[(self.vet.pk, dia)], (4, 0, 0, 0))
+
+        antes = self.resumen()
+        OcupacionDiaria.objects.update(disponibles=99)  # resumen corrupto
+        call_command('reconstruir_ocupacion', stdout=StringIO())
+        self.assertEqual(self.resumen(), antes)
+
+    def test_api_ocupacion(self):
+        self.crear_bloque('B1', self.vet, date(2030, 1, 7), 9, estado='RESERVADO', mascota=self.mascota)
+        self.crear_bloque('B2', self.vet2, date(2030, 2, 1), 9)
+        url = reverse('gestionCitas:api_ocupacion')
+        with self.assertNumQueries(4):  # sesión, usuario, roles y el resumen
+            dias = self.client.get(url, {'year': 2030, 'month': 1}).json()['dias']
+        self.assertEqual(dias, [{
+            'veterinario': self.vet.pk, 'fecha': '2030-01-07', 'disponibles': 0, 'reservados': 1,
+            'completadas': 0, 'cancelados_vet': 0, 'cancelados_pac': 0,
+        }])
+        self.assertEqual(self.client.get(url, {'desde': '2030-02-01', 'hasta': '2030-01-01'}).status_code, 400)
+
+    def test_reservas_pasadas_cuentan_como_completadas(self):
+        ayer = date.today() - timedelta(days=1)
+        self.crear_bloque('P1', self.vet, ayer, 9, estado='RESERVADO', mascota=self.mascota)
+        # Guardado sigue RESERVADO (el worker no corrió); leído, es una cita completada
+        self.assertEqual(self.resumen()[(self.vet.pk, ayer)], (0, 1, 0, 0))
+        dia = self.client.get(reverse('gestionCitas:api_ocupacion'),
+                              {'desde': ayer.isoformat()}).json()['dias'][0]
+        self.assertEqual((dia['reservados'], dia['completadas']), (0, 1))
+        self.assertEqual(reporte(ayer, ayer)['total']['completadas'], 1)
+
+
+class ReporteTests(BaseCitasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        hoy = date.today()
+        self.lunes = hoy - timedelta(days=hoy.weekday() + 14)
+        self.crear_bloque('R1', self.vet, self.lunes, 9, estado='COMPLETADA', mascota=self.mascota)
+        self.crear_bloque('R2', self.vet, self.lunes, 10)
+        self.crear_bloque('R3', self.vet, self.lunes, 11, estado='CANCELADO_VET')
+        # Cancelada por el paciente después del día de la cita: tardía
+        self.crear_bloque('R4', self.vet2, self.lunes + timedelta(days=1), 9,
+                          estado='CANCELADO_PAC', mascota=self.mascota)
+
+    def test_metricas_y_cache(self):
+        datos = reporte(self.lunes, self.lunes + timedelta(days=6))
+        total = datos['total']
+        self.assertEqual((total['bloques'], total['ocupados'], total['cancelaciones_tardias']), (4, 1, 1))
+        self.assertEqual(total['ocupacion'], round(1 / 3, 4))  # R3 no se ofreció
+        self.assertEqual(total['tasa_cancelado_pac'], 0.5)
+        self.assertEqual([p['inicio'] for p in datos['periodos']], [self.lunes])
+        self.assertEqual([v['rut'] for v in datos['veterinarios']], [self.vet.pk, self.vet2.pk])
+        self.assertEqual(datos['veterinarios'][0]['carga'], [1])
+        self.assertEqual(datos['reincidentes'], [{'chip': 'CHIP1', 'nombre': 'Firulais', 'cancelaciones_tardias': 1}])
+
+        with self.assertNumQueries(1):  # solo las versiones de los meses
+            reporte(self.lunes, self.lunes + timedelta(days=6))
+        # Un cambio en el mes invalida el reporte
+        reservar_bloque('R2', self.mascota)
+        self.assertEqual(reporte(self.lunes, self.lunes + timedelta(days=6))['total']['ocupados'], 2)
+
+    def test_tardia_segun_cuando_se_cancelo(self):
+        semana = (self.lunes, self.lunes + timedelta(days=6))
+        temprana = self.crear_bloque('R5', self.vet2, self.lunes + timedelta(days=2), 9,
+                                     estado='CANCELADO_PAC', mascota=self.mascota)
+        BloqueAtencion.objects.filter(pk='R5').update(
+            cancelado_en=timezone.make_aware(datetime.combine(self.lunes, time(8, 0))))
+        temprana.refresh_from_db()
+        # Editarla después no la vuelve tardía
+        temprana.motivo_consulta = 'Nota'
+        temprana.save()
+        self.assertEqual(calcular(*semana)['total']['cancelaciones_tardias'], 1)
+
+        BloqueAtencion.objects.filter(pk='R2').update(estado='CANCELADO_PAC', mascota=self.mascota)
+        self.assertEqual(calcular(*semana)['total']['cancelaciones_tardias'], 2)
+        BloqueAtencion.objects.filter(pk='R2').update(estado='RESERVADO')
+        self.assertIsNone(BloqueAtencion.objects.get(pk='R2').cancelado_en)
+
+    def test_cambio_de_otro_proceso_invalida(self):
+        semana = (self.lunes, self.lunes + timedelta(days=6))
+        self.assertEqual(reporte(*semana)['total']['ocupados'], 1)
+        # Otro proceso reserva y sube la versión del mes sin tocar este cache
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE gestionCitas_ocupaciondiaria SET reservados = reservados + 1, "
+                           "disponibles = disponibles - 1 WHERE disponibles > 0")
+            cursor.execute("UPDATE gestionCitas_versiondatos SET version = 'OTRO' WHERE clave LIKE 'reportes:%'")
+        self.assertEqual(reporte(*semana)['total']['ocupados'], 2)
+
+    def test_vista_solo_staff(self):
+        url = reverse('gestionCitas:reporte_gestion')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url, {'desde': self.lunes, 'hasta': self.lunes + timedelta(days=30),
+                                         'agrupacion': 'mes'})
+        self.assertContains(response, 'Dra. Ana')
+        self.assertContains(response, 'Firulais (CHIP1): 1')
+
+
+class FilasLivianasTests(BaseCitasTestCase):
+
+    def medir(self, armar, repeticiones=3):
+        """(memoria pico en bytes, mejor tiempo de CPU en segundos) de armar()."""
+        picos, tiempos = [], []
+        for _ in range(repeticiones):
+            tracemalloc.start()
+            inicio = time_module.process_time()
+            armar()
+            tiempos.append(time_module.process_time() - inicio)
+            picos.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return min(picos), min(tiempos)
+
+    def test_grilla_con_filas_usa_menos_memoria_y_cpu(self):
+        cliente = Cliente.objects.create(rut_cli='111111111', nombre='Marta', direccion='x' * 2000)
+        mascota = Mascota.objects.create(codigo_chip='CHIP2', nombre='Luna', especie='Gato', dueño=cliente)
+        BloqueAtencion.objects.bulk_create(
+            BloqueAtencion(
+                codigo_atencion=f'M{vet.pk[:1]}{dia:02d}{slot:02d}', veterinario=vet, fecha=date(2030, 3, dia),
+                hora_inicio=time(8 + slot // 2, 30 * (slot % 2)), hora_fin=time(8 + slot // 2, 30 * (slot % 2) + 29),
+                estado='RESERVADO' if slot % 2 else 'DISPONIBLE', mascota=mascota if slot % 2 else None,
+            )
+            for vet in (self.vet, self.vet2) for dia in range(1, 31) for slot in range(20)
+        )
+        qs = bloques_del_mes(2030, 3)
+
+        def con_modelos():
+            # Camino anterior: instancias con veterinario, mascota y dueño unidos
+            bloques = list(qs.select_related('veterinario', 'mascota__dueño'))
+            for b in bloques:
+                (b.veterinario.nombre, str(b.mascota) if b.mascota else '',
+                 reverse('gestionCitas:agendar_cita', args=[b.pk]))
+            return bloques
+
+        def con_filas():
+            return [(f.veterinario_nombre, f.mascota, f.url_agendar) for f in filas_bloques(qs, con_dueno=True)]
+
+        self.assertEqual(len(con_filas()), 1200)
+        memoria_modelos, cpu_modelos = self.medir(con_modelos)
+        memoria_filas, cpu_filas = self.medir(con_filas)
+        self.assertLess(memoria_filas, memoria_modelos / 2, (memoria_filas, memoria_modelos))
+        self.assertLess(cpu_filas, cpu_modelos, (cpu_filas, cpu_modelos))
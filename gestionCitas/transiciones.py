@@ -0,0 +1,58 @@
+# gestionCitas/transiciones.py
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BloqueAtencion, MarcaProceso
+
+MARCA_COMPLETADAS = 'citas_completadas'
+
+
+def filtro_por_completar(hoy):
+    """Q de las reservas que el worker pasa a COMPLETADA: todas las de días anteriores a `hoy`."""
+    return Q(estado='RESERVADO', fecha__lt=hoy)
+
+
+def actualizar_citas_completadas(hoy=None):
+    """
+    Pasa a COMPLETADA las citas RESERVADAS cuya fecha ya pasó.
+
+    La marca en MarcaProceso solo evita repetir la corrida el mismo día. No
+    se usa como límite inferior: una reserva anterior a la marca (importada o
+    reprogramada hacia atrás) también debe pasar a COMPLETADA, y el índice
+    parcial sobre las RESERVADAS hace que recorrerlas todas sea barato.
+    Retorna la cantidad de bloques actualizados.
+    """
+    hoy = hoy or date.today()
+
+    with transaction.atomic():
+        marca = MarcaProceso.objects.select_for_update().filter(nombre=MARCA_COMPLETADAS).first()
+        if marca and marca.fecha >= hoy:
+            return 0
+
+        pendientes = BloqueAtencion.objects.filter(filtro_por_completar(hoy))
+        actualizados = pendientes.update(estado='COMPLETADA', actualizado=timezone.now())
+
+        MarcaProceso.objects.update_or_create(
+            nombre=MARCA_COMPLETADAS, defaults={'fecha': hoy}
+        )
+    return actualizados
+
+
+def estado_efectivo(estado, fecha, hoy=None):
+    """Estado a mostrar: una reserva de un día ya pasado se ve como COMPLETADA."""
+    if estado == 'RESERVADO' and fecha < (hoy or date.today()):
+        return 'COMPLETADA'
+    return estado
+
+
+def filtro_estado_efectivo(estado, hoy=None):
+    """Q de los bloques cuyo estado efectivo (ver estado_efectivo) es `estado`."""
+    hoy = hoy or date.today()
+    if estado == 'COMPLETADA':
+        return Q(estado='COMPLETADA') | filtro_por_completar(hoy)
+    if estado == 'RESERVADO':
+        return Q(estado='RESERVADO', fecha__gte=hoy)
+    return Q(estado=estado)
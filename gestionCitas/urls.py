@@ -9,12 +9,29 @@ urlpatterns = [
     path('dia/', views.agenda_dia, name='agenda_dia'),
     path('agendar/<str:bloque_id>/', views.agendar_cita, name='agendar_cita'),
     path('cancelar-bloques/<str:bloque_id>/', views.cancelar_bloques_veterinario, name='cancelar_bloques_veterinario'),
+    path('ausencia-veterinario/', views.ausencia_veterinario, name='ausencia_veterinario'),
     path('reprogramar/<str:bloque_id>/', views.reprogramar_cita, name='reprogramar_cita'),
     path('reprogramar/', views.reprogramar_cita_page, name='reprogramar_cita_page'),
     path('agregar-disponibilidad/<str:fecha>/<str:veterinario_id>/', views.agregar_disponibilidad, name='agregar_disponibilidad'),
+    path('generar-disponibilidad/', views.generar_disponibilidad, name='generar_disponibilidad'),
+    path('exportar-agenda/', views.exportar_agenda, name='exportar_agenda'),
+    path('reporte/', views.reporte_gestion, name='reporte_gestion'),
     
+    # Feed iCalendar por veterinario (autenticado por token)
+    path('feed/<str:token>.ics', views.feed_ics, name='feed_ics'),
+
     # AJAX endpoints
     path('api/buscar-cliente/', views.buscar_cliente, name='buscar_cliente'),
     path('api/buscar-mascotas/', views.buscar_mascotas_cliente, name='buscar_mascotas_cliente'),
     path('api/buscar-mascota/', views.buscar_mascota, name='buscar_mascota'),
+    path('api/autocompletar/', views.autocompletar, name='autocompletar'),
+    path('api/ficha-cliente/', views.ficha_cliente, name='ficha_cliente'),
+    path('api/historial-mascota/', views.historial_mascota, name='historial_mascota'),
+    path('api/ocupacion/', views.api_ocupacion, name='api_ocupacion'),
+    path('api/bloques-libres/', views.api_bloques_libres, name='api_bloques_libres'),
+
+    # API JSON de calendario / agenda
+    path('api/bloques/mes/', views.api_bloques, {'periodo': 'mes'}, name='api_bloques_mes'),
+    path('api/bloques/semana/', views.api_bloques, {'periodo': 'semana'}, name='api_bloques_semana'),
+    path('api/bloques/dia/', views.api_bloques, {'periodo': 'dia'}, name='api_bloques_dia'),
 ]
@@ -1,14 +1,41 @@
 import re
 from django.core.exceptions import ValidationError
 
-def validar_rut(value):
-    # Eliminar cualquier guion, espacio si está presente
-    value = value.replace('-', '').replace(' ', '').replace('.', '').upper().strip()
+# Cuerpo de 7 u 8 dígitos + dígito verificador. Se compila una sola vez.
+PATRON_RUT = re.compile(r"^(\d{7,8})([0-9K])$")
+_SEPARADORES_RUT = str.maketrans('', '', '.- ')
+
+
+def normalizar_rut(value):
+    """Sin puntos, guion ni espacios y con K mayúscula: '12.345.678-k' -> '12345678K'."""
+    return (value or '').translate(_SEPARADORES_RUT).upper().strip()
+
 
-    patron = re.compile(r"^(\d{7,8})([0-9K])$")
+def digito_verificador(cuerpo):
+    """Dígito verificador (módulo 11) del cuerpo de un RUT: '12345678' -> '5'."""
+    suma, factor = 0, 2
+    for digito in reversed(str(cuerpo)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    return '0' if dv == 11 else 'K' if dv == 10 else str(dv)
 
-    if not patron.match(value):
-        raise ValidationError("El formato del RUT no es válido. Ingresa sin guiones (ej: 123456789 o 12345678K)")
+
+def error_rut(value):
+    """Mensaje de error del RUT (ya normalizado), o None si es válido. No lanza excepciones."""
+    coincidencia = PATRON_RUT.match(value)
+    if not coincidencia:
+        return "El formato del RUT no es válido. Ingresa sin guiones (ej: 123456789 o 12345678K)"
+    cuerpo, dv = coincidencia.groups()
+    if digito_verificador(cuerpo) != dv:
+        return "El dígito verificador del RUT no es válido."
+    return None
+
+
+def validar_rut(value):
+    error = error_rut(normalizar_rut(value))
+    if error:
+        raise ValidationError(error)
 
 
 def validar_numeros(value):
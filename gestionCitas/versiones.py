@@ -0,0 +1,75 @@
+# gestionCitas/versiones.py
+from django.db import router
+
+from main.routers import PRIMARIA
+
+from .codigos import nuevo_codigo
+from .models import VersionDatos
+
+# Las versiones se guardan en VersionDatos: el cache por defecto es de cada
+# proceso, y una versión que solo sube en el cache del comando o del worker
+# que escribió no invalida lo que tienen cacheado los demás. Cada versión
+# nueva es un código de gestionCitas.codigos (único y creciente), así que
+# subirla es un solo upsert y nunca vuelve a un valor ya usado, ni siquiera
+# si la transacción que la cambió se deshace.
+
+CLAVE_CALENDARIO = 'calendario'
+
+
+def _leer(claves):
+    # Siempre de la principal: una réplica atrasada daría una versión vieja.
+    # Sin pasar por router.db_for_write, que marcaría la request como escritura
+    return dict(
+        VersionDatos.objects.using(PRIMARIA).filter(clave__in=claves).values_list('clave', 'version')
+    )
+
+
+def _subir(claves, using=None):
+    version = nuevo_codigo()
+    VersionDatos.objects.using(using or router.db_for_write(VersionDatos)).bulk_create(
+        [VersionDatos(clave=clave, version=version) for clave in claves],
+        update_conflicts=True, unique_fields=['clave'], update_fields=['version'],
+    )
+
+
+def version_datos():
+    """Versión actual de los datos que muestra el calendario ('' si nunca cambiaron)."""
+    return _leer([CLAVE_CALENDARIO]).get(CLAVE_CALENDARIO, '')
+
+
+def invalidar_calendario(using=None):
+    """
+    Invalida todas las grillas cacheadas, en todos los procesos. Si hay una
+    transacción abierta el cambio de versión es parte de ella: se ve recién
+    con el commit, junto con los datos.
+    """
+    _subir([CLAVE_CALENDARIO], using)
+
+
+# ===== Versiones por mes (reportes) =====
+# Los reportes se cachean por rango; cada mes tiene su propia versión para
+# que un cambio solo invalide los reportes que incluyen ese mes.
+
+def _clave_mes(anio, mes):
+    return f'reportes:{anio:04d}-{mes:02d}'
+
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def versiones_meses(desde, hasta):
+    """Versiones de los meses del rango, en orden ('' si un mes nunca cambió)."""
+    claves = [_clave_mes(anio, mes) for anio, mes in _meses(desde, hasta)]
+    versiones = _leer(claves)
+    return tuple(versiones.get(clave, '') for clave in claves)
+
+
+def invalidar_meses(fechas, using=None):
+    """Invalida los reportes de los meses de `fechas`, igual que invalidar_calendario."""
+    claves = {_clave_mes(fecha.year, fecha.month) for fecha in fechas}
+    if claves:
+        _subir(sorted(claves), using)
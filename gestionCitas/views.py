@@ -1,35 +1,48 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from datetime import date, datetime
-from calendar import monthrange
-import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from main.decorators import roles_requeridos
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.template.backends.utils import csrf_input
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition, require_GET
 from .models import BloqueAtencion, Veterinario, Cliente, Mascota   
-from .forms import CancelarBloquesForm, ReprogramarCitaForm, ClienteForm, MascotaForm  
+from .forms import (
+    CancelarBloquesForm, ReprogramarCitaForm, ClienteForm, MascotaForm, DisponibilidadRecurrenteForm,
+    ExportarAgendaForm, ReporteForm,
+)
+from .calendario import (
+    CAMPOS_API, MARCADOR_CSRF, bloques_periodo, filas_api, grilla_mes_html, rango_periodo, sello_bloques,
+)
+from .filas import filas_bloques
+from .codigos import insertar_con_reintento, nuevo_codigo
+from .disponibilidad import crear_bloques_recurrentes
+from .ausencias import cancelar_ausencia
+from .exportacion import filas_agenda, lineas_csv
+from .ocupacion import ocupacion_periodo
+from .reportes import reporte as reporte_ocupacion
+from .ics import feed as feed_veterinario, sello_feed, ventana as ventana_feed
+from .busqueda import (
+    LIMITE_POR_DEFECTO, autocompletar as buscar_autocompletar, ficha_cliente as buscar_ficha_cliente,
+    historial_mascota as buscar_historial_mascota,
+)
+from .solapamiento import IndiceIntervalos
+from .reservas import BloqueNoDisponible, reservar_bloque, reprogramar_bloque
+from .validators import normalizar_rut
+from .versiones import version_datos
+from .bloques_libres import LIMITE_POR_DEFECTO as LIMITE_BLOQUES_LIBRES, bloques_libres, etiqueta as etiqueta_bloque
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 
 
-def actualizar_citas_completadas():
-    """
-    Actualiza automáticamente las citas RESERVADAS cuya fecha ya pasó a COMPLETADA.
-    """
-    hoy = date.today()
-    BloqueAtencion.objects.filter(
-        estado='RESERVADO',
-        fecha__lt=hoy
-    ).update(estado='COMPLETADA')
-
-
 # Create your views here.
 # ===== HU002: Calendario mensual y agendar hora =====
 
 @roles_requeridos("Recepcionista")
 def calendario_mes(request):
     """Muestra el mes en curso con los bloques por veterinario."""
-    # Actualizar citas pasadas a COMPLETADA
-    actualizar_citas_completadas()
-    
     hoy = date.today()
     
     # Obtener el año y mes de la URL
@@ -38,38 +51,11 @@ def calendario_mes(request):
 
     # Filtro opcional por veterinario
     veterinario_id = request.GET.get('veterinario')
-    if veterinario_id:
-        bloques_base = BloqueAtencion.objects.filter(veterinario_id=veterinario_id)
-    else:
-        bloques_base = BloqueAtencion.objects.all()
-
-    # Obtener el primer día de la semana y número de días del mes
-    primer_dia_semana, num_dias = monthrange(year, month)
-
-    dias = []
-    for dia in range(1, num_dias + 1):
-        fecha_dia = date(year, month, dia)
-        bloques_dia = bloques_base.filter(fecha=fecha_dia).select_related('veterinario', 'mascota')
-        dias.append({'fecha': fecha_dia, 'bloques': bloques_dia})
 
-    # Armar semanas (para dibujar un calendario tipo tabla)
-    semanas = []
-    semana = []
-
-    # Espacios en blanco antes del primer día
-    for _ in range(primer_dia_semana):
-        semana.append(None)
-
-    for info_dia in dias:
-        semana.append(info_dia)
-        if len(semana) == 7:
-            semanas.append(semana)
-            semana = []
-
-    if semana:
-        while len(semana) < 7:
-            semana.append(None)
-        semanas.append(semana)
+    # Grilla del mes: se sirve del cache si los datos no cambiaron
+    grilla = grilla_mes_html(year, month, veterinario_id).replace(
+        MARCADOR_CSRF, csrf_input(request)
+    )
 
     # Crear una lista de meses
     meses = [
@@ -81,20 +67,17 @@ def calendario_mes(request):
     # Lista de años (por ejemplo, el año actual y el anterior/futuro)
     anios = [year - 1, year, year + 1]
 
-    veterinarios = Veterinario.objects.all()
+    veterinarios = list(Veterinario.objects.all())
     # Nombre legible del mes seleccionado
     month_name = next((nombre for num, nombre in meses if num == month), '')
 
-    # Nombre del veterinario seleccionado (si aplica)
-    veterinario_nombre = None
-    if veterinario_id:
-        try:
-            veterinario_nombre = Veterinario.objects.get(pk=veterinario_id).nombre
-        except Veterinario.DoesNotExist:
-            veterinario_nombre = None
+    # Nombre del veterinario seleccionado (si aplica), sin consulta extra
+    veterinario_nombre = next(
+        (vet.nombre for vet in veterinarios if vet.rut_vet == veterinario_id), None
+    ) if veterinario_id else None
 
     context = {
-        'semanas': semanas,
+        'grilla': mark_safe(grilla),
         'year': year,
         'month': month,
         'veterinarios': veterinarios,
@@ -111,9 +94,6 @@ def calendario_mes(request):
     return render(request, 'gestionCitas/calendario_mes.html', context)
 
 
-def _normalizar_rut(rut: str) -> str:
-    return (rut or '').replace('.', '').replace('-', '').replace(' ', '').upper().strip()
-
 @roles_requeridos("Recepcionista")
 def agendar_cita(request, bloque_id):
     bloque = get_object_or_404(BloqueAtencion, pk=bloque_id)
@@ -129,7 +109,7 @@ def agendar_cita(request, bloque_id):
     if request.method == 'POST':
         post = request.POST.copy()
 
-        rut = _normalizar_rut(post.get('cliente-rut_cli', ''))
+        rut = normalizar_rut(post.get('cliente-rut_cli', ''))
         post['cliente-rut_cli'] = rut
 
         chip = (post.get('mascota-codigo_chip', '') or '').strip()
@@ -142,21 +122,23 @@ def agendar_cita(request, bloque_id):
         mascota_form = MascotaForm(post, prefix='mascota', instance=mascota_instance)
 
         if cliente_form.is_valid() and mascota_form.is_valid():
-            cliente = cliente_form.save()  # crea o actualiza (si venía instance)
-
             # Si el chip existe pero pertenece a otro dueño, lo bloqueamos (recomendado)
-            if mascota_instance and mascota_instance.dueño_id != cliente.rut_cli:
+            if mascota_instance and mascota_instance.dueño_id != cliente_form.cleaned_data['rut_cli']:
                 mascota_form.add_error('codigo_chip', 'Este código de chip ya está asociado a otro cliente.')
             else:
-                mascota = mascota_form.save(commit=False)
-                mascota.dueño = cliente
-                mascota.save()
-
-                bloque.mascota = mascota
-                bloque.motivo_consulta = (post.get('motivo_consulta') or '').strip()[:30]
-                bloque.codigo_cita = uuid.uuid4().hex[:10].upper()
-                bloque.estado = 'RESERVADO'
-                bloque.save()
+                try:
+                    with transaction.atomic():
+                        cliente = cliente_form.save()  # crea o actualiza (si venía instance)
+                        mascota = mascota_form.save(commit=False)
+                        mascota.dueño = cliente
+                        mascota.save()
+
+                        # Reserva condicionada al estado: si otro la tomó antes, se deshace todo
+                        if not reservar_bloque(bloque.pk, mascota, post.get('motivo_consulta')):
+                            raise BloqueNoDisponible
+                except BloqueNoDisponible:
+                    messages.error(request, 'Este bloque acaba de ser reservado por otra persona.')
+                    return redirect('gestionCitas:calendario_mes')
 
                 messages.success(request, 'Cita agendada correctamente.')
                 return redirect('gestionCitas:calendario_mes')
@@ -166,10 +148,15 @@ def agendar_cita(request, bloque_id):
         cliente_form = ClienteForm(prefix='cliente')
         mascota_form = MascotaForm(prefix='mascota')
 
+    # Otros horarios libres cercanos del mismo veterinario
+    alternativas, _ = bloques_libres(desde=bloque.fecha, veterinario_id=bloque.veterinario_id, limite=6)
+    alternativas = [f for f in alternativas if f['codigo_atencion'] != bloque.pk][:5]
+
     return render(request, 'gestionCitas/agendar_cita.html', {
         'bloque': bloque,
         'cliente_form': cliente_form,
         'mascota_form': mascota_form,
+        'alternativas': alternativas,
     })
 
 @roles_requeridos("Recepcionista")
@@ -179,9 +166,6 @@ def agenda_dia(request):
     - Horarios ocupados (bloques con mascota asignada)
     - Horarios libres (bloques sin mascota, disponibles o cancelados)
     """
-    # Actualizar citas pasadas a COMPLETADA
-    actualizar_citas_completadas()
-
     # Fecha seleccionada (GET ?fecha=YYYY-MM-DD), por defecto hoy
     fecha_str = request.GET.get('fecha')
     if fecha_str:
@@ -195,19 +179,19 @@ def agenda_dia(request):
     # Filtro opcional por veterinario
     veterinario_id = request.GET.get('veterinario')
     vet_seleccionado = None
-    bloques_qs = BloqueAtencion.objects.filter(fecha=fecha).select_related(
-        'veterinario', 'mascota', 'mascota__dueño'
-    )
+    bloques_qs = BloqueAtencion.objects.filter(fecha=fecha)
 
     if veterinario_id:
         bloques_qs = bloques_qs.filter(veterinario_id=veterinario_id)
         vet_seleccionado = veterinario_id
 
-    bloques_qs = bloques_qs.order_by('hora_inicio')
+    # Solo las columnas que se muestran; las reservas de días pasados se
+    # muestran como COMPLETADA (sin escribir)
+    bloques = filas_bloques(bloques_qs.order_by('hora_inicio'), con_dueno=True)
 
     # Separar en ocupados y libres
-    bloques_ocupados = [b for b in bloques_qs if b.mascota is not None and b.estado != 'CANCELADO_VET']
-    bloques_libres = [b for b in bloques_qs if b.mascota is None or b.estado == 'CANCELADO_VET']
+    bloques_ocupados = [b for b in bloques if b.chip is not None and b.estado != 'CANCELADO_VET']
+    bloques_libres = [b for b in bloques if b.chip is None or b.estado == 'CANCELADO_VET']
 
     veterinarios = Veterinario.objects.all()
 
@@ -231,7 +215,7 @@ def cancelar_bloques_veterinario(request, bloque_id):
     
     if request.method == 'POST':
         bloque.estado = 'CANCELADO_VET'
-        bloque.save()
+        bloque.save(update_fields=['estado', 'actualizado'])
         
         messages.success(request, f"Bloque #{bloque_id} cancelado correctamente.")
         # Redirigir a la página de origen si se especifica
@@ -247,12 +231,44 @@ def cancelar_bloques_veterinario(request, bloque_id):
     return render(request, 'gestionCitas/cancelar_bloques_veterinario.html', context)
 
 
+@roles_requeridos("Recepcionista")
+def ausencia_veterinario(request):
+    """
+    Cancela todos los bloques de un veterinario en un rango de fechas
+    (vacaciones, licencia) y reubica automáticamente a los pacientes
+    afectados. Muestra el reporte de reubicados y de los que quedaron sin cupo.
+    """
+    reporte = None
+    if request.method == 'POST':
+        form = CancelarBloquesForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            reporte = cancelar_ausencia(datos['veterinario'].pk, datos['fecha_inicio'], datos['fecha_fin'])
+            messages.success(
+                request,
+                f"Bloques cancelados: {reporte['cancelados']}. "
+                f"Pacientes reubicados: {len(reporte['reubicados'])}. "
+                f"Sin cupo: {len(reporte['sin_cupo'])}."
+            )
+    else:
+        form = CancelarBloquesForm()
+
+    context = {
+        'form': form,
+        'reporte': reporte,
+        'citas_afectadas': reporte['sin_cupo'] if reporte else None,
+    }
+    return render(request, 'gestionCitas/cancelar_bloques_veterinario.html', context)
+
+
 @roles_requeridos("Recepcionista")
 def reprogramar_cita(request, bloque_id):
     """
     Reprograma una cita de un bloque (normalmente cancelado) a otro bloque disponible.
     """
-    bloque_original = get_object_or_404(BloqueAtencion, pk=bloque_id)
+    bloque_original = get_object_or_404(
+        BloqueAtencion.objects.select_related('veterinario', 'mascota'), pk=bloque_id
+    )
 
     if bloque_original.mascota is None:
         messages.error(request, 'Este bloque no tiene paciente asignado.')
@@ -260,15 +276,11 @@ def reprogramar_cita(request, bloque_id):
     if request.method == 'POST':
         form = ReprogramarCitaForm(request.POST, veterinario=bloque_original.veterinario)
         if form.is_valid():
-            nuevo_bloque = form.cleaned_data['nuevo_bloque']   # Pasar datos de la cita al nuevo bloque
-            nuevo_bloque.mascota = bloque_original.mascota
-            nuevo_bloque.motivo_consulta = bloque_original.motivo_consulta
-            nuevo_bloque.estado = 'RESERVADO'
-            nuevo_bloque.save()
-
-            # Aseguramos que el original quede como cancelado por el vet
-            bloque_original.estado = 'CANCELADO_VET'
-            bloque_original.save()
+            nuevo_bloque = form.cleaned_data['nuevo_bloque']
+            # Pasar la cita al nuevo bloque y cancelar el original, si ninguno de los dos cambió
+            if not reprogramar_bloque(bloque_original, nuevo_bloque.pk):
+                messages.error(request, 'La cita cambió o el bloque elegido ya no está disponible.')
+                return redirect('gestionCitas:reprogramar_cita', bloque_id=bloque_id)
 
             messages.success(request, 'Cita reprogramada correctamente.')
             return redirect('gestionCitas:calendario_mes')
@@ -345,19 +357,33 @@ def agregar_disponibilidad(request, fecha, veterinario_id='0'):
             messages.error(request, 'La hora de inicio debe ser anterior a la de fin.')
             return redirect('gestionCitas:agregar_disponibilidad', fecha=fecha, veterinario_id=veterinario_id)
         
-        # Generar codigo_atencion único (máx 10 caracteres)
-        codigo_atencion = uuid.uuid4().hex[:10].upper()
-        
-        # Crear el bloque
-        bloque = BloqueAtencion.objects.create(
-            codigo_atencion=codigo_atencion,
-            veterinario=veterinario,
-            fecha=fecha_obj,
-            hora_inicio=hora_inicio,
-            hora_fin=hora_fin,
-            estado='DISPONIBLE'
-        )
-        
+        # Verificar y crear en la misma transacción, con la fila del
+        # veterinario bloqueada: dos altas simultáneas no pueden pasar la
+        # verificación a la vez
+        with transaction.atomic():
+            veterinario = Veterinario.objects.select_for_update().get(pk=veterinario.pk)
+            conflicto = IndiceIntervalos.cargar([veterinario.pk], fecha_obj).verificar(
+                veterinario.pk, fecha_obj, hora_inicio, hora_fin
+            )
+            if not conflicto:
+                # codigo_atencion único y ordenado por tiempo (10 caracteres);
+                # uno nuevo en cada intento
+                insertar_con_reintento(lambda: BloqueAtencion.objects.create(
+                    codigo_atencion=nuevo_codigo(),
+                    veterinario=veterinario,
+                    fecha=fecha_obj,
+                    hora_inicio=hora_inicio,
+                    hora_fin=hora_fin,
+                    estado='DISPONIBLE'
+                ))
+        if conflicto:
+            messages.error(
+                request,
+                f"El bloque se solapa con #{conflicto['conflicto_con']} "
+                f"({conflicto['conflicto_inicio']:%H:%M}-{conflicto['conflicto_fin']:%H:%M})."
+            )
+            return redirect('gestionCitas:agregar_disponibilidad', fecha=fecha, veterinario_id=veterinario_id)
+
         messages.success(request, 'Bloque de disponibilidad agregado correctamente.')
         return redirect('gestionCitas:calendario_mes')
     
@@ -370,6 +396,79 @@ def agregar_disponibilidad(request, fecha, veterinario_id='0'):
     return render(request, 'gestionCitas/agregar_disponibilidad.html', context)
 
 
+@roles_requeridos("Recepcionista")
+def generar_disponibilidad(request):
+    """
+    Genera en lote los bloques de una plantilla semanal (días, horario y
+    duración) para uno o más veterinarios en un rango de fechas.
+    """
+    if request.method == 'POST':
+        form = DisponibilidadRecurrenteForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            resultado = crear_bloques_recurrentes(
+                [vet.pk for vet in datos['veterinarios']],
+                datos['fecha_inicio'], datos['fecha_fin'], datos['dias_semana'],
+                datos['hora_inicio'], datos['hora_fin'], datos['duracion'],
+            )
+            messages.success(
+                request,
+                f"Bloques creados: {resultado['creados']}. "
+                f"Omitidos por solaparse con otros bloques: {resultado['omitidos']}."
+            )
+            return redirect('gestionCitas:calendario_mes')
+    else:
+        form = DisponibilidadRecurrenteForm()
+
+    return render(request, 'gestionCitas/generar_disponibilidad.html', {'form': form})
+
+
+@roles_requeridos("Recepcionista")
+def exportar_agenda(request):
+    """
+    Exporta la agenda de un rango de fechas (opcionalmente de un veterinario
+    o estado) como CSV. Las filas se envían a medida que salen de la base,
+    así que el primer byte llega de inmediato aunque el rango sea de un año.
+    """
+    form = ExportarAgendaForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, 'gestionCitas/exportar_agenda.html', {'form': form})
+
+    datos = form.cleaned_data
+    filas = filas_agenda(
+        datos['desde'], datos['hasta'],
+        veterinario_id=datos['veterinario'].pk if datos['veterinario'] else None,
+        estado=datos['estado'] or None,
+    )
+    response = StreamingHttpResponse(lineas_csv(filas, bom=True), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="agenda_{datos["desde"]:%Y%m%d}_{datos["hasta"]:%Y%m%d}.csv"'
+    )
+    return response
+
+
+@staff_member_required
+@require_GET
+def reporte_gestion(request):
+    """
+    Reporte para gerencia: ocupación, cancelaciones (veterinario, paciente y
+    tardías) y carga por veterinario, por semana o mes. Sin parámetros
+    muestra las últimas 12 semanas.
+    """
+    hoy = date.today()
+    form = ReporteForm(request.GET or {
+        'desde': hoy - timedelta(weeks=12), 'hasta': hoy, 'agrupacion': 'semana',
+    })
+    datos = None
+    if form.is_valid():
+        datos = reporte_ocupacion(
+            form.cleaned_data['desde'], form.cleaned_data['hasta'],
+            veterinario_id=form.cleaned_data['veterinario'].pk if form.cleaned_data['veterinario'] else None,
+            agrupacion=form.cleaned_data['agrupacion'],
+        )
+    return render(request, 'gestionCitas/reporte.html', {'form': form, 'reporte': datos})
+
+
 # ===== AJAX Endpoints =====
 
 @roles_requeridos("Recepcionista")
@@ -414,32 +513,7 @@ def buscar_mascotas_cliente(request):
         return JsonResponse({'mascotas': []})
 
 
-@login_required
-def buscar_mascota(request):
-    """Busca una mascota por código de chip y retorna sus datos."""
-    codigo = request.GET.get('codigo', '').strip()
-    if not codigo:
-        return JsonResponse({'encontrada': False})
-    
-    try:
-        mascota = Mascota.objects.get(codigo_chip=codigo)
-        return JsonResponse({
-            'encontrada': True,
-            'codigo_chip': mascota.codigo_chip,
-            'nombre': mascota.nombre,
-            'especie': mascota.especie,
-            'raza': mascota.raza,
-            'edad': mascota.edad,
-            'peso': str(mascota.peso) if mascota.peso else '',
-            'dueno_rut': mascota.dueño.rut_cli,
-            'dueno_nombre': mascota.dueño.nombre,
-            'dueno_telefono': mascota.dueño.telefono,
-            'dueno_email': mascota.dueño.email,
-            'dueno_direccion': mascota.dueño.direccion,
-        })
-    except Mascota.DoesNotExist:
-        return JsonResponse({'encontrada': False})
-
+@roles_requeridos("Recepcionista")
 def buscar_mascota(request):
     chip = (request.GET.get('chip', '') or '').strip()
     if not chip:
@@ -457,4 +531,239 @@ def buscar_mascota(request):
             'rut_dueno': m.dueño.rut_cli,
         })
     except Mascota.DoesNotExist:
-        return JsonResponse({'encontrado': False})
\ No newline at end of file
+        return JsonResponse({'encontrado': False})
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+def ficha_cliente(request):
+    """
+    Búsqueda combinada para el formulario de agendar: por RUT (?rut=) o por
+    chip (?chip=) retorna el cliente, todas sus mascotas y sus citas próximas
+    y recientes en una sola respuesta.
+    """
+    rut = normalizar_rut(request.GET.get('rut', ''))
+    chip = (request.GET.get('chip', '') or '').strip()
+    if not rut and not chip:
+        return JsonResponse({'encontrado': False})
+
+    ficha = buscar_ficha_cliente(rut=rut or None, chip=chip or None)
+    if ficha is None:
+        return JsonResponse({'encontrado': False})
+    return JsonResponse({'encontrado': True, **ficha})
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+def historial_mascota(request):
+    """
+    Historial completo de citas de una mascota (?chip=), incluidas las ya
+    archivadas. Opcional ?desde=YYYY-MM-DD para acotarlo.
+    """
+    chip = (request.GET.get('chip', '') or '').strip()
+    if not chip:
+        return JsonResponse({'encontrado': False})
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida.'}, status=400)
+    if not Mascota.objects.filter(pk=chip).exists():
+        return JsonResponse({'encontrado': False})
+    return JsonResponse({'encontrado': True, 'citas': buscar_historial_mascota(chip, desde)})
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+def autocompletar(request):
+    """
+    Autocompletado de clientes y mascotas por prefijo de RUT, chip o nombre
+    (?q=texto&limite=10). Usa el índice TerminoBusqueda.
+    """
+    q = request.GET.get('q', '').strip()
+    if len(q) < 2:
+        return JsonResponse({'resultados': []})
+    try:
+        limite = int(request.GET.get('limite', LIMITE_POR_DEFECTO))
+    except ValueError:
+        limite = LIMITE_POR_DEFECTO
+    return JsonResponse({'resultados': buscar_autocompletar(q, limite)})
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+def api_bloques_libres(request):
+    """
+    Próximos bloques libres: ?desde=YYYY-MM-DD&veterinario=&hora_desde=HH:MM
+    &hora_hasta=HH:MM&limite=20&cursor=... Paginado por cursor (keyset).
+    """
+    try:
+        desde = request.GET.get('desde')
+        hora_desde = request.GET.get('hora_desde')
+        hora_hasta = request.GET.get('hora_hasta')
+        filas, siguiente = bloques_libres(
+            desde=datetime.strptime(desde, '%Y-%m-%d').date() if desde else None,
+            veterinario_id=request.GET.get('veterinario') or None,
+            hora_desde=datetime.strptime(hora_desde, '%H:%M').time() if hora_desde else None,
+            hora_hasta=datetime.strptime(hora_hasta, '%H:%M').time() if hora_hasta else None,
+            limite=int(request.GET.get('limite', LIMITE_BLOQUES_LIBRES)),
+            cursor=request.GET.get('cursor') or None,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+
+    return JsonResponse({
+        'bloques': [{
+            'codigo_atencion': f['codigo_atencion'],
+            'fecha': f['fecha'].isoformat(),
+            'hora_inicio': f['hora_inicio'].strftime('%H:%M'),
+            'hora_fin': f['hora_fin'].strftime('%H:%M'),
+            'veterinario': f['veterinario_id'],
+            'veterinario_nombre': f['veterinario__nombre'],
+            'etiqueta': etiqueta_bloque(f),
+        } for f in filas],
+        'siguiente': siguiente,
+    })
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+def api_ocupacion(request):
+    """
+    Ocupación por veterinario y día de un mes (?year=&month=) o rango
+    (?desde=&hasta=, YYYY-MM-DD), opcionalmente de un veterinario
+    (?veterinario=). Lee el resumen OcupacionDiaria, no los bloques.
+    """
+    try:
+        if request.GET.get('desde'):
+            desde = date.fromisoformat(request.GET['desde'])
+            hasta = date.fromisoformat(request.GET.get('hasta') or request.GET['desde'])
+        else:
+            desde, hasta = rango_periodo('mes', request.GET)
+        if hasta < desde or (hasta - desde).days > 366:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+
+    resumen = ocupacion_periodo(desde, hasta, request.GET.get('veterinario') or None)
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': [{
+            'veterinario': vet,
+            'fecha': fecha.isoformat(),
+            **conteos,
+        } for (vet, fecha), conteos in sorted(resumen.items(), key=lambda item: (item[0][1], item[0][0]))],
+    })
+
+
+# ===== API JSON (solo lectura, con GET condicional) =====
+
+def _bloques_api(request, periodo):
+    """Queryset y sello del periodo pedido, calculados una sola vez por request."""
+    if not hasattr(request, '_bloques_api'):
+        desde, hasta = rango_periodo(periodo, request.GET)
+        qs = bloques_periodo(desde, hasta, request.GET.get('veterinario'))
+        request._bloques_api = (desde, hasta, qs, sello_bloques(qs))
+    return request._bloques_api
+
+
+def _etag_api(request, periodo):
+    try:
+        desde, hasta, _, (ultimo, total) = _bloques_api(request, periodo)
+    except ValueError:
+        return None
+    marca = ultimo.timestamp() if ultimo else 0
+    # El sello de los bloques no ve los cambios en datos unidos (nombre de la
+    # mascota) ni un borrado seguido de un alta; la versión de datos sí
+    return (
+        f"{periodo}-{desde}-{hasta}-{request.GET.get('veterinario', '')}-{total}-{marca}-"
+        f"{version_datos()}-{date.today()}"
+    )
+
+
+@roles_requeridos("Recepcionista")
+@require_GET
+@condition(etag_func=_etag_api)
+def api_bloques(request, periodo):
+    """
+    Bloques de un mes (?year=&month=), semana o día (?fecha=YYYY-MM-DD),
+    opcionalmente de un veterinario (?veterinario=). Responde 304 sin
+    serializar si el cliente ya tiene la versión actual (ETag). No se manda
+    Last-Modified: un borrado no mueve la última modificación.
+    """
+    try:
+        desde, hasta, qs, _ = _bloques_api(request, periodo)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos.'}, status=400)
+
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'campos': CAMPOS_API,
+        'bloques': filas_api(qs),
+    })
+
+
+# ===== Feed iCalendar por veterinario =====
+
+def _parsear_since(valor):
+    """
+    `since` como segundos epoch o fecha-hora ISO 8601 (sin zona = UTC).
+    Cualquier valor inválido, también un epoch fuera de rango ('1e20',
+    'inf'), lanza ValueError.
+    """
+    try:
+        segundos = float(valor)
+    except ValueError:
+        momento = datetime.fromisoformat(valor)
+        return momento if timezone.is_aware(momento) else timezone.make_aware(momento, dt_timezone.utc)
+    try:
+        return datetime.fromtimestamp(segundos, tz=dt_timezone.utc)
+    except (OverflowError, OSError, ValueError) as exc:
+        raise ValueError(f"since fuera de rango: {valor}") from exc
+
+
+def _feed_ics(request, token):
+    """Veterinario, `since` y sello del feed, calculados una sola vez por request."""
+    if not hasattr(request, '_feed_ics'):
+        veterinario = Veterinario.objects.filter(token_calendario=token).first()
+        if veterinario is None:
+            raise Http404
+        since = request.GET.get('since')
+        since = _parsear_since(since) if since else None
+        request._feed_ics = (veterinario, since, sello_feed(veterinario.pk, *ventana_feed()))
+    return request._feed_ics
+
+
+def _etag_feed(request, token):
+    try:
+        veterinario, since, (ultimo, total, con_mascota, fichas) = _feed_ics(request, token)
+    except (Http404, ValueError):
+        return None
+    # Solo datos de este veterinario (ver sello_feed): las reservas de otros
+    # no obligan a sus teléfonos a bajar el feed de nuevo
+    marcas = '-'.join(str(m.timestamp()) if m else '0' for m in (ultimo, fichas))
+    return (
+        f"ics-{veterinario.pk}-{total}-{con_mascota}-{marcas}-{date.today()}-"
+        f"{since.timestamp() if since else ''}"
+    )
+
+
+@require_GET
+@condition(etag_func=_etag_feed)
+def feed_ics(request, token):
+    """
+    Agenda del veterinario en formato iCalendar para suscribirse desde el
+    teléfono. El token del enlace es la credencial (ver asignar_token).
+    Cubre una ventana móvil alrededor de hoy; con ?since= (epoch o ISO 8601)
+    trae solo lo cambiado o cancelado desde ese momento. Si nada cambió
+    responde 304 sin leer los bloques.
+    """
+    try:
+        veterinario, since, _ = _feed_ics(request, token)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetro since inválido.'}, status=400)
+
+    response = StreamingHttpResponse(feed_veterinario(veterinario, since), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="agenda_{veterinario.pk}.ics"'
+    return response
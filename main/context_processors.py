@@ -0,0 +1,12 @@
+# main/context_processors.py
+from .roles import roles_de_usuario
+
+
+def roles(request):
+    """Expone el rol principal del usuario (el primer grupo) a las plantillas."""
+    user = getattr(request, "user", None)
+    roles_usuario = roles_de_usuario(user) if user is not None else ()
+    return {
+        "roles_usuario": roles_usuario,
+        "rol_usuario": roles_usuario[0] if roles_usuario else "",
+    }
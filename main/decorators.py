@@ -7,11 +7,14 @@ from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
 
+from .roles import tiene_rol
+
 
 def roles_requeridos(*roles: str):
     """
     Restringe el acceso a usuarios autenticados que pertenezcan a al menos
     uno de los grupos indicados en 'roles'. Superuser siempre pasa.
+    Los grupos del usuario se leen del cache de roles (ver main.roles).
 
     Uso:
         @roles_requeridos("Recepcionista")
@@ -31,7 +34,7 @@ def roles_requeridos(*roles: str):
             if user.is_superuser:
                 return view_func(request, *args, **kwargs)
 
-            if roles_set and user.groups.filter(name__in=roles_set).exists():
+            if roles_set and tiene_rol(user, *roles_set):
                 return view_func(request, *args, **kwargs)
 
             raise PermissionDenied("No tienes permisos para acceder a esta sección.")
@@ -0,0 +1,32 @@
+# main/middleware.py
+from django.conf import settings
+
+from . import routers
+
+COOKIE_ESCRITURA = "escritura_reciente"
+
+
+class ReplicaLecturaMiddleware:
+    """
+    Reinicia el estado del router de réplica en cada request. Si la request
+    escribió, deja una cookie por REPLICA_PEGAJOSA_SEGUNDOS para que las
+    siguientes del mismo navegador (p. ej. el redirect después de agendar)
+    lean de la primaria mientras la réplica se pone al día.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reiniciar(leer_primaria=COOKIE_ESCRITURA in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if routers.hubo_escritura() and routers.alias_replica():
+                response.set_cookie(
+                    COOKIE_ESCRITURA, "1",
+                    max_age=getattr(settings, "REPLICA_PEGAJOSA_SEGUNDOS", 10),
+                    httponly=True, samesite="Lax",
+                )
+        finally:
+            routers.reiniciar()
+        return response
@@ -0,0 +1,188 @@
+# main/rendimiento.py
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger("pochita.rendimiento")
+
+# Últimas mediciones guardadas por nombre de URL (en memoria, por proceso)
+MUESTRAS_POR_URL = 500
+
+_medicion = threading.local()
+_muestras: dict[str, deque] = defaultdict(lambda: deque(maxlen=_max_muestras()))
+_lock = threading.Lock()
+
+
+def _max_muestras() -> int:
+    return getattr(settings, "RENDIMIENTO_MUESTRAS", MUESTRAS_POR_URL)
+
+
+class PlantillaMedida(Template):
+    """
+    Plantilla del motor de Django que suma su tiempo de render a la medición
+    de la request en curso (si RendimientoMiddleware está midiendo). Solo se
+    cronometra la más externa: {% include %} y {% extends %} quedan dentro
+    de su tiempo.
+    """
+
+    def render(self, context=None, request=None):
+        actual = getattr(_medicion, "actual", None)
+        if actual is None or actual.profundidad:
+            return super().render(context, request)
+        actual.profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            actual.plantillas += time.perf_counter() - inicio
+            actual.profundidad -= 1
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """
+    Backend DjangoTemplates (TEMPLATES['BACKEND']) que entrega
+    PlantillaMedida. Sin una medición en curso cuesta una lectura de
+    thread-local por render.
+    """
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class Medicion:
+    __slots__ = ("consultas", "sql", "plantillas", "profundidad", "inicio_vista")
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.profundidad = 0
+        self.inicio_vista = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de cada conexión
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class RendimientoMiddleware:
+    """
+    Mide por request la cantidad de consultas, el tiempo en SQL, en
+    plantillas (con el backend PlantillasMedidas), en la vista y el total.
+    Lo escribe en el logger "pochita.rendimiento", lo acumula por nombre de
+    URL para la página de estadísticas y, solo para staff o con DEBUG, lo
+    devuelve en el header Server-Timing.
+
+    Con RENDIMIENTO_ACTIVO = False Django lo quita de la cadena al arrancar
+    (MiddlewareNotUsed), así que no cuesta nada.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "RENDIMIENTO_ACTIVO", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        _medicion.actual = medicion
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion.actual = None
+        fin = time.perf_counter()
+
+        total = (fin - inicio) * 1000
+        vista = (fin - medicion.inicio_vista) * 1000 if medicion.inicio_vista else 0.0
+        sql, plantillas = medicion.sql * 1000, medicion.plantillas * 1000
+        # Los tiempos y la cantidad de consultas dicen mucho de la
+        # aplicación: no se muestran a cualquier visitante
+        if settings.DEBUG or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={sql:.1f};desc="{medicion.consultas} consultas"',
+                f"tpl;dur={plantillas:.1f}",
+                f"view;dur={vista:.1f}",
+                f"total;dur={total:.1f}",
+            ])
+
+        match = getattr(request, "resolver_match", None)
+        url = match.view_name if match else "(sin ruta)"
+        registrar_muestra(url, total, medicion.consultas, sql)
+        logger.info(json.dumps({
+            "url": url,
+            "metodo": request.method,
+            "ruta": request.path,
+            "estado": response.status_code,
+            "consultas": medicion.consultas,
+            "sql_ms": round(sql, 2),
+            "plantillas_ms": round(plantillas, 2),
+            "vista_ms": round(vista, 2),
+            "total_ms": round(total, 2),
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actual = getattr(_medicion, "actual", None)
+        if actual is not None:
+            actual.inicio_vista = time.perf_counter()
+        return None
+
+
+def registrar_muestra(url: str, total_ms: float, consultas: int, sql_ms: float) -> None:
+    with _lock:
+        _muestras[url].append((total_ms, consultas, sql_ms))
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def estadisticas() -> list[dict]:
+    """p50/p95 por nombre de URL de las últimas MUESTRAS_POR_URL requests, de la más lenta a la más rápida."""
+    with _lock:
+        copia = {url: list(muestras) for url, muestras in _muestras.items()}
+    filas = []
+    for url, muestras in copia.items():
+        totales = sorted(m[0] for m in muestras)
+        consultas = sorted(m[1] for m in muestras)
+        sql = sorted(m[2] for m in muestras)
+        filas.append({
+            "url": url,
+            "requests": len(muestras),
+            "p50_ms": round(_percentil(totales, 50), 1),
+            "p95_ms": round(_percentil(totales, 95), 1),
+            "sql_p95_ms": round(_percentil(sql, 95), 1),
+            "consultas_p50": _percentil(consultas, 50),
+            "consultas_max": consultas[-1],
+        })
+    filas.sort(key=lambda f: f["p95_ms"], reverse=True)
+    return filas
+
+
+def reiniciar_estadisticas() -> None:
+    with _lock:
+        _muestras.clear()
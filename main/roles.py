@@ -0,0 +1,63 @@
+# main/roles.py
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Versión global: cambia cuando se crea/renombra/borra un grupo, lo que
+# invalida de una vez los roles cacheados de todos los usuarios.
+_CLAVE_VERSION = "roles:version"
+
+
+def _version() -> int:
+    version = cache.get(_CLAVE_VERSION)
+    if version is None:
+        version = 1
+        cache.add(_CLAVE_VERSION, version, None)
+    return version
+
+
+def _clave(user_id, version: int) -> str:
+    return f"roles:{version}:{user_id}"
+
+
+def roles_de_usuario(user) -> tuple[str, ...]:
+    """
+    Nombres de los grupos del usuario, ordenados por id de grupo.
+
+    Se guardan en el cache (TTL configurable con ROLES_CACHE_TTL) y también
+    en el propio objeto user, así que dentro de una request no se consulta
+    ni la base ni el cache más de una vez.
+    """
+    if not user.is_authenticated:
+        return ()
+
+    roles = getattr(user, "_roles_cache", None)
+    if roles is not None:
+        return roles
+
+    clave = _clave(user.pk, _version())
+    roles = cache.get(clave)
+    if roles is None:
+        roles = tuple(user.groups.order_by("pk").values_list("name", flat=True))
+        cache.set(clave, roles, getattr(settings, "ROLES_CACHE_TTL", 300))
+
+    user._roles_cache = roles
+    return roles
+
+
+def tiene_rol(user, *roles: str) -> bool:
+    """True si el usuario pertenece a alguno de los roles indicados."""
+    return bool(set(roles).intersection(roles_de_usuario(user)))
+
+
+def invalidar_roles_usuario(*user_ids) -> None:
+    version = _version()
+    cache.delete_many([_clave(uid, version) for uid in user_ids])
+
+
+def invalidar_roles_todos() -> None:
+    try:
+        cache.incr(_CLAVE_VERSION)
+    except ValueError:
+        cache.set(_CLAVE_VERSION, 2, None)
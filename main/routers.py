@@ -0,0 +1,75 @@
+# main/routers.py
+from __future__ import annotations
+
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARIA = "default"
+
+# Sesiones, usuarios y permisos siempre se leen de la primaria: un login
+# recién hecho todavía no existe en la réplica.
+APPS_SOLO_PRIMARIA = {"sessions", "auth", "contenttypes", "admin"}
+
+_estado = threading.local()
+
+
+def alias_replica() -> str | None:
+    """Alias de lectura configurado (REPLICA_LECTURA), o None si no hay réplica."""
+    alias = getattr(settings, "REPLICA_LECTURA", None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def marcar_escritura() -> None:
+    """Desde ahora y hasta el fin de la request, las lecturas van a la primaria."""
+    _estado.escribio = True
+
+
+def hubo_escritura() -> bool:
+    return getattr(_estado, "escribio", False)
+
+
+def reiniciar(leer_primaria: bool = False) -> None:
+    """Estado al empezar una request; `leer_primaria` si hubo escrituras recientes."""
+    _estado.escribio = False
+    _estado.leer_primaria = leer_primaria
+
+
+class RouterLecturaEscritura:
+    """
+    Escrituras a la primaria; lecturas a la réplica (REPLICA_LECTURA), salvo:
+    - después de una escritura en la misma request (sticky-after-write),
+    - dentro de una transacción abierta en la primaria,
+    - cuando la request viene marcada por escrituras recientes (ver
+      main.middleware.ReplicaLecturaMiddleware),
+    - para las apps de APPS_SOLO_PRIMARIA.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = alias_replica()
+        if (
+            replica is None
+            or model._meta.app_label in APPS_SOLO_PRIMARIA
+            or hubo_escritura()
+            or getattr(_estado, "leer_primaria", False)
+            or connections[PRIMARIA].in_atomic_block
+        ):
+            return PRIMARIA
+        return replica
+
+    def db_for_write(self, model, **hints):
+        marcar_escritura()
+        return PRIMARIA
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = {PRIMARIA, alias_replica()}
+        if obj1._state.db in alias and obj2._state.db in alias:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica es una copia del archivo de la primaria (sincronizar_replica)
+        if db == alias_replica():
+            return False
+        return None
@@ -0,0 +1,38 @@
+# main/signals.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .roles import invalidar_roles_todos, invalidar_roles_usuario
+from .sqlite import aplicar_pragmas
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_de_usuario_cambiaron(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidar_roles_usuario(instance.pk)
+    elif action == "pre_clear":
+        # group.user_set.clear(): hay que leer los usuarios antes de que se borren
+        invalidar_roles_usuario(*instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        # group.user_set.add/remove(...)
+        invalidar_roles_usuario(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def grupo_cambio(sender, **kwargs):
+    invalidar_roles_todos()
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    # WAL, busy_timeout, etc. en cada conexión nueva (ver main/sqlite.py)
+    if connection.vendor == "sqlite":
+        aplicar_pragmas(connection)
@@ -0,0 +1,52 @@
+# main/sqlite.py
+from django.conf import settings
+
+# Valores que se aplican a cada conexión SQLite nueva; esta es la única
+# fuente. Se pueden cambiar por despliegue con SQLITE_PRAGMAS en settings; un
+# valor None omite ese pragma y SQLITE_PRAGMAS = {} los desactiva.
+#
+# journal_mode no va aquí: WAL queda grabado en el archivo y cada conexión
+# reescribiría db.sqlite3, que está versionado. En un servidor con varios
+# workers (gunicorn) se activa con
+#     SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+# (lectores y escritor dejan de bloquearse; con WAL, synchronous=NORMAL solo
+# arriesga la última transacción ante un corte de energía).
+PRAGMAS_POR_DEFECTO = {
+    # Esperar hasta 5 s un lock en vez de fallar de inmediato con "database is locked"
+    'busy_timeout': 5000,
+    # Negativo = KiB: ~20 MB de cache de páginas por conexión
+    'cache_size': -20000,
+    # Lecturas por memoria mapeada (128 MB)
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def pragmas_configurados():
+    """Pragmas a aplicar: los por defecto, sobreescritos por settings.SQLITE_PRAGMAS."""
+    propios = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if propios is None:
+        return dict(PRAGMAS_POR_DEFECTO)
+    if not propios:
+        return {}
+    pragmas = {**PRAGMAS_POR_DEFECTO, **propios}
+    return {nombre: valor for nombre, valor in pragmas.items() if valor is not None}
+
+
+def aplicar_pragmas(connection, pragmas=None):
+    """Ejecuta los PRAGMA sobre una conexión SQLite recién abierta."""
+    pragmas = pragmas_configurados() if pragmas is None else pragmas
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+
+
+def estado_pragmas(connection, nombres=None):
+    """Valores vigentes de los pragmas en la conexión (para diagnóstico y pruebas)."""
+    estado = {}
+    with connection.cursor() as cursor:
+        for nombre in nombres or PRAGMAS_POR_DEFECTO:
+            cursor.execute(f'PRAGMA {nombre}')
+            fila = cursor.fetchone()
+            estado[nombre] = fila[0] if fila else None
+    return estado
@@ -1,3 +1,220 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import router, transaction
+from django.template.base import Template as TemplateBase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.urls import reverse
 
-# Create your tests here.
+from . import routers
+from .middleware import COOKIE_ESCRITURA
+from .rendimiento import reiniciar_estadisticas
+from .roles import roles_de_usuario, tiene_rol
+from .sqlite import aplicar_pragmas, estado_pragmas, pragmas_configurados
+
+
+class RolesCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.grupo = Group.objects.create(name='Recepcionista')
+        self.user = User.objects.create_user('recepcion', password='clave-segura-123')
+        self.user.groups.add(self.grupo)
+
+    def fresco(self):
+        # Un objeto user nuevo, como el de cada request
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_se_cachean(self):
+        self.assertEqual(roles_de_usuario(self.fresco()), ('Recepcionista',))
+        user = self.fresco()
+        with self.assertNumQueries(0):
+            self.assertTrue(tiene_rol(user, 'Recepcionista', 'Admin'))
+            self.assertFalse(tiene_rol(user, 'Admin'))
+
+    def test_invalidacion_por_senales(self):
+        self.assertTrue(tiene_rol(self.fresco(), 'Recepcionista'))
+
+        self.user.groups.remove(self.grupo)
+        self.assertFalse(tiene_rol(self.fresco(), 'Recepcionista'))
+
+        self.grupo.user_set.add(self.user)
+        self.assertTrue(tiene_rol(self.fresco(), 'Recepcionista'))
+
+        self.grupo.name = 'Recepción'
+        self.grupo.save()
+        self.assertEqual(roles_de_usuario(self.fresco()), ('Recepción',))
+
+        self.grupo.user_set.clear()
+        self.assertEqual(roles_de_usuario(self.fresco()), ())
+
+    def test_vistas_sin_consultas_a_grupos(self):
+        self.client.force_login(self.user)
+        urls = [
+            reverse('gestionCitas:calendario_mes'),
+            reverse('gestionCitas:agenda_dia'),
+            reverse('dashboard'),
+        ]
+        for url in urls:
+            self.client.get(url)  # calentar
+
+        with CaptureQueriesContext(connection) as ctx:
+            for url in urls:
+                self.assertIn(self.client.get(url).status_code, (200, 302))
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'auth_group' in q['sql']])
+
+
+class PragmasSqliteTests(TestCase):
+
+    def setUp(self):
+        # Conexión aparte: abrirla dispara connection_created
+        self.conexion = connections.create_connection('default')
+        self.addCleanup(self.conexion.close)
+
+    def test_conexion_configurada(self):
+        estado = estado_pragmas(self.conexion, ['journal_mode', 'busy_timeout', 'mmap_size'])
+        # WAL no viene por defecto: quedaría grabado en el archivo
+        self.assertEqual(estado['journal_mode'], 'delete')
+        self.assertEqual(estado['busy_timeout'], 5000)
+        self.assertEqual(estado['mmap_size'], 128 * 1024 * 1024)
+
+    def test_configurable_por_despliegue(self):
+        self.conexion.ensure_connection()  # abierta con los pragmas por defecto
+        with self.settings(SQLITE_PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+                                           'busy_timeout': 250, 'mmap_size': None}):
+            pragmas = pragmas_configurados()
+            self.assertEqual(pragmas['busy_timeout'], 250)
+            self.assertNotIn('mmap_size', pragmas)
+            self.assertEqual(pragmas['cache_size'], -20000)
+            self.assertEqual(pragmas['journal_mode'], 'WAL')
+            # Pasar a WAL necesita la base sin otras transacciones abiertas (la
+            # de TestCase lo impide): se aplica el resto
+            del pragmas['journal_mode']
+            aplicar_pragmas(self.conexion, pragmas)
+        estado = estado_pragmas(self.conexion, ['synchronous', 'busy_timeout'])
+        self.assertEqual(estado, {'synchronous': 1, 'busy_timeout': 250})
+
+        with self.settings(SQLITE_PRAGMAS={}):
+            self.assertEqual(pragmas_configurados(), {})
+
+
+@override_settings(REPLICA_LECTURA='replica')
+class RouterReplicaTests(TransactionTestCase):
+    # Sin la transacción envolvente de TestCase: dentro de una transacción
+    # abierta el router siempre lee de la primaria.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        routers.reiniciar()
+        self.addCleanup(routers.reiniciar)
+        self.grupo = Group.objects.create(name='Recepcionista')
+        self.user = User.objects.create_user('recepcion', password='clave-segura-123')
+        self.user.groups.add(self.grupo)
+        routers.reiniciar()
+
+    def test_lecturas_a_replica_hasta_escribir(self):
+        from gestionCitas.models import Veterinario
+
+        self.assertEqual(router.db_for_read(Veterinario), 'replica')
+        self.assertEqual(router.db_for_read(User), 'default')
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Veterinario), 'default')
+
+        Veterinario.objects.create(rut_vet='111111111', nombre='Dra. Ana')
+        self.assertEqual(router.db_for_read(Veterinario), 'default')
+        routers.reiniciar()
+        self.assertEqual(router.db_for_read(Veterinario), 'replica')
+        routers.reiniciar(leer_primaria=True)
+        self.assertEqual(router.db_for_read(Veterinario), 'default')
+
+    def test_vista_de_lectura_usa_replica(self):
+        self.client.force_login(self.user)
+        routers.reiniciar()
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primaria:
+            response = self.client.get(reverse('gestionCitas:agenda_dia'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(COOKIE_ESCRITURA, response.cookies)
+        self.assertTrue(any('gestionCitas_bloqueatencion' in q['sql'] for q in replica.captured_queries))
+        self.assertFalse(any('gestionCitas_' in q['sql'] for q in primaria.captured_queries))
+
+    def test_grilla_cacheable_se_arma_con_la_primaria(self):
+        # La versión y la grilla salen de la primaria: una réplica atrasada no
+        # puede dejar un mes viejo en cache bajo la versión nueva. Leerlas no
+        # cuenta como escritura.
+        self.client.force_login(self.user)
+        routers.reiniciar()
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primaria:
+            response = self.client.get(reverse('gestionCitas:calendario_mes'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(COOKIE_ESCRITURA, response.cookies)
+        en_primaria = ' '.join(q['sql'] for q in primaria.captured_queries)
+        self.assertIn('gestionCitas_versiondatos', en_primaria)
+        self.assertIn('gestionCitas_bloqueatencion', en_primaria)
+        self.assertFalse(any('gestionCitas_bloqueatencion' in q['sql'] for q in replica.captured_queries))
+
+    def test_escritura_deja_cookie_pegajosa(self):
+        from gestionCitas.models import Veterinario
+
+        vet = Veterinario.objects.create(rut_vet='111111111', nombre='Dra. Ana')
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('gestionCitas:generar_disponibilidad'), {
+            'veterinarios': [vet.pk], 'fecha_inicio': '2030-01-07', 'fecha_fin': '2030-01-07',
+            'dias_semana': [0], 'hora_inicio': '09:00', 'hora_fin': '10:00', 'duracion': 30,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(COOKIE_ESCRITURA, response.cookies)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get(reverse('gestionCitas:agenda_dia'))
+        self.assertEqual(replica.captured_queries, [])
+
+
+@override_settings(RENDIMIENTO_ACTIVO=True)
+class RendimientoTests(TestCase):
+
+    def setUp(self):
+        reiniciar_estadisticas()
+        self.user = User.objects.create_user('admin', password='clave-segura-123', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_server_timing_log_y_estadisticas(self):
+        with self.assertLogs('pochita.rendimiento', 'INFO') as logs:
+            response = self.client.get(reverse('index'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ consultas", tpl;dur=[\d.]+, view;')
+        self.assertIn('"url": "index"', logs.output[0])
+
+        with self.assertLogs('pochita.rendimiento', 'INFO'):
+            response = self.client.get(reverse('rendimiento'))
+        urls = [f['url'] for f in response.context['filas']]
+        self.assertIn('index', urls)
+
+    def test_server_timing_solo_para_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        with self.assertLogs('pochita.rendimiento', 'INFO') as logs:
+            response = self.client.get(reverse('index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('"url": "index"', logs.output[0])  # se mide igual
+
+        with self.settings(DEBUG=True), self.assertLogs('pochita.rendimiento', 'INFO'):
+            self.assertIn('Server-Timing', self.client.get(reverse('index')))
+
+    def test_no_modifica_el_motor_de_plantillas(self):
+        with self.assertLogs('pochita.rendimiento', 'INFO'):
+            self.client.get(reverse('index'))
+        self.assertEqual(TemplateBase.render.__module__, 'django.template.base')
+
+    def test_solo_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        with self.assertLogs('pochita.rendimiento', 'INFO'):
+            response = self.client.get(reverse('rendimiento'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RENDIMIENTO_ACTIVO=False)
+    def test_apagado_no_agrega_header(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('index')))
@@ -1,7 +1,12 @@
 from django.shortcuts import render, redirect
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 
+from .rendimiento import estadisticas, reiniciar_estadisticas
+from .roles import tiene_rol
+
 
 def index(request):
     # Si no hay sesión, manda a login.
@@ -17,8 +22,20 @@ def dashboard_redirect(request):
     u = request.user
 
     # Si el usuario es un recepcionista o superusuario, redirigir al index
-    if u.is_superuser or u.groups.filter(name="Recepcionista").exists():
+    if u.is_superuser or tiene_rol(u, "Recepcionista"):
         return redirect('index')  # Redirigir al index, no al calendario
 
     # Si no es un recepcionista, redirige a otras páginas o un fallback
-    return redirect('index')  # Esto redirige al index para otros roles también
\ No newline at end of file
+    return redirect('index')  # Esto redirige al index para otros roles también
+
+
+@staff_member_required
+def rendimiento(request):
+    """p50/p95 por URL medidos por RendimientoMiddleware en este proceso."""
+    if request.method == "POST":
+        reiniciar_estadisticas()
+        return redirect("rendimiento")
+    return render(request, "main/rendimiento.html", {
+        "activo": getattr(settings, "RENDIMIENTO_ACTIVO", False),
+        "filas": estadisticas(),
+    })
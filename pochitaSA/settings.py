@@ -42,7 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.rendimiento.RendimientoMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.ReplicaLecturaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,7 +57,8 @@ ROOT_URLCONF = 'pochitaSA.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (main.rendimiento)
+        'BACKEND': 'main.rendimiento.PlantillasMedidas',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.roles',
             ],
         },
     },
@@ -78,7 +82,60 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            # Toma el lock de escritura al abrir la transacción (BEGIN IMMEDIATE).
+            # Con DEFERRED, una transacción que lee y luego escribe (reprogramar,
+            # ausencias, completar citas, BloqueQuerySet.update, que lee los
+            # días antes de escribir) falla con "database is locked" al subir el
+            # lock, sin esperar busy_timeout. No frena las lecturas: las vistas
+            # leen en autocommit, sin BEGIN, y todos los transaction.atomic()
+            # de la aplicación escriben.
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Base de pruebas en archivo (no en memoria) para poder probar
+        # accesos concurrentes desde varios hilos.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Réplica de solo lectura. En local es una copia del archivo principal que
+    # mantiene al día `python manage.py sincronizar_replica --loop`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+# Lecturas a la réplica y escrituras a la primaria (ver main.routers)
+DATABASE_ROUTERS = ['main.routers.RouterLecturaEscritura']
+
+# Alias al que van las lecturas. None = todo a 'default'; poner 'replica'
+# después de correr sincronizar_replica al menos una vez.
+REPLICA_LECTURA = None
+
+# Segundos que un navegador que acaba de escribir sigue leyendo de la primaria
+REPLICA_PEGAJOSA_SEGUNDOS = 10
+
+# Medición por request (main.rendimiento): consultas, tiempo SQL, plantillas
+# y vista en el log "pochita.rendimiento", en la página /rendimiento/ y en el
+# header Server-Timing (estos dos, solo para staff; el header también con
+# DEBUG). Apagado, el middleware no se carga.
+RENDIMIENTO_ACTIVO = False
+# Requests recientes que se guardan por nombre de URL para los percentiles
+RENDIMIENTO_MUESTRAS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'pochita.rendimiento': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 
@@ -126,3 +183,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
+
+# Segundos que se cachean los roles (grupos) de cada usuario. Las señales de
+# main.signals invalidan el cache al cambiar grupos; el TTL acota cuánto puede
+# quedar desactualizado otro proceso que no comparte el backend de cache.
+ROLES_CACHE_TTL = 300
+
+# SQLITE_PRAGMAS (opcional) ajusta por despliegue los pragmas que
+# main.signals aplica a cada conexión SQLite; los valores y cómo activar WAL
+# están en main.sqlite.PRAGMAS_POR_DEFECTO.
+
+# Segundos que vive en cache la grilla renderizada de un mes del calendario.
+# Cualquier cambio en bloques, mascotas o veterinarios la invalida antes.
+CALENDARIO_CACHE_TTL = 3600
+
+# Segundos que vive en cache un reporte de ocupación. Los cambios en los
+# bloques de un mes invalidan antes los reportes que incluyen ese mes.
+REPORTES_CACHE_TTL = 3600
+
+# Días hacia atrás que se mantienen en BloqueAtencion. El comando
+# archivar_bloques mueve lo anterior a BloqueArchivado y las lecturas de
+# historial (exportación, historial de mascota) unen ambas tablas cuando el
+# rango pedido empieza antes de este corte. No conviene subirlo después de
+# archivar: los bloques entre el corte viejo y el nuevo quedarían fuera de
+# las lecturas que empiezan en ese tramo.
+ARCHIVO_DIAS_ACTIVOS = 365
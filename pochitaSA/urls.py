@@ -31,6 +31,7 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'), 
     path('citas/', include('gestionCitas.urls')),
     path('dashboard/', views.dashboard_redirect, name='dashboard'),
+    path('rendimiento/', views.rendimiento, name='rendimiento'),
 ]
 
 if settings.DEBUG: